@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Выполнение обращений к сервису посылок в фоновых потоках для приложения "Служба доставки".
+
+Функции запускаются в пуле потоков, а результаты передаются обратно в поток
+Tk через очередь, которую главный цикл опрашивает с помощью root.after.
+Обработчики результатов поэтому всегда вызываются в потоке интерфейса.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Период опроса очереди результатов (мс)
+POLL_INTERVAL = 30
+
+class BackgroundExecutor:
+    """
+    Пул фоновых потоков с доставкой результатов в главный цикл Tk
+
+    Задачи с одинаковым ключом считаются взаимозаменяемыми: новая задача
+    отменяет ожидающую и делает результат выполняющейся устаревшим, а при
+    coalesce=True повторные запросы во время выполнения сливаются в один.
+    Задачи без ключа (например, записи в БД) выполняются и доставляются всегда.
+    """
+
+    def __init__(self, root, max_workers=4, on_busy_change=None, poll_interval=POLL_INTERVAL):
+        """
+        Инициализация пула
+
+        Args:
+            root (tk.Tk): Корневой виджет, в цикле которого доставляются результаты
+            max_workers (int): Количество рабочих потоков
+            on_busy_change (callable): Обработчик (занят: bool) смены состояния занятости
+            poll_interval (int): Период опроса очереди результатов (мс)
+        """
+        self.root = root
+        self.on_busy_change = on_busy_change
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="delivery-worker")
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._futures = {}
+        self._coalesced = {}
+        self._pending = 0
+        self._closed = False
+        self.root.after(self.poll_interval, self._poll)
+
+    @property
+    def busy(self):
+        """Есть ли незавершенные задачи"""
+        return self._pending > 0
+
+    def _set_pending(self, delta):
+        """Изменение счетчика незавершенных задач с уведомлением о занятости"""
+        was_busy = self._pending > 0
+        self._pending += delta
+        if self.on_busy_change and was_busy != (self._pending > 0):
+            self.on_busy_change(self._pending > 0)
+
+    def submit(self, key, fn, *args, on_success=None, on_error=None, coalesce=False):
+        """
+        Запуск функции в фоновом потоке
+
+        Args:
+            key (str): Ключ задачи или None
+            fn (callable): Выполняемая функция
+            *args: Аргументы функции
+            on_success (callable): Обработчик результата (вызывается в потоке Tk)
+            on_error (callable): Обработчик исключения (вызывается в потоке Tk)
+            coalesce (bool): Не запускать повторно, пока задача с тем же ключом выполняется,
+                а выполнить последний запрос после ее завершения
+        """
+        if self._closed:
+            return
+        task = (fn, args, on_success, on_error)
+        if key is not None:
+            running = self._futures.get(key)
+            if running is not None and not running.done():
+                if coalesce:
+                    self._coalesced[key] = task
+                    return
+                # Ожидающую задачу можно отменить, результат выполняющейся будет отброшен
+                if running.cancel():
+                    self._set_pending(-1)
+        self._start(key, task)
+
+    def _start(self, key, task):
+        """Постановка задачи в пул потоков"""
+        fn, args, on_success, on_error = task
+        generation = None
+        if key is not None:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+        self._set_pending(1)
+        future = self._executor.submit(self._run, key, generation, fn, args, on_success, on_error)
+        if key is not None:
+            self._futures[key] = future
+
+    def _run(self, key, generation, fn, args, on_success, on_error):
+        """Выполнение задачи в рабочем потоке"""
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._results.put((key, generation, False, e, on_success, on_error))
+        else:
+            self._results.put((key, generation, True, result, on_success, on_error))
+
+    def cancel(self, key):
+        """Отмена задачи с ключом key: ее результат не будет доставлен"""
+        self._coalesced.pop(key, None)
+        future = self._futures.get(key)
+        if future is not None and future.cancel():
+            self._set_pending(-1)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _poll(self):
+        """Доставка готовых результатов в потоке Tk"""
+        if self._closed:
+            return
+        while True:
+            try:
+                key, generation, ok, result, on_success, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._set_pending(-1)
+
+            if key is not None:
+                pending = self._coalesced.pop(key, None)
+                if pending is not None:
+                    # Результат уже устарел: вместо него будет выполнен последний запрос
+                    self._start(key, pending)
+                    continue
+                if generation != self._generations.get(key):
+                    continue
+
+            callback = on_success if ok else on_error
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    print(f"Ошибка в обработчике фоновой задачи: {e}")
+            elif not ok:
+                print(f"Ошибка в фоновой задаче: {result}")
+        self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        """Остановка пула: ожидающие задачи отменяются, результаты больше не доставляются"""
+        self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
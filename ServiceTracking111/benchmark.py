@@ -0,0 +1,902 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Микро-бенчмарки слоя работы с базой данных приложения "Служба доставки".
+Все замеры выполняются на временной базе данных, рабочая база не затрагивается.
+
+Запуск:
+    python benchmark.py connections --ops 5000
+    python benchmark.py bulk --ops 50000
+    python benchmark.py collisions --rows 10000000
+    python benchmark.py cache --ops 100000
+    python benchmark.py scans --ops 20000
+    python benchmark.py search --rows 1000000
+    python benchmark.py track-batch --batch-size 500
+    python benchmark.py suite --scale 100000 --output results.json
+    python benchmark.py dispatch --parcels 100000 --couriers 1000
+    python benchmark.py group-commit --ops 20000 --threads 1 2 4 8 16
+    python benchmark.py spatial --points 1000000 --radius 3
+    python benchmark.py route --stops 100 500 1000 --time-budget 1
+    python benchmark.py archive --rows 1000000 --delivered 0.9
+    python benchmark.py suite --scale 100000 --baseline results.json --threshold 0.2
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import database
+import dispatcher
+import geocoder
+import package_service
+import routing
+import spatial
+import tracking_numbers
+import write_queue
+
+def use_temp_db(directory):
+    """
+    Переключение модуля database на временную базу данных
+
+    Args:
+        directory (str): Каталог для файла базы данных
+
+    Returns:
+        str: Путь к созданной базе данных
+    """
+    database.close_connections()
+    database.DB_NAME = os.path.join(directory, "bench.db")
+    database.initialize_db()
+    return database.DB_NAME
+
+def report(name, ops, elapsed):
+    """Печать результата замера"""
+    print(f"{name:<40} {ops:>8} оп. {elapsed:8.3f} с {ops / elapsed:12.0f} оп/с")
+
+def bench_connections(args):
+    """Сравнение открытия соединения на каждый вызов и пула долгоживущих соединений"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = use_temp_db(directory)
+        numbers = [f"BN-{i:06d}" for i in range(args.ops)]
+
+        # Старый путь: connect/execute/commit/close на каждый вызов
+        start = time.perf_counter()
+        for number in numbers:
+            conn = sqlite3.connect(path)
+            conn.execute(
+                "INSERT INTO packages (tracking_number, description, status, sender, recipient, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (number, "Бенчмарк", "Отправлена", "Отправитель", "Получатель", datetime.now())
+            )
+            conn.commit()
+            conn.close()
+        report("insert: connect на каждый вызов", args.ops, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for number in numbers:
+            conn = sqlite3.connect(path)
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM packages WHERE tracking_number = ?", (number,)).fetchone()
+            dict(row)
+            conn.close()
+        report("select: connect на каждый вызов", args.ops, time.perf_counter() - start)
+
+        # Новый путь: функции database.py поверх пула соединений
+        start = time.perf_counter()
+        for number in numbers:
+            database.create_package("P" + number, "Бенчмарк", "Отправитель", "Получатель")
+        report("insert: пул соединений", args.ops, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for number in numbers:
+            database.get_package_by_tracking("P" + number)
+        report("select: пул соединений", args.ops, time.perf_counter() - start)
+
+        database.close_connections()
+
+def bench_bulk(args):
+    """Сравнение поштучной отправки посылок и пакетного приема манифеста"""
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        single_ops = min(args.ops, 5000)
+
+        start = time.perf_counter()
+        for i in range(single_ops):
+            package_service.send_package(f"Посылка {i}", "Отправитель", "Получатель")
+        report("send_package по одной", single_ops, time.perf_counter() - start)
+
+        manifest = ((f"Посылка {i}", "Отправитель", "Получатель") for i in range(args.ops))
+        start = time.perf_counter()
+        success, result = package_service.send_packages_bulk(manifest, chunk_size=args.chunk_size)
+        report(f"send_packages_bulk (порции по {args.chunk_size})", result["created"], time.perf_counter() - start)
+        if not success:
+            print(f"Отклонено записей: {len(result['failed'])}")
+
+        # Записи неверного формата отклоняются, а не превращаются в посылки
+        malformed = ["bad", b"bad", ("Посылка", "Отправитель"), None, 42]
+        success, result = package_service.send_packages_bulk(malformed)
+        rejected = sum(message == "Некорректный формат записи" for index, message in result["failed"])
+        print(f"Записи неверного формата: отклонено {rejected} из {len(malformed)}, создано {result['created']}")
+
+        database.close_connections()
+
+def count_collisions(values, rows, checkpoints):
+    """
+    Подсчет повторов среди значений из диапазона номеров отслеживания
+
+    Занятость номеров хранится в битовой карте (~85 МБ на весь диапазон).
+
+    Args:
+        values (iterator): Значения в диапазоне [0, DOMAIN_SIZE)
+        rows (int): Сколько значений взять
+        checkpoints (int): Сколько промежуточных отчетов вывести
+
+    Returns:
+        list: Пары (выдано_номеров, накопленное_число_коллизий)
+    """
+    bitmap = bytearray(tracking_numbers.DOMAIN_SIZE // 8 + 1)
+    step = max(1, rows // checkpoints)
+    collisions = 0
+    results = []
+    for issued in range(1, rows + 1):
+        value = next(values)
+        byte, bit = value >> 3, 1 << (value & 7)
+        if bitmap[byte] & bit:
+            collisions += 1
+        else:
+            bitmap[byte] |= bit
+        if issued % step == 0:
+            results.append((issued, collisions))
+    return results
+
+def bench_collisions(args):
+    """Поведение коллизий случайных номеров и номеров из перестановки счетчика"""
+    rows = args.rows
+    print(f"Диапазон номеров: {tracking_numbers.DOMAIN_SIZE}, выдается: {rows}")
+
+    random_values = iter(lambda: random.randrange(tracking_numbers.DOMAIN_SIZE), None)
+    start = time.perf_counter()
+    random_results = count_collisions(random_values, rows, args.checkpoints)
+    random_elapsed = time.perf_counter() - start
+
+    key = random.getrandbits(62)
+    permuted_values = (tracking_numbers.permute(value, key) for value in range(rows))
+    start = time.perf_counter()
+    permuted_results = count_collisions(permuted_values, rows, args.checkpoints)
+    permuted_elapsed = time.perf_counter() - start
+
+    print(f"{'выдано':>12} {'случайные: коллизий':>22} {'вероятность повтора':>20} {'перестановка: коллизий':>24}")
+    previous = (0, 0)
+    for (issued, random_collisions), (_, permuted_collisions) in zip(random_results, permuted_results):
+        window_rate = (random_collisions - previous[1]) / (issued - previous[0])
+        previous = (issued, random_collisions)
+        print(f"{issued:>12} {random_collisions:>22} {window_rate:>20.5f} {permuted_collisions:>24}")
+    report("случайные номера (генерация)", rows, random_elapsed)
+    report("перестановка счетчика (генерация)", rows, permuted_elapsed)
+
+    # Выдача готовых номеров генератором с резервированием блоков в БД
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        generator = tracking_numbers.TrackingNumberGenerator()
+        ops = min(rows, 200000)
+        start = time.perf_counter()
+        for _ in range(ops):
+            generator.next()
+        report("TrackingNumberGenerator.next", ops, time.perf_counter() - start)
+        database.close_connections()
+
+def bench_cache(args):
+    """Отслеживание горячих посылок с кэшем и без него"""
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        numbers = []
+        package_service.send_packages_bulk(
+            ((f"Посылка {i}", "Отправитель", "Получатель") for i in range(args.packages)),
+            on_created=lambda index, number: numbers.append(number)
+        )
+        # 80% запросов приходится на 5% горячих посылок, часть номеров неизвестна
+        hot = numbers[:max(1, len(numbers) // 20)]
+        lookups = [random.choice(hot) if random.random() < 0.8 else random.choice(numbers)
+                   for _ in range(args.ops)]
+        lookups[::50] = ["ZZ-0000000"] * len(lookups[::50])
+
+        for name, size in (("без кэша", 0), (f"кэш на {args.cache_size} записей", args.cache_size)):
+            database.package_cache.clear()
+            package_service.configure_tracking_cache(size=size)
+            start = time.perf_counter()
+            for number in lookups:
+                package_service.track_package(number)
+            report(f"track_package {name}", args.ops, time.perf_counter() - start)
+        print(package_service.get_tracking_cache_stats())
+
+        package_service.configure_tracking_cache(size=database.PACKAGE_CACHE_SIZE)
+        database.close_connections()
+
+def bench_scans(args):
+    """Поштучное обновление статусов против пакетной загрузки сканирований"""
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        numbers = []
+        package_service.send_packages_bulk(
+            ((f"Посылка {i}", "Отправитель", "Получатель") for i in range(args.ops)),
+            on_created=lambda index, number: numbers.append(number)
+        )
+        single_ops = min(args.ops, 5000)
+
+        start = time.perf_counter()
+        for number in numbers[:single_ops]:
+            package_service.update_status(number, "В пути")
+        report("update_status по одной", single_ops, time.perf_counter() - start)
+
+        # Сканирования приходят перемешанными, часть - не по порядку
+        now = datetime.now()
+        scans = [(number, random.choice(database.SCAN_STATUSES[:2]), now + timedelta(microseconds=random.randrange(10 ** 6)))
+                 for number in numbers]
+        random.shuffle(scans)
+        start = time.perf_counter()
+        success, result = package_service.update_statuses_bulk(scans)
+        report("update_statuses_bulk", len(scans), time.perf_counter() - start)
+        print({key: value if isinstance(value, int) else len(value) for key, value in result.items()})
+
+        database.close_connections()
+
+def bench_track_batch(args):
+    """Отслеживание списка посылок по одной и одним пакетным запросом (без кэша)"""
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        numbers = []
+        package_service.send_packages_bulk(
+            ((f"Посылка {i}", "Отправитель", "Получатель") for i in range(args.packages)),
+            on_created=lambda index, number: numbers.append(number)
+        )
+        batches = [random.sample(numbers, args.batch_size) for _ in range(args.batches)]
+        package_service.configure_tracking_cache(size=0)
+
+        start = time.perf_counter()
+        for batch in batches:
+            for number in batch:
+                package_service.track_package(number)
+        report(f"track_package x {args.batch_size}", len(batches) * args.batch_size, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for batch in batches:
+            package_service.track_packages(batch)
+        report(f"track_packages({args.batch_size})", len(batches) * args.batch_size, time.perf_counter() - start)
+
+        package_service.configure_tracking_cache(size=database.PACKAGE_CACHE_SIZE)
+        database.close_connections()
+
+# Словари для синтетических посылок
+FIRST_NAMES = ("Иван", "Петр", "Анна", "Мария", "Сергей", "Ольга", "Алексей", "Елена", "Дмитрий", "Наталья",
+               "Андрей", "Татьяна", "Михаил", "Ирина", "Николай", "Светлана", "Павел", "Юлия", "Артем", "Ксения")
+SURNAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+            "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров", "Павлов", "Козлов",
+            "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин", "Захаров", "Зайцев", "Соловьев",
+            "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьев", "Сергеев", "Кузьмин", "Фролов")
+CITIES = ("Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург", "Самара", "Омск", "Ростов-на-Дону",
+          "Уфа", "Красноярск", "Воронеж", "Пермь", "Волгоград", "Краснодар", "Тюмень", "Ижевск")
+STREETS = ("Ленина", "Мира", "Садовая", "Советская", "Гагарина", "Пушкина", "Лесная", "Школьная", "Молодежная",
+           "Набережная", "Центральная", "Заречная", "Полевая", "Зеленая", "Новая", "Луговая", "Парковая")
+ITEMS = ("Книги", "Документы", "Одежда", "Электроника", "Телефон", "Ноутбук", "Игрушки", "Посуда", "Обувь",
+         "Косметика", "Запчасти", "Подарок", "Лекарства", "Продукты", "Инструменты")
+
+def synthetic_package(rng):
+    """Случайная посылка (description, sender, recipient, sender_address, recipient_address)"""
+    def person():
+        return f"{rng.choice(SURNAMES)}{rng.choice(('', 'а'))} {rng.choice(FIRST_NAMES)}"
+    def address():
+        return f"г. {rng.choice(CITIES)}, ул. {rng.choice(STREETS)}, д. {rng.randint(1, 200)}, кв. {rng.randint(1, 300)}"
+    return (f"{rng.choice(ITEMS)} {rng.choice(ITEMS).lower()}", person(), person(), address(), address())
+
+def percentile(values, fraction):
+    """Значение перцентиля fraction (0..1) из отсортированного списка"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def bench_search(args):
+    """Полнотекстовый поиск посылок на большой таблице"""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        
+        start = time.perf_counter()
+        created = 0
+        while created < args.rows:
+            count = min(10000, args.rows - created)
+            numbers = tracking_numbers.get_generator().take(count)
+            database.create_packages_bulk([(number,) + synthetic_package(rng) for number in numbers])
+            created += count
+        report("заполнение таблицы с индексом FTS5", created, time.perf_counter() - start)
+        
+        queries = [rng.choice((
+            lambda: rng.choice(SURNAMES),
+            lambda: rng.choice(SURNAMES)[:4],
+            lambda: f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}",
+            lambda: f"{rng.choice(STREETS)} {rng.randint(1, 200)}",
+            lambda: f"{rng.choice(CITIES)} {rng.choice(STREETS)} {rng.randint(1, 200)}",
+            lambda: f"{rng.choice(ITEMS)} {rng.choice(SURNAMES)[:3]}",
+        ))() for _ in range(args.ops)]
+        
+        timings = []
+        found = 0
+        for query in queries:
+            start = time.perf_counter()
+            found += len(database.search_packages(query, args.limit))
+            timings.append(time.perf_counter() - start)
+        report(f"search_packages (limit {args.limit})", args.ops, sum(timings))
+        timings.sort()
+        print(f"p50 {percentile(timings, 0.5) * 1000:.2f} мс, p99 {percentile(timings, 0.99) * 1000:.2f} мс, "
+              f"max {timings[-1] * 1000:.2f} мс, в среднем найдено {found / args.ops:.1f}")
+        
+        database.close_connections()
+
+# Доли курьеров и отзывов относительно количества посылок в наборе данных suite
+COURIERS_PER_PACKAGE = 0.01
+REVIEWS_PER_PACKAGE = 0.1
+# Сколько номеров созданных посылок хранить для запросов сценариев
+NUMBERS_SAMPLE_SIZE = 100000
+# Порция записей при заполнении базы
+FILL_CHUNK_SIZE = 10000
+COMMENTS = ("Все отлично", "Доставили быстро", "Курьер опоздал", "Коробка помята", "Спасибо!", "")
+SUITE_SCENARIOS = ("create", "track", "update_status", "list_all", "add_review")
+
+def synthetic_courier(rng, index):
+    """Случайный курьер (name, phone, email)"""
+    return (f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}",
+            f"+7{rng.randrange(10 ** 10):010d}", f"courier{index}@example.com")
+
+def synthetic_review(rng, tracking_number):
+    """Случайный отзыв (tracking_number, customer_name, rating, comment)"""
+    rating = rng.choices((1, 2, 3, 4, 5), weights=(5, 5, 10, 30, 50))[0]
+    return (tracking_number, f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)}", rating, rng.choice(COMMENTS))
+
+def peak_rss_mb():
+    """Пиковый объем резидентной памяти процесса (МБ) или None, если недоступен"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux значение в килобайтах, в macOS - в байтах
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def generate_dataset(scale, rng):
+    """
+    Заполнение базы синтетическими посылками, курьерами и отзывами
+
+    Args:
+        scale (int): Количество посылок
+        rng (random.Random): Генератор случайных чисел
+
+    Returns:
+        list: Равномерная выборка номеров созданных посылок (не больше NUMBERS_SAMPLE_SIZE)
+    """
+    sample = []
+    step = max(1, scale // NUMBERS_SAMPLE_SIZE)
+    created = 0
+    while created < scale:
+        count = min(FILL_CHUNK_SIZE, scale - created)
+        numbers = tracking_numbers.get_generator().take(count)
+        database.create_packages_bulk([(number,) + synthetic_package(rng) for number in numbers])
+        sample.extend(numbers[(-created) % step::step])
+        created += count
+
+    couriers = int(scale * COURIERS_PER_PACKAGE)
+    for start in range(0, couriers, FILL_CHUNK_SIZE):
+        database.create_couriers_bulk([synthetic_courier(rng, index)
+                                       for index in range(start, min(couriers, start + FILL_CHUNK_SIZE))])
+
+    reviews = int(scale * REVIEWS_PER_PACKAGE)
+    for start in range(0, reviews, FILL_CHUNK_SIZE):
+        count = min(FILL_CHUNK_SIZE, reviews - start)
+        database.create_reviews_bulk([synthetic_review(rng, rng.choice(sample)) for _ in range(count)])
+    return sample[:NUMBERS_SAMPLE_SIZE]
+
+def measure(name, calls):
+    """
+    Выполнение операций сценария с замером задержки каждой
+
+    Args:
+        name (str): Название сценария
+        calls (iterable): Операции - функции без аргументов
+
+    Returns:
+        dict: ops, elapsed (с), ops_per_sec, p50_ms, p90_ms, p99_ms, max_ms и peak_rss_mb
+    """
+    timings = []
+    start = time.perf_counter()
+    for call in calls:
+        op_start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - op_start)
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    result = {
+        "ops": len(timings),
+        "elapsed": elapsed,
+        "ops_per_sec": len(timings) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(timings, 0.5) * 1000 if timings else None,
+        "p90_ms": percentile(timings, 0.9) * 1000 if timings else None,
+        "p99_ms": percentile(timings, 0.99) * 1000 if timings else None,
+        "max_ms": timings[-1] * 1000 if timings else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if timings:
+        print(f"{name:<40} {result['ops']:>8} оп. {elapsed:8.3f} с {result['ops_per_sec']:12.0f} оп/с"
+              f"   p50 {result['p50_ms']:.3f} мс, p99 {result['p99_ms']:.3f} мс")
+    return result
+
+def run_scenarios(numbers, ops, rng, page_size):
+    """
+    Сценарии suite на заполненной базе
+
+    Кэш отслеживания отключен, чтобы замерялись обращения к базе данных,
+    а не доля попаданий в кэш (ее показывает бенчмарк cache).
+
+    Returns:
+        dict: Результаты measure() по названиям из SUITE_SCENARIOS
+    """
+    package_service.configure_tracking_cache(size=0)
+    statuses = database.SCAN_STATUSES[:2]
+    results = {}
+    try:
+        new_packages = [synthetic_package(rng) for _ in range(ops)]
+        results["create"] = measure("create: send_package", (
+            lambda fields=fields: package_service.send_package(*fields) for fields in new_packages))
+
+        lookups = [rng.choice(numbers) for _ in range(ops)]
+        results["track"] = measure("track: track_package", (
+            lambda number=number: package_service.track_package(number) for number in lookups))
+
+        updates = [(rng.choice(numbers), rng.choice(statuses)) for _ in range(ops)]
+        results["update_status"] = measure("update_status: update_status", (
+            lambda number=number, status=status: package_service.update_status(number, status)
+            for number, status in updates))
+
+        # Обход всей таблицы страницами, как при прокрутке списка; операция - одна страница
+        def pages():
+            after = None
+            while True:
+                page = []
+                def fetch(after=after):
+                    page[:] = package_service.list_packages(after, page_size)
+                yield fetch
+                if len(page) < page_size:
+                    return
+                after = database.page_key(page[-1])
+        results["list_all"] = measure(f"list_all: list_packages по {page_size}", pages())
+
+        reviews = [synthetic_review(rng, rng.choice(numbers)) for _ in range(ops)]
+        results["add_review"] = measure("add_review: add_review", (
+            lambda review=review: package_service.add_review(*review) for review in reviews))
+    finally:
+        package_service.configure_tracking_cache(size=database.PACKAGE_CACHE_SIZE)
+    return results
+
+def compare_results(current, baseline, threshold):
+    """
+    Сравнение результатов suite с базовым запуском
+
+    Регрессией считается падение ops_per_sec или рост p99_ms больше чем на долю threshold.
+
+    Returns:
+        list: Описания регрессий
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base.get("ops_per_sec") and result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {result['ops_per_sec']:.0f} оп/с против {base['ops_per_sec']:.0f} оп/с")
+        if base.get("p99_ms") and result["p99_ms"] is not None and result["p99_ms"] > base["p99_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {result['p99_ms']:.3f} мс против {base['p99_ms']:.3f} мс")
+    return regressions
+
+def bench_suite(args):
+    """Набор сценариев слоев database и package_service на синтетических данных заданного объема"""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        start = time.perf_counter()
+        numbers = generate_dataset(args.scale, rng)
+        fill_elapsed = time.perf_counter() - start
+        report(f"заполнение базы ({args.scale} посылок)", args.scale, fill_elapsed)
+        setup = {"elapsed": fill_elapsed, "peak_rss_mb": peak_rss_mb(),
+                 "packages": database.count_rows("packages"), "couriers": database.count_rows("couriers"),
+                 "reviews": database.count_rows("reviews")}
+
+        scenarios = run_scenarios(numbers, args.ops, rng, args.page_size)
+        database.close_connections()
+
+    results = {
+        "meta": {
+            "scale": args.scale,
+            "ops": args.ops,
+            "page_size": args.page_size,
+            "seed": args.seed,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "setup": setup,
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        base_meta = baseline.get("meta", {})
+        if (base_meta.get("scale"), base_meta.get("ops")) != (args.scale, args.ops):
+            print(f"Внимание: базовый запуск выполнен с scale={base_meta.get('scale')}, ops={base_meta.get('ops')}")
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"Регрессии относительно {args.baseline} (порог {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"Регрессий относительно {args.baseline} нет (порог {args.threshold:.0%})")
+    return 0
+
+def bench_dispatch(args):
+    """Политики распределения посылок между курьерами: в памяти и через базу данных"""
+    rng = random.Random(args.seed)
+    # Курьеры распределены по городам, часть - без зоны
+    couriers = [{"id": index + 1, "zone": rng.choice(CITIES) if rng.random() < 0.9 else "",
+                 "active_load": rng.randint(0, 20)} for index in range(args.couriers)]
+    parcels = [{"id": index + 1, "tracking_number": None, "recipient_address": synthetic_package(rng)[4]}
+               for index in range(args.parcels)]
+
+    for policy, plan in dispatcher.POLICIES.items():
+        start = time.perf_counter()
+        assignments = plan(parcels, couriers)
+        elapsed = time.perf_counter() - start
+        report(f"{policy}: {args.parcels} x {args.couriers} курьеров", len(assignments), elapsed)
+
+        loads = {courier["id"]: courier["active_load"] for courier in couriers}
+        zones = {courier["id"]: dispatcher.normalize_zone(courier["zone"]) for courier in couriers}
+        in_zone = 0
+        for (parcel_id, courier_id), parcel in zip(assignments, parcels):
+            loads[courier_id] += 1
+            in_zone += zones[courier_id] == dispatcher.address_zone(parcel["recipient_address"])
+        print(f"  нагрузка: мин {min(loads.values())}, макс {max(loads.values())}; "
+              f"в зоне посылки: {in_zone / len(assignments):.1%}")
+
+    # Полный путь: очередь в базе, расчет и запись назначений с обновлением нагрузки триггерами
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        database.create_couriers_bulk([synthetic_courier(rng, index) + (courier["zone"],)
+                                       for index, courier in enumerate(couriers)])
+        created = 0
+        while created < args.parcels:
+            count = min(FILL_CHUNK_SIZE, args.parcels - created)
+            numbers = tracking_numbers.get_generator().take(count)
+            database.create_packages_bulk([(number,) + synthetic_package(rng) for number in numbers])
+            created += count
+
+        for policy in dispatcher.POLICIES:
+            conn = database.get_connection()
+            with conn:
+                conn.execute("UPDATE packages SET courier_id = NULL")
+            start = time.perf_counter()
+            assigned = 0
+            while True:
+                success, result = package_service.dispatch_packages(policy, args.batch_size)
+                assigned += result["assigned"]
+                if result["pending"] < args.batch_size:
+                    break
+            report(f"dispatch_packages ({policy}, порции по {args.batch_size})", assigned,
+                   time.perf_counter() - start)
+        database.close_connections()
+
+def run_writers(threads, numbers, write):
+    """
+    Запись посылок из нескольких потоков одновременно
+
+    Args:
+        threads (int): Количество потоков записи
+        numbers (list): Номера отслеживания, делятся между потоками поровну
+        write (callable): Функция (номер) -> bool, записывающая одну посылку
+
+    Returns:
+        tuple: (записано посылок, время в секундах)
+    """
+    written = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        barrier.wait()
+        for number in numbers[index::threads]:
+            written[index] += bool(write(number))
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return sum(written), time.perf_counter() - start
+
+def bench_group_commit(args):
+    """Прием посылок из нескольких потоков: транзакция на запись против очереди с групповой фиксацией"""
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        generator = tracking_numbers.get_generator()
+        for threads in args.threads:
+            numbers = generator.take(args.ops)
+            written, elapsed = run_writers(
+                threads, numbers,
+                lambda number: database.create_package(number, "Бенчмарк", "Отправитель", "Получатель"))
+            report(f"транзакция на запись, потоков: {threads}", written, elapsed)
+
+            numbers = generator.take(args.ops)
+            with write_queue.WriteQueue(args.max_batch, args.max_delay) as queue:
+                written, elapsed = run_writers(
+                    threads, numbers,
+                    lambda number: queue.create_package(number, "Бенчмарк", "Отправитель", "Получатель").result())
+            report(f"групповая фиксация, потоков: {threads}", written, elapsed)
+            print(f"  транзакций: {queue.batches}, записей в транзакции: {queue.operations / max(queue.batches, 1):.1f}")
+        database.close_connections()
+
+def timed_queries(name, queries, call):
+    """
+    Замер запросов с выводом перцентилей задержки
+
+    Args:
+        name (str): Название замера
+        queries (list): Аргументы запросов
+        call (callable): Функция (*аргументы) -> список найденного
+
+    Returns:
+        float: Среднее количество найденного на запрос
+    """
+    timings = []
+    found = 0
+    for query in queries:
+        start = time.perf_counter()
+        found += len(call(*query))
+        timings.append(time.perf_counter() - start)
+    report(name, len(queries), sum(timings))
+    timings.sort()
+    print(f"  p50 {percentile(timings, 0.5) * 1000:.2f} мс, p99 {percentile(timings, 0.99) * 1000:.2f} мс, "
+          f"в среднем найдено {found / len(queries):.1f}")
+    return found / len(queries)
+
+def bench_spatial(args):
+    """Поиск посылок в радиусе и ближайших курьеров: индекс R*Tree против отбора по всем посылкам"""
+    rng = random.Random(args.seed)
+    index = geocoder.get_index()
+    centres = [index.resolve(f"г. {city}") for city in CITIES] if index is not None else []
+    centres = [centre[:2] for centre in centres if centre] or [(55.7558, 37.6173)]
+
+    def point(spread_km):
+        lat, lon = rng.choice(centres)
+        lat += rng.gauss(0, spread_km) / spatial.KM_PER_DEGREE
+        return lat, lon + rng.gauss(0, spread_km) / (spatial.KM_PER_DEGREE * math.cos(math.radians(lat)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        start = time.perf_counter()
+        created = 0
+        while created < args.points:
+            count = min(FILL_CHUNK_SIZE, args.points - created)
+            numbers = tracking_numbers.get_generator().take(count)
+            database.create_packages_bulk([(number,) + synthetic_package(rng) for number in numbers])
+            # В новой базе id посылок идут подряд с 1
+            database.save_package_locations([(created + offset + 1,) + point(args.spread)
+                                             for offset in range(count)])
+            created += count
+        report("заполнение посылок с координатами", created, time.perf_counter() - start)
+
+        database.create_couriers_bulk([synthetic_courier(rng, index) for index in range(args.couriers)])
+        for courier_id in range(1, args.couriers + 1):
+            database.set_courier_location(courier_id, *point(args.spread))
+
+        queries = [point(args.spread) for _ in range(args.ops)]
+        timed_queries(f"packages_within ({args.radius} км), R*Tree", queries,
+                      lambda lat, lon: package_service.packages_within(lat, lon, args.radius, limit=args.points)[1])
+
+        def scan_all(lat, lon):
+            # Прежний путь: все посылки с координатами и отбор по расстоянию в Python
+            return spatial.within_radius(database.get_packages_in_box(-90, 90, -180, 180), lat, lon, args.radius)
+        timed_queries(f"отбор по всем посылкам ({args.radius} км)", queries[:args.scan_ops], scan_all)
+
+        timed_queries(f"nearest_packages (k={args.k})", queries,
+                      lambda lat, lon: package_service.nearest_packages(lat, lon, args.k)[1])
+        timed_queries("nearest_couriers (k=1)", queries,
+                      lambda lat, lon: package_service.nearest_couriers(lat, lon)[1])
+        database.close_connections()
+
+def bench_route(args):
+    """Маршрут курьера: порядок назначения, жадный обход и обход с локальным поиском"""
+    rng = random.Random(args.seed)
+    centre = (55.7558, 37.6173)
+    print(f"NumPy: {'есть' if routing.np is not None else 'нет, расчет на списках Python'}")
+    for count in args.stops:
+        points = []
+        for _ in range(count):
+            lat = centre[0] + rng.gauss(0, args.spread) / spatial.KM_PER_DEGREE
+            lon = centre[1] + rng.gauss(0, args.spread) / (spatial.KM_PER_DEGREE * math.cos(math.radians(lat)))
+            points.append((lat, lon))
+        naive = routing.route_length(points, range(count), centre)
+        print(f"остановок: {count}, в порядке назначения {naive:.1f} км")
+        for name, budget in (("жадный обход", 0), ("2-opt + Or-opt", args.time_budget)):
+            start = time.perf_counter()
+            order, length = routing.plan_route(points, centre, time_budget=budget)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<16} {length:>10.1f} км ({length / naive:.1%}), {elapsed * 1000:.0f} мс")
+
+def bench_archive(args):
+    """Список посылок и поиск по номеру до и после переноса завершенных посылок в архив"""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_db(directory)
+        numbers = []
+        start = time.perf_counter()
+        while len(numbers) < args.rows:
+            chunk = tracking_numbers.get_generator().take(min(FILL_CHUNK_SIZE, args.rows - len(numbers)))
+            database.create_packages_bulk([(number,) + synthetic_package(rng) for number in chunk])
+            numbers.extend(chunk)
+        # Завершенные посылки распределены по последним двум годам
+        conn = database.get_connection()
+        with conn:
+            conn.execute(
+                "UPDATE packages SET status = ?, created_at = datetime('now', -(abs(random()) % 730) || ' days') "
+                "WHERE abs(random()) % 1000 < ?",
+                (database.TERMINAL_STATUSES[0], int(args.delivered * 1000))
+            )
+            conn.execute("UPDATE packages SET status_updated_at = created_at")
+        report("заполнение посылок", len(numbers), time.perf_counter() - start)
+
+        database.configure_package_cache(maxsize=0)
+        queries = [(rng.choice(numbers),) for _ in range(args.ops)]
+        timed_queries("get_package_by_tracking до архива", queries,
+                      lambda number: [database.get_package_by_tracking(number)])
+        start = time.perf_counter()
+        total = len(database.get_all_packages())
+        report("get_all_packages до архива", total, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        archived = 0
+        while True:
+            result = database.archive_packages(datetime.now() - timedelta(days=args.older_than), args.batch_size)
+            archived += result["archived"]
+            if result["archived"] < args.batch_size:
+                break
+        report("перенос в архив", archived, time.perf_counter() - start)
+        print(f"  таблиц архива: {len(database.get_archive_partitions())}")
+
+        start = time.perf_counter()
+        total = len(database.get_all_packages())
+        report("get_all_packages после архива", total, time.perf_counter() - start)
+        timed_queries("get_package_by_tracking после архива", queries,
+                      lambda number: [database.get_package_by_tracking(number)])
+        database.configure_package_cache(maxsize=database.PACKAGE_CACHE_SIZE)
+        database.close_connections()
+
+def main():
+    """Разбор аргументов командной строки и запуск выбранного бенчмарка"""
+    parser = argparse.ArgumentParser(description="Бенчмарки службы доставки")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    connections = subparsers.add_parser("connections", help="connect на вызов против пула соединений")
+    connections.add_argument("--ops", type=int, default=5000, help="Количество операций")
+    connections.set_defaults(func=bench_connections)
+
+    bulk = subparsers.add_parser("bulk", help="поштучная отправка против пакетного приема")
+    bulk.add_argument("--ops", type=int, default=50000, help="Количество посылок в манифесте")
+    bulk.add_argument("--chunk-size", type=int, default=package_service.BULK_CHUNK_SIZE,
+                      help="Количество посылок в одной транзакции")
+    bulk.set_defaults(func=bench_bulk)
+
+    collisions = subparsers.add_parser("collisions", help="коллизии номеров отслеживания")
+    collisions.add_argument("--rows", type=int, default=10000000, help="Количество выдаваемых номеров")
+    collisions.add_argument("--checkpoints", type=int, default=10, help="Количество промежуточных отчетов")
+    collisions.set_defaults(func=bench_collisions)
+
+    cache = subparsers.add_parser("cache", help="отслеживание посылок с кэшем и без него")
+    cache.add_argument("--ops", type=int, default=100000, help="Количество запросов отслеживания")
+    cache.add_argument("--packages", type=int, default=20000, help="Количество посылок в базе")
+    cache.add_argument("--cache-size", type=int, default=database.PACKAGE_CACHE_SIZE, help="Размер кэша")
+    cache.set_defaults(func=bench_cache)
+
+    scans = subparsers.add_parser("scans", help="поштучное и пакетное обновление статусов")
+    scans.add_argument("--ops", type=int, default=20000, help="Количество сканирований")
+    scans.set_defaults(func=bench_scans)
+
+    track_batch = subparsers.add_parser("track-batch", help="отслеживание списка посылок")
+    track_batch.add_argument("--packages", type=int, default=20000, help="Количество посылок в базе")
+    track_batch.add_argument("--batch-size", type=int, default=500, help="Номеров в одном списке")
+    track_batch.add_argument("--batches", type=int, default=100, help="Количество списков")
+    track_batch.set_defaults(func=bench_track_batch)
+
+    search = subparsers.add_parser("search", help="полнотекстовый поиск посылок")
+    search.add_argument("--rows", type=int, default=1000000, help="Количество посылок в базе")
+    search.add_argument("--ops", type=int, default=1000, help="Количество поисковых запросов")
+    search.add_argument("--limit", type=int, default=50, help="Максимум результатов на запрос")
+    search.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+    search.set_defaults(func=bench_search)
+
+    suite = subparsers.add_parser("suite", help="сценарии слоев database и package_service с сохранением в JSON")
+    suite.add_argument("--scale", type=int, default=10000, help="Количество посылок в базе")
+    suite.add_argument("--ops", type=int, default=2000, help="Количество операций в каждом сценарии")
+    suite.add_argument("--page-size", type=int, default=100, help="Размер страницы в сценарии list_all")
+    suite.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+    suite.add_argument("--output", help="Файл JSON для сохранения результатов")
+    suite.add_argument("--baseline", help="Файл JSON базового запуска для поиска регрессий")
+    suite.add_argument("--threshold", type=float, default=0.2,
+                       help="Допустимое ухудшение относительно базового запуска (доля)")
+    suite.set_defaults(func=bench_suite)
+
+    dispatch = subparsers.add_parser("dispatch", help="политики распределения посылок между курьерами")
+    dispatch.add_argument("--parcels", type=int, default=100000, help="Количество посылок")
+    dispatch.add_argument("--couriers", type=int, default=1000, help="Количество курьеров")
+    dispatch.add_argument("--batch-size", type=int, default=package_service.DISPATCH_BATCH_SIZE,
+                          help="Посылок в одной транзакции распределения")
+    dispatch.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+    dispatch.set_defaults(func=bench_dispatch)
+
+    group_commit = subparsers.add_parser("group-commit", help="одновременная запись из потоков с групповой фиксацией")
+    group_commit.add_argument("--ops", type=int, default=20000, help="Количество посылок на каждый замер")
+    group_commit.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                              help="Количество потоков записи")
+    group_commit.add_argument("--max-batch", type=int, default=write_queue.DEFAULT_MAX_BATCH,
+                              help="Наибольшее количество записей в одной транзакции")
+    group_commit.add_argument("--max-delay", type=float, default=write_queue.DEFAULT_MAX_DELAY_MS,
+                              help="Сколько ждать следующих записей после первой в группе (мс)")
+    group_commit.set_defaults(func=bench_group_commit)
+
+    spatial_search = subparsers.add_parser("spatial", help="поиск посылок в радиусе и ближайших курьеров")
+    spatial_search.add_argument("--points", type=int, default=1000000, help="Количество посылок с координатами")
+    spatial_search.add_argument("--couriers", type=int, default=1000, help="Количество курьеров с координатами")
+    spatial_search.add_argument("--spread", type=float, default=10.0,
+                                help="Разброс точек вокруг центров городов (км, стандартное отклонение)")
+    spatial_search.add_argument("--radius", type=float, default=3.0, help="Радиус поиска посылок (км)")
+    spatial_search.add_argument("--k", type=int, default=10, help="Количество ближайших посылок")
+    spatial_search.add_argument("--ops", type=int, default=1000, help="Количество запросов")
+    spatial_search.add_argument("--scan-ops", type=int, default=5, help="Запросов отбора по всем посылкам")
+    spatial_search.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+    spatial_search.set_defaults(func=bench_spatial)
+
+    archive = subparsers.add_parser("archive", help="перенос завершенных посылок в помесячный архив")
+    archive.add_argument("--rows", type=int, default=1000000, help="Количество посылок в базе")
+    archive.add_argument("--delivered", type=float, default=0.9, help="Доля завершенных посылок")
+    archive.add_argument("--older-than", type=int, default=package_service.ARCHIVE_AFTER_DAYS,
+                         help="Сколько дней посылка должна пробыть в конечном статусе")
+    archive.add_argument("--batch-size", type=int, default=package_service.ARCHIVE_BATCH_SIZE,
+                         help="Посылок в одной транзакции")
+    archive.add_argument("--ops", type=int, default=10000, help="Количество поисков по номеру")
+    archive.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+    archive.set_defaults(func=bench_archive)
+
+    route = subparsers.add_parser("route", help="построение маршрута курьера")
+    route.add_argument("--stops", type=int, nargs="+", default=[100, 500, 1000], help="Количество остановок")
+    route.add_argument("--spread", type=float, default=10.0,
+                       help="Разброс остановок вокруг центра (км, стандартное отклонение)")
+    route.add_argument("--time-budget", type=float, default=routing.DEFAULT_TIME_BUDGET,
+                       help="Время на улучшение маршрута (с)")
+    route.add_argument("--seed", type=int, default=1, help="Начальное значение генератора данных")
+    route.set_defaults(func=bench_route)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Модуль кэширования для приложения "Служба доставки".
+Содержит ограниченный по размеру LRU-кэш со временем жизни записей
+и отдельным (коротким) временем жизни для отрицательных результатов.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Признак отсутствия записи в кэше (None - допустимое кэшируемое значение)
+MISSING = object()
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с TTL и счетчиками попаданий, промахов и вытеснений"""
+
+    def __init__(self, maxsize=1024, ttl=None, negative_ttl=None):
+        """
+        Инициализация кэша
+
+        Args:
+            maxsize (int): Максимальное количество записей (0 - кэш отключен)
+            ttl (float): Время жизни записи в секундах или None (без ограничения)
+            negative_ttl (float): Время жизни записи со значением None (например,
+                "посылка не найдена") в секундах; None - такие записи не кэшируются
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Увеличивается при каждом сбросе записи: значение, прочитанное из БД
+        # до сброса, не должно попасть в кэш после него
+        self.version = 0
+
+    def get(self, key):
+        """
+        Получение значения из кэша
+
+        Args:
+            key: Ключ записи
+
+        Returns:
+            Значение или MISSING если записи нет или она устарела
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def put(self, key, value, version=None):
+        """
+        Сохранение значения в кэше
+
+        Args:
+            key: Ключ записи
+            value: Значение (None сохраняется с временем жизни negative_ttl)
+            version (int): Значение self.version до чтения value из источника;
+                если с тех пор были сбросы, значение не сохраняется
+        """
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if self.maxsize <= 0 or (value is None and ttl is None):
+            return
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Удаление записи из кэша"""
+        with self._lock:
+            self.version += 1
+            if self._data.pop(key, MISSING) is not MISSING:
+                self.invalidations += 1
+
+    def clear(self):
+        """Очистка кэша"""
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+
+    def configure(self, maxsize=None, ttl=MISSING, negative_ttl=MISSING):
+        """
+        Изменение параметров кэша
+
+        Args:
+            maxsize (int): Новый максимальный размер (лишние записи вытесняются)
+            ttl (float): Новое время жизни записей
+            negative_ttl (float): Новое время жизни отрицательных записей
+        """
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+                while len(self._data) > max(self.maxsize, 0):
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+            if ttl is not MISSING:
+                self.ttl = ttl
+            if negative_ttl is not MISSING:
+                self.negative_ttl = negative_ttl
+
+    def stats(self):
+        """
+        Статистика работы кэша
+
+        Returns:
+            dict: Размер, параметры и счетчики попаданий, промахов, вытеснений и сбросов
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -8,13 +8,401 @@
 
 import sqlite3
 import os
+import random
+import re
+import threading
 from datetime import datetime
+from cache import LRUCache, MISSING
 
 DB_NAME = "delivery_service.db"
 
+# Статус только что созданной посылки
+INITIAL_STATUS = "Отправлена"
+# Статусы, которые может установить сканирование посылки курьером
+SCAN_STATUSES = ("В пути", "Прибыла в пункт выдачи", "Доставлена", "Возвращена")
+# Конечные статусы: после них статус посылки больше не меняется сканированием
+TERMINAL_STATUSES = ("Доставлена", "Возвращена")
+# Статус курьера, которому можно назначать посылки
+COURIER_ACTIVE_STATUS = "Активен"
+
+# Параметры соединений с базой данных
+PRAGMAS = {
+    "journal_mode": "WAL",        # Читатели не блокируют писателя
+    "synchronous": "NORMAL",      # В режиме WAL безопасно и без fsync на каждый коммит
+    "cache_size": -16000,         # Кэш страниц ~16 МБ (отрицательное значение - в КиБ)
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "foreign_keys": "OFF",
+}
+# Размер кэша подготовленных выражений на одно соединение
+STATEMENT_CACHE_SIZE = 256
+# Сколько ждать снятия блокировки записи другим соединением или процессом (с)
+BUSY_TIMEOUT = 5.0
+# Максимальное число параметров в одном запросе с IN (...)
+MAX_QUERY_PARAMS = 500
+
+# Кэш поиска посылок по номеру отслеживания. Сбрасывается при записи
+# (write-through), TTL ограничивает устаревание при записи из других процессов.
+PACKAGE_CACHE_SIZE = 10000
+PACKAGE_CACHE_TTL = 60
+# Время жизни записи "посылка не найдена"
+PACKAGE_CACHE_NEGATIVE_TTL = 5
+package_cache = LRUCache(PACKAGE_CACHE_SIZE, PACKAGE_CACHE_TTL, PACKAGE_CACHE_NEGATIVE_TTL)
+
+_local = threading.local()
+_connections_lock = threading.Lock()
+# Открытые соединения и потоки, которым они принадлежат
+_connections = {}
+# Увеличивается при close_connections() и reopen_connections(), чтобы потоки открыли соединения заново
+_generation = 0
+# Класс новых соединений (instrumentation подменяет его классом с замерами времени)
+connection_factory = sqlite3.Connection
+
+
+def _open_connection(path):
+    """
+    Открытие нового соединения с применением настроек PRAGMAS
+
+    Args:
+        path (str): Путь к файлу базы данных
+
+    Returns:
+        sqlite3.Connection: Настроенное соединение
+    """
+    # Соединение используется только своим потоком, но закрываться может из любого
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False, factory=connection_factory)
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def get_connection():
+    """
+    Получение долгоживущего соединения текущего потока
+
+    Соединение создается один раз на поток и на файл базы данных и затем
+    переиспользуется, вместе с кэшем подготовленных выражений sqlite3.
+    Транзакции следует оформлять через "with conn:".
+
+    Returns:
+        sqlite3.Connection: Соединение с базой данных DB_NAME
+    """
+    conns = getattr(_local, "connections", None)
+    if conns is None or _local.generation != _generation:
+        # Соединения прежнего поколения поток закрывает сам: ими больше никто не пользуется
+        stale = getattr(_local, "stale", [])
+        stale.extend((conns or {}).values())
+        _local.stale = _close_idle(stale)
+        conns = _local.connections = {}
+        _local.generation = _generation
+    conn = conns.get(DB_NAME)
+    if conn is None:
+        conn = conns[DB_NAME] = _open_connection(DB_NAME)
+        with _connections_lock:
+            _connections[conn] = threading.current_thread()
+    return conn
+
+
+def _close_idle(conns):
+    """
+    Закрытие соединений без открытой транзакции
+
+    Returns:
+        list: Соединения, которые еще заняты транзакцией и не закрыты
+    """
+    busy = [conn for conn in conns if conn.in_transaction]
+    idle = [conn for conn in conns if not conn.in_transaction]
+    with _connections_lock:
+        for conn in idle:
+            _connections.pop(conn, None)
+    for conn in idle:
+        conn.close()
+    return busy
+
+
+def close_connections():
+    """
+    Закрытие соединений (при завершении работы, после остановки фоновых потоков, или при смене DB_NAME)
+
+    Сразу закрываются соединения текущего потока и уже завершившихся потоков.
+    Соединение работающего потока может быть занято запросом, поэтому оно
+    только помечается устаревшим: поток закроет его сам при следующем get_connection().
+    """
+    global _generation
+    current = threading.current_thread()
+    with _connections_lock:
+        _generation += 1
+        conns = [conn for conn, owner in _connections.items() if owner is current or not owner.is_alive()]
+        for conn in conns:
+            del _connections[conn]
+    for conn in conns:
+        conn.close()
+    # Соединения текущего потока уже закрыты
+    _local.connections = {}
+    _local.stale = []
+    _local.generation = _generation
+
+
+def is_busy_error(error):
+    """Является ли ошибка блокировкой базы данных другим соединением ("database is locked")"""
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+
+def reopen_connections():
+    """
+    Открытие потоками новых соединений при следующем обращении (после смены connection_factory)
+
+    Прежние соединения могут использоваться в эту минуту, поэтому здесь не
+    закрываются: каждый поток закрывает свои устаревшие соединения сам при
+    следующем get_connection(), соединения завершившихся потоков закрывает
+    close_connections().
+    """
+    global _generation
+    with _connections_lock:
+        _generation += 1
+
+# Столбцы посылок, по которым строится полнотекстовый индекс, и их веса при ранжировании
+SEARCH_COLUMNS = (
+    ("description", 1.0),
+    ("sender", 4.0),
+    ("recipient", 4.0),
+    ("sender_address", 2.0),
+    ("recipient_address", 2.0),
+)
+# Сколько самых новых совпадений ранжировать при поиске
+SEARCH_CANDIDATES = 100
+# Слова поискового запроса (буквы и цифры любого алфавита)
+_SEARCH_TERM_RE = re.compile(r"\w+")
+
+def _create_packages_fts(conn):
+    """
+    Создание полнотекстового индекса FTS5 по посылкам и триггеров синхронизации
+    
+    Индекс хранит только словарь (content='packages'), сами строки читаются из
+    packages. Если SQLite собран без FTS5, индекс не создается и search_packages()
+    выполняет поиск через LIKE.
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+    """
+    columns = ", ".join(column for column, weight in SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column, weight in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column, weight in SEARCH_COLUMNS)
+    try:
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS packages_fts USING fts5(
+                {columns}, content='packages', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Полнотекстовый поиск недоступен, будет использоваться LIKE: {e}")
+        return
+    
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS packages_fts_insert AFTER INSERT ON packages BEGIN
+            INSERT INTO packages_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS packages_fts_delete AFTER DELETE ON packages BEGIN
+            INSERT INTO packages_fts (packages_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    # Смена статуса не затрагивает индексируемые столбцы и индекс не трогает
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS packages_fts_update AFTER UPDATE OF {columns} ON packages BEGIN
+            INSERT INTO packages_fts (packages_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO packages_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    # Индексирование уже существующих посылок
+    conn.execute("INSERT INTO packages_fts (packages_fts) VALUES ('rebuild')")
+
+# Области агрегатов оценок: по посылке (ключ - номер отслеживания),
+# по дню (ключ - дата ГГГГ-ММ-ДД) и общий (ключ - пустая строка)
+RATING_SCOPE_PARCEL = "parcel"
+RATING_SCOPE_DAY = "day"
+RATING_SCOPE_ALL = "all"
+# Количество, сумма и гистограмма оценок группы отзывов
+_RATING_COLUMNS_SQL = "COUNT(*), COALESCE(SUM(rating), 0), " + ", ".join(
+    f"COALESCE(SUM(rating = {rating}), 0)" for rating in range(1, 6)
+)
+
+def _active_parcel_sql(row):
+    """Условие SQL "посылка не в конечном статусе" для строки row (new, old или имя таблицы)"""
+    return f"{row}.status NOT IN (" + ", ".join(f"'{status}'" for status in TERMINAL_STATUSES) + ")"
+
+# Версионированные миграции схемы. Номер последней примененной миграции
+# хранится в PRAGMA user_version. Шаг миграции - SQL-строка или функция(conn).
+MIGRATIONS = [
+    (1, "Индексы для сортировки и поиска посылок, отзывов и курьеров", [
+        "CREATE INDEX IF NOT EXISTS idx_packages_created_at ON packages(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_packages_status ON packages(status)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_tracking_number ON reviews(tracking_number, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_reviews_created_at ON reviews(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_couriers_name ON couriers(name)",
+    ]),
+    (2, "Журнал смены статусов посылок", [
+        '''
+        CREATE TABLE IF NOT EXISTS package_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tracking_number TEXT NOT NULL,
+            status TEXT NOT NULL,
+            ts TIMESTAMP NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_package_events_tracking_ts ON package_events(tracking_number, ts)",
+        # Время последнего события - часть проекции текущего статуса в packages
+        "ALTER TABLE packages ADD COLUMN status_updated_at TIMESTAMP",
+        # Текущие статусы существующих посылок становятся первыми событиями журнала
+        "INSERT INTO package_events (tracking_number, status, ts) SELECT tracking_number, status, created_at FROM packages",
+        "UPDATE packages SET status_updated_at = created_at",
+    ]),
+    (3, "Полнотекстовый поиск посылок", [
+        _create_packages_fts,
+    ]),
+    (4, "Агрегаты оценок отзывов", [
+        '''
+        CREATE TABLE IF NOT EXISTS rating_aggregates (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            r1 INTEGER NOT NULL DEFAULT 0,
+            r2 INTEGER NOT NULL DEFAULT 0,
+            r3 INTEGER NOT NULL DEFAULT 0,
+            r4 INTEGER NOT NULL DEFAULT 0,
+            r5 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID
+        ''',
+        # Агрегаты по уже существующим отзывам
+        f"INSERT INTO rating_aggregates SELECT '{RATING_SCOPE_PARCEL}', tracking_number, {_RATING_COLUMNS_SQL} "
+        "FROM reviews WHERE tracking_number IS NOT NULL AND tracking_number != '' GROUP BY tracking_number",
+        f"INSERT INTO rating_aggregates SELECT '{RATING_SCOPE_DAY}', substr(created_at, 1, 10), {_RATING_COLUMNS_SQL} "
+        "FROM reviews GROUP BY substr(created_at, 1, 10)",
+        f"INSERT INTO rating_aggregates SELECT '{RATING_SCOPE_ALL}', '', {_RATING_COLUMNS_SQL} FROM reviews",
+    ]),
+    (5, "Индекс посылок по статусу и дате для выгрузки без сортировки", [
+        "CREATE INDEX IF NOT EXISTS idx_packages_status_created_at ON packages(status, created_at)",
+        # Поиск по статусу обслуживает новый индекс (статус - его первый столбец)
+        "DROP INDEX IF EXISTS idx_packages_status",
+    ]),
+    (6, "Назначение посылок курьерам", [
+        "ALTER TABLE packages ADD COLUMN courier_id INTEGER",
+        "ALTER TABLE couriers ADD COLUMN zone TEXT NOT NULL DEFAULT ''",
+        # Количество назначенных курьеру посылок не в конечном статусе; поддерживается триггерами
+        "ALTER TABLE couriers ADD COLUMN active_load INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_packages_courier_id ON packages(courier_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_couriers_status ON couriers(status)",
+        # Очередь распределения: только новые посылки без курьера
+        "CREATE INDEX IF NOT EXISTS idx_packages_unassigned ON packages(created_at) "
+        f"WHERE courier_id IS NULL AND status = '{INITIAL_STATUS}'",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS packages_courier_load_insert AFTER INSERT ON packages
+        WHEN new.courier_id IS NOT NULL AND {_active_parcel_sql("new")}
+        BEGIN
+            UPDATE couriers SET active_load = active_load + 1 WHERE id = new.courier_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS packages_courier_load_update AFTER UPDATE OF courier_id, status ON packages
+        WHEN old.courier_id IS NOT new.courier_id OR ({_active_parcel_sql("old")}) != ({_active_parcel_sql("new")})
+        BEGIN
+            UPDATE couriers SET active_load = active_load - 1 WHERE id = old.courier_id AND {_active_parcel_sql("old")};
+            UPDATE couriers SET active_load = active_load + 1 WHERE id = new.courier_id AND {_active_parcel_sql("new")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS packages_courier_load_delete AFTER DELETE ON packages
+        WHEN old.courier_id IS NOT NULL AND {_active_parcel_sql("old")}
+        BEGIN
+            UPDATE couriers SET active_load = active_load - 1 WHERE id = old.courier_id;
+        END
+        """,
+    ]),
+    (7, "Кэш координат адресов", [
+        # lat и lon равны NULL, если адрес не найден в справочнике
+        '''
+        CREATE TABLE IF NOT EXISTS geocodes (
+            address TEXT PRIMARY KEY,
+            lat REAL,
+            lon REAL,
+            precision TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (8, "Пространственные индексы посылок и курьеров", [
+        # id - id посылки или курьера; точка хранится прямоугольником нулевого
+        # размера, точные координаты - во вспомогательных столбцах lat и lon
+        "CREATE VIRTUAL TABLE IF NOT EXISTS package_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon, +lat, +lon)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS courier_locations USING rtree(id, min_lat, max_lat, min_lon, max_lon, +lat, +lon)",
+        """
+        CREATE TRIGGER IF NOT EXISTS packages_location_delete AFTER DELETE ON packages
+        BEGIN
+            DELETE FROM package_locations WHERE id = old.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS couriers_location_delete AFTER DELETE ON couriers
+        BEGIN
+            DELETE FROM courier_locations WHERE id = old.id;
+        END
+        """,
+    ]),
+    (9, "Архив посылок в конечном статусе", [
+        # Номер архивной посылки -> помесячная таблица архива, в которой она лежит
+        '''
+        CREATE TABLE IF NOT EXISTS archived_packages (
+            tracking_number TEXT PRIMARY KEY,
+            partition TEXT NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        # Номер архивной посылки остается занятым (как UNIQUE в packages)
+        """
+        CREATE TRIGGER IF NOT EXISTS packages_archived_number_insert BEFORE INSERT ON packages
+        WHEN EXISTS (SELECT 1 FROM archived_packages WHERE tracking_number = new.tracking_number)
+        BEGIN
+            SELECT RAISE(ABORT, 'UNIQUE constraint failed: packages.tracking_number');
+        END
+        """,
+    ]),
+]
+
+def get_schema_version(conn):
+    """Текущая версия схемы базы данных"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+    """
+    Применение еще не выполненных миграций из MIGRATIONS
+    
+    Каждая миграция выполняется в своей транзакции вместе с обновлением
+    user_version, поэтому прерванная миграция не оставляет схему наполовину измененной.
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+    """
+    current = get_schema_version(conn)
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+
 def initialize_db():
     """Инициализация базы данных, создание необходимых таблиц если они не существуют"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Создание таблицы для посылок
@@ -57,8 +445,19 @@ def initialize_db():
     )
     ''')
     
+    # Создание таблицы счетчиков для генерации номеров отслеживания
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tracking_sequence (
+        name TEXT PRIMARY KEY,
+        next_value INTEGER NOT NULL,
+        permutation_key INTEGER NOT NULL
+    )
+    ''')
+    
     conn.commit()
-    conn.close()
+    
+    # Обновление схемы до последней версии
+    apply_migrations(conn)
 
 def create_package(tracking_number, description, sender, recipient, sender_address="", recipient_address=""):
     """
@@ -76,16 +475,11 @@ def create_package(tracking_number, description, sender, recipient, sender_addre
         bool: True если посылка успешно добавлена, False в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO packages (tracking_number, description, status, sender, recipient, sender_address, recipient_address, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (tracking_number, description, "Отправлена", sender, recipient, sender_address, recipient_address, datetime.now())
-        )
-        
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            insert_package(conn, tracking_number, description, sender, recipient, sender_address, recipient_address)
+        # Сброс записи "посылка не найдена", если номер уже запрашивали
+        invalidate_package_cache(tracking_number)
         return True
     except sqlite3.IntegrityError:
         # Если номер отслеживания уже существует
@@ -94,34 +488,260 @@ def create_package(tracking_number, description, sender, recipient, sender_addre
         print(f"Ошибка при создании посылки: {e}")
         return False
 
+def insert_package(conn, tracking_number, description, sender, recipient, sender_address="", recipient_address=""):
+    """
+    Запись новой посылки и первого события ее журнала в открытой транзакции
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с открытой транзакцией
+        tracking_number (str): Номер отслеживания
+        description (str): Описание посылки
+        sender (str): Отправитель
+        recipient (str): Получатель
+        sender_address (str): Адрес отправителя
+        recipient_address (str): Адрес получателя
+        
+    Returns:
+        bool: True (ошибки передаются исключениями)
+        
+    Raises:
+        sqlite3.IntegrityError: Номер отслеживания уже занят
+    """
+    now = datetime.now()
+    conn.execute(
+        "INSERT INTO packages (tracking_number, description, status, sender, recipient, sender_address, recipient_address, created_at, status_updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (tracking_number, description, INITIAL_STATUS, sender, recipient, sender_address, recipient_address, now, now)
+    )
+    conn.execute(
+        "INSERT INTO package_events (tracking_number, status, ts) VALUES (?, ?, ?)",
+        (tracking_number, INITIAL_STATUS, now)
+    )
+    return True
+
+def _find_existing_tracking_numbers(conn, tracking_numbers):
+    """
+    Поиск уже занятых номеров отслеживания среди переданных
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        tracking_numbers (list): Номера отслеживания для проверки
+
+    Returns:
+        set: Номера, которые уже есть в таблице packages или в архиве
+    """
+    existing = set()
+    for start in range(0, len(tracking_numbers), MAX_QUERY_PARAMS):
+        chunk = tracking_numbers[start:start + MAX_QUERY_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        for table in ("packages", "archived_packages"):
+            cursor = conn.execute(
+                f"SELECT tracking_number FROM {table} WHERE tracking_number IN ({placeholders})",
+                chunk
+            )
+            existing.update(row[0] for row in cursor)
+    return existing
+
+def create_packages_bulk(rows):
+    """
+    Пакетное добавление посылок в одной транзакции
+    
+    Занятые номера отслеживания проверяются внутри той же транзакции,
+    поэтому строки с коллизиями пропускаются, а не обрывают всю вставку.
+    
+    Args:
+        rows (list): Кортежи (tracking_number, description, sender, recipient,
+            sender_address, recipient_address)
+        
+    Returns:
+        tuple: (количество_добавленных, позиции_строк_с_коллизиями)
+            или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        now = datetime.now()
+        with conn:
+            # Блокировка записи сразу, чтобы между проверкой и вставкой никто не занял номер
+            conn.execute("BEGIN IMMEDIATE")
+            existing = _find_existing_tracking_numbers(conn, [row[0] for row in rows])
+            
+            accepted = []
+            duplicates = []
+            for position, row in enumerate(rows):
+                tracking_number, description, sender, recipient, sender_address, recipient_address = row
+                if tracking_number in existing:
+                    duplicates.append(position)
+                    continue
+                existing.add(tracking_number)
+                accepted.append((tracking_number, description, INITIAL_STATUS, sender, recipient,
+                                 sender_address, recipient_address, now, now))
+            
+            conn.executemany(
+                "INSERT INTO packages (tracking_number, description, status, sender, recipient, sender_address, recipient_address, created_at, status_updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                accepted
+            )
+            conn.executemany(
+                "INSERT INTO package_events (tracking_number, status, ts) VALUES (?, ?, ?)",
+                ((row[0], INITIAL_STATUS, now) for row in accepted)
+            )
+        for row in accepted:
+            invalidate_package_cache(row[0])
+        return len(accepted), duplicates
+    except Exception as e:
+        print(f"Ошибка при пакетном создании посылок: {e}")
+        return None
+
+def reserve_tracking_block(size, limit, name="packages"):
+    """
+    Резервирование блока значений счетчика номеров отслеживания
+    
+    Блок резервируется атомарно, поэтому разные процессы и потоки,
+    работающие с одной базой, никогда не получают пересекающиеся блоки.
+    
+    Args:
+        size (int): Размер блока
+        limit (int): Верхняя граница значений счетчика
+        name (str): Имя счетчика
+        
+    Returns:
+        tuple: (начало_блока, конец_блока, ключ_перестановки) или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT next_value, permutation_key FROM tracking_sequence WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                start, key = 0, random.getrandbits(62)
+                conn.execute(
+                    "INSERT INTO tracking_sequence (name, next_value, permutation_key) VALUES (?, ?, ?)",
+                    (name, size, key)
+                )
+            else:
+                start, key = row
+                conn.execute(
+                    "UPDATE tracking_sequence SET next_value = ? WHERE name = ?",
+                    (start + size, name)
+                )
+        end = min(start + size, limit)
+        if start >= end:
+            print("Ошибка при резервировании номеров отслеживания: диапазон номеров исчерпан")
+            return None
+        return start, end, key
+    except Exception as e:
+        print(f"Ошибка при резервировании номеров отслеживания: {e}")
+        return None
+
+# Запросы, которые выполняют функции ниже, вынесены в константы: audit_query_plans()
+# проверяет планы тех же строк (см. AUDITED_QUERIES)
+PACKAGE_BY_TRACKING_SQL = "SELECT * FROM packages WHERE tracking_number = ?"
+
 def get_package_by_tracking(tracking_number):
     """
     Получение информации о посылке по номеру отслеживания
     
+    Посылка, которой нет в packages, ищется в архиве (см. archive_packages).
+    
     Args:
         tracking_number (str): Номер отслеживания
         
     Returns:
         dict: Информация о посылке или None если посылка не найдена
     """
+    key = (DB_NAME, tracking_number)
+    cached = package_cache.get(key)
+    if cached is not MISSING:
+        return dict(cached) if cached is not None else None
+    
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row  # Чтобы получать словарь вместо кортежа
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM packages WHERE tracking_number = ?", (tracking_number,))
+        version = package_cache.version
+        conn = get_connection()
+        cursor = conn.execute(PACKAGE_BY_TRACKING_SQL, (tracking_number,))
         package = cursor.fetchone()
         
-        conn.close()
-        
-        if package:
-            # Конвертация Row в dict
-            return dict(package)
-        return None
+        # Конвертация Row в dict
+        package = dict(package) if package else _get_archived_packages(conn, [tracking_number]).get(tracking_number)
+        package_cache.put(key, package, version)
+        return dict(package) if package else None
     except Exception as e:
         print(f"Ошибка при получении данных посылки: {e}")
         return None
 
+PACKAGES_BY_TRACKING_SQL = "SELECT * FROM packages WHERE tracking_number IN ({placeholders})"
+
+def get_packages_by_tracking(tracking_numbers):
+    """
+    Получение информации о нескольких посылках по номерам отслеживания
+    
+    Номера, которых нет в кэше, читаются запросами WHERE tracking_number IN (...)
+    по MAX_QUERY_PARAMS номеров на одном соединении (ненайденные - затем в архиве);
+    найденные и ненайденные посылки попадают в кэш так же, как в get_package_by_tracking().
+    
+    Args:
+        tracking_numbers (list): Номера отслеживания
+        
+    Returns:
+        dict: {номер: информация_о_посылке или None если посылка не найдена};
+            None в случае ошибки
+    """
+    result = {}
+    missing = []
+    for tracking_number in tracking_numbers:
+        if tracking_number in result:
+            continue
+        cached = package_cache.get((DB_NAME, tracking_number))
+        if cached is MISSING:
+            result[tracking_number] = None
+            missing.append(tracking_number)
+        else:
+            result[tracking_number] = dict(cached) if cached is not None else None
+    if not missing:
+        return result
+    
+    try:
+        version = package_cache.version
+        conn = get_connection()
+        found = {}
+        for start in range(0, len(missing), MAX_QUERY_PARAMS):
+            chunk = missing[start:start + MAX_QUERY_PARAMS]
+            cursor = conn.execute(PACKAGES_BY_TRACKING_SQL.format(placeholders=", ".join("?" * len(chunk))), chunk)
+            found.update((row["tracking_number"], dict(row)) for row in cursor)
+        found.update(_get_archived_packages(conn, [number for number in missing if number not in found]))
+        
+        for tracking_number in missing:
+            package = found.get(tracking_number)
+            package_cache.put((DB_NAME, tracking_number), package, version)
+            result[tracking_number] = dict(package) if package else None
+        return result
+    except Exception as e:
+        print(f"Ошибка при получении данных посылок: {e}")
+        return None
+
+def invalidate_package_cache(tracking_number):
+    """Сброс закэшированных данных посылки после ее изменения"""
+    package_cache.invalidate((DB_NAME, tracking_number))
+
+def configure_package_cache(maxsize=None, ttl=MISSING, negative_ttl=MISSING):
+    """
+    Настройка кэша поиска посылок
+    
+    Args:
+        maxsize (int): Максимальное количество посылок в кэше (0 - кэш отключен)
+        ttl (float): Время жизни записи в секундах или None
+        negative_ttl (float): Время жизни записи "посылка не найдена" или None
+    """
+    package_cache.configure(maxsize, ttl, negative_ttl)
+
+def get_package_cache_stats():
+    """
+    Статистика кэша поиска посылок
+    
+    Returns:
+        dict: Размер, параметры и счетчики hits, misses, evictions, invalidations
+    """
+    return package_cache.stats()
+
 def update_package_status(tracking_number, new_status):
     """
     Обновление статуса посылки
@@ -134,26 +754,252 @@ def update_package_status(tracking_number, new_status):
         bool: True если статус успешно обновлен, False в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE packages SET status = ? WHERE tracking_number = ?",
-            (new_status, tracking_number)
-        )
-        
-        success = cursor.rowcount > 0
-        
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            success = set_package_status(conn, tracking_number, new_status)
+        invalidate_package_cache(tracking_number)
         
         return success
     except Exception as e:
         print(f"Ошибка при обновлении статуса посылки: {e}")
         return False
 
+def set_package_status(conn, tracking_number, new_status):
+    """
+    Смена статуса посылки с записью события журнала в открытой транзакции
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с открытой транзакцией
+        tracking_number (str): Номер отслеживания
+        new_status (str): Новый статус посылки
+        
+    Returns:
+        bool: True если посылка найдена и статус изменен
+    """
+    now = datetime.now()
+    # Текущий статус - проекция последнего события журнала
+    cursor = conn.execute(
+        "UPDATE packages SET status = ?, status_updated_at = ? WHERE tracking_number = ?",
+        (new_status, now, tracking_number)
+    )
+    if cursor.rowcount == 0:
+        return False
+    conn.execute(
+        "INSERT INTO package_events (tracking_number, status, ts) VALUES (?, ?, ?)",
+        (tracking_number, new_status, now)
+    )
+    return True
+
+def update_package_statuses_bulk(scans):
+    """
+    Пакетное применение сканирований посылок в одной транзакции
+    
+    Сканирования загружаются во временную таблицу одним executemany, после
+    чего журнал событий и текущие статусы обновляются несколькими запросами
+    по всей партии, без чтения и записи каждой строки по отдельности.
+    Правила применения к текущему статусу:
+      - посылка в конечном статусе (TERMINAL_STATUSES) не меняется;
+      - из сканирований одной посылки побеждает конечное, иначе самое позднее;
+      - неконечный статус применяется, только если он новее текущего
+        (сканирования, пришедшие не по порядку, не откатывают статус назад).
+    В журнал событий записываются все сканирования известных посылок, кроме
+    сделанных раньше создания посылки: такие сканирования пропускаются.
+    
+    Args:
+        scans (list): Кортежи (tracking_number, status, ts) с уже проверенными значениями;
+            ts - строка локального времени в формате "%Y-%m-%d %H:%M:%S.%f"
+        
+    Returns:
+        dict: applied - сколько посылок сменили статус, recorded - сколько событий
+            записано, unknown - отсортированный список неизвестных номеров,
+            before_created - отсортированный список номеров, сканирования которых
+            пропущены как более ранние, чем создание посылки; None в случае ошибки
+    """
+    terminal = ", ".join("?" * len(TERMINAL_STATUSES))
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS scan_batch ("
+                "seq INTEGER PRIMARY KEY, tracking_number TEXT NOT NULL, status TEXT NOT NULL, ts TIMESTAMP NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS temp.idx_scan_batch_tracking ON scan_batch(tracking_number, ts)")
+            conn.execute("DELETE FROM scan_batch")
+            conn.executemany("INSERT INTO scan_batch (tracking_number, status, ts) VALUES (?, ?, ?)", scans)
+            
+            unknown = [row[0] for row in conn.execute(
+                "SELECT DISTINCT tracking_number FROM scan_batch "
+                "WHERE tracking_number NOT IN (SELECT tracking_number FROM packages) ORDER BY tracking_number"
+            )]
+            
+            before_created = [row[0] for row in conn.execute(
+                "SELECT DISTINCT b.tracking_number FROM scan_batch b "
+                "JOIN packages p ON p.tracking_number = b.tracking_number "
+                "WHERE b.ts < p.created_at ORDER BY b.tracking_number"
+            )]
+            conn.execute(
+                "DELETE FROM scan_batch WHERE seq IN (SELECT b.seq FROM scan_batch b "
+                "JOIN packages p ON p.tracking_number = b.tracking_number WHERE b.ts < p.created_at)"
+            )
+            
+            recorded = conn.execute(
+                "INSERT INTO package_events (tracking_number, status, ts) "
+                "SELECT b.tracking_number, b.status, b.ts FROM scan_batch b "
+                "JOIN packages p ON p.tracking_number = b.tracking_number ORDER BY b.ts, b.seq"
+            ).rowcount
+            
+            applied = conn.execute(
+                f"""
+                UPDATE packages SET status = latest.status, status_updated_at = latest.ts
+                FROM (
+                    SELECT b.tracking_number, b.status, b.ts, b.status IN ({terminal}) AS is_terminal
+                    FROM scan_batch b
+                    WHERE b.seq = (
+                        SELECT b2.seq FROM scan_batch b2
+                        WHERE b2.tracking_number = b.tracking_number
+                        ORDER BY b2.status IN ({terminal}) DESC, b2.ts DESC, b2.seq DESC
+                        LIMIT 1
+                    )
+                ) AS latest
+                WHERE packages.tracking_number = latest.tracking_number
+                  AND packages.status NOT IN ({terminal})
+                  AND (latest.is_terminal OR packages.status_updated_at IS NULL OR packages.status_updated_at < latest.ts)
+                """,
+                TERMINAL_STATUSES * 3
+            ).rowcount
+            
+            touched = [row[0] for row in conn.execute("SELECT DISTINCT tracking_number FROM scan_batch")]
+            conn.execute("DELETE FROM scan_batch")
+        
+        for tracking_number in touched:
+            invalidate_package_cache(tracking_number)
+        return {"applied": applied, "recorded": recorded, "unknown": unknown, "before_created": before_created}
+    except Exception as e:
+        print(f"Ошибка при пакетном обновлении статусов посылок: {e}")
+        return None
+
+def _has_table(conn, name):
+    """Проверка существования таблицы (в том числе виртуальной)"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+def _search_score(package, patterns):
+    """
+    Релевантность посылки поисковому запросу
+    
+    Слово запроса, совпавшее со словом столбца целиком, весит вдвое больше
+    совпадения по началу слова; учитывается лучший столбец для каждого слова.
+    
+    Args:
+        package (dict): Посылка
+        patterns (list): Пары регулярных выражений (начало слова, слово целиком)
+            для каждого слова запроса
+    """
+    texts = [((package[column] or "").lower(), weight) for column, weight in SEARCH_COLUMNS]
+    score = 0.0
+    for prefix, whole in patterns:
+        best = 0.0
+        for text, weight in texts:
+            if 2 * weight > best and prefix.search(text):
+                best = max(best, 2 * weight if whole.search(text) else weight)
+        score += best
+    return score
+
+SEARCH_MATCH_SQL = (
+    "SELECT * FROM packages WHERE id IN ("
+    "SELECT rowid FROM packages_fts WHERE packages_fts MATCH ? ORDER BY rowid DESC LIMIT ?)"
+)
+
+def _match_candidates(conn, match, exclude):
+    """Самые новые посылки (не более SEARCH_CANDIDATES), подходящие под выражение FTS5 match"""
+    packages = conn.execute(SEARCH_MATCH_SQL, (match, SEARCH_CANDIDATES)).fetchall()
+    return [dict(package) for package in packages if package["id"] not in exclude]
+
+def search_packages(query, limit=50):
+    """
+    Полнотекстовый поиск посылок по описанию, именам и адресам
+    
+    Посылка должна содержать все слова запроса. Слова ищутся целиком, а если
+    таких посылок меньше limit - как начало слова ("Иван" найдет "Иванова"):
+    сначала только последнее слово запроса, затем все.
+    Из SEARCH_CANDIDATES самых новых совпадений результаты отбираются по
+    _search_score() с весами столбцов из SEARCH_COLUMNS.
+    
+    bm25 здесь не используется: для IDF он читает списки всех посылок с каждым
+    словом, и для частых имен на миллионах посылок это десятки миллисекунд.
+    Порядок совпадений, содержащих все слова запроса, от IDF почти не зависит.
+    
+    Args:
+        query (str): Поисковый запрос
+        limit (int): Максимальное количество результатов
+        
+    Returns:
+        list: Список посылок или пустой список в случае ошибки
+    """
+    terms = [term.lower() for term in _SEARCH_TERM_RE.findall(query or "")]
+    if not terms:
+        return []
+    try:
+        conn = get_connection()
+        if _has_table(conn, "packages_fts"):
+            # Сначала слова целиком: их списки читаются с остановкой после LIMIT.
+            # Префиксный запрос объединяет списки всех слов с этим началом,
+            # поэтому сначала по началу ищется только последнее (набираемое) слово
+            exact = [f'"{term}"' for term in terms]
+            matches = (
+                " ".join(exact),
+                " ".join(exact[:-1] + [f'"{terms[-1]}"*']),
+                " ".join(f'"{term}"*' for term in terms),
+            )
+            packages = []
+            found = set()
+            for match in matches:
+                packages += _match_candidates(conn, match, found)
+                if len(packages) >= limit:
+                    break
+                found.update(package["id"] for package in packages)
+            
+            patterns = [(re.compile(rf"\b{re.escape(term)}"), re.compile(rf"\b{re.escape(term)}\b")) for term in terms]
+            packages.sort(key=lambda package: (-_search_score(package, patterns), -package["id"]))
+            return packages[:limit]
+        
+        # Запасной вариант без FTS5: полный просмотр таблицы
+        condition = " OR ".join(f"{column} LIKE ?" for column, weight in SEARCH_COLUMNS)
+        where = " AND ".join(f"({condition})" for term in terms)
+        params = [f"%{term}%" for term in terms for column in SEARCH_COLUMNS]
+        packages = conn.execute(
+            f"SELECT * FROM packages WHERE {where} ORDER BY created_at DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        
+        return [dict(package) for package in packages]
+    except Exception as e:
+        print(f"Ошибка при поиске посылок: {e}")
+        return []
+
+PACKAGE_EVENTS_SQL = "SELECT status, ts FROM package_events WHERE tracking_number = ? ORDER BY ts, id"
+
+def get_package_events(tracking_number):
+    """
+    Получение журнала смены статусов посылки
+    
+    Args:
+        tracking_number (str): Номер отслеживания
+        
+    Returns:
+        list: События (status, ts) в хронологическом порядке или пустой список в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        events = conn.execute(PACKAGE_EVENTS_SQL, (tracking_number,)).fetchall()
+        
+        return [dict(event) for event in events]
+    except Exception as e:
+        print(f"Ошибка при получении истории статусов посылки: {e}")
+        return []
+
 # Функции для работы с курьерами
-def create_courier(name, phone, email):
+def create_courier(name, phone, email, zone=""):
     """
     Добавление нового курьера в базу данных
     
@@ -161,26 +1007,48 @@ def create_courier(name, phone, email):
         name (str): Имя курьера
         phone (str): Телефон курьера
         email (str): Email курьера
+        zone (str): Зона доставки курьера (город) или пустая строка
         
     Returns:
         bool: True если курьер успешно добавлен, False в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO couriers (name, phone, email, created_at) VALUES (?, ?, ?, ?)",
-            (name, phone, email, datetime.now())
-        )
-        
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO couriers (name, phone, email, zone, created_at) VALUES (?, ?, ?, ?, ?)",
+                (name, phone, email, zone, datetime.now())
+            )
         return True
     except Exception as e:
         print(f"Ошибка при добавлении курьера: {e}")
         return False
 
+def create_couriers_bulk(rows):
+    """
+    Пакетное добавление курьеров в одной транзакции
+    
+    Args:
+        rows (list): Кортежи (name, phone, email) или (name, phone, email, zone)
+        
+    Returns:
+        int: Количество добавленных курьеров или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        now = datetime.now()
+        with conn:
+            conn.executemany(
+                "INSERT INTO couriers (name, phone, email, zone, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(row[0], row[1], row[2], row[3] if len(row) > 3 else "", now) for row in rows]
+            )
+        return len(rows)
+    except Exception as e:
+        print(f"Ошибка при пакетном добавлении курьеров: {e}")
+        return None
+
+ALL_COURIERS_SQL = "SELECT * FROM couriers ORDER BY name"
+
 def get_all_couriers():
     """
     Получение списка всех курьеров
@@ -189,14 +1057,8 @@ def get_all_couriers():
         list: Список курьеров или пустой список в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM couriers ORDER BY name")
-        couriers = cursor.fetchall()
-        
-        conn.close()
+        conn = get_connection()
+        couriers = conn.execute(ALL_COURIERS_SQL).fetchall()
         
         return [dict(courier) for courier in couriers]
     except Exception as e:
@@ -214,51 +1076,650 @@ def delete_courier(courier_id):
         bool: True если курьер успешно удален, False в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM couriers WHERE id = ?", (courier_id,))
+        conn = get_connection()
+        with conn:
+            # Незавершенные посылки курьера возвращаются в очередь распределения
+            conn.execute(
+                f"UPDATE packages SET courier_id = NULL WHERE courier_id = ? AND {_active_parcel_sql('packages')}",
+                (courier_id,)
+            )
+            cursor = conn.execute("DELETE FROM couriers WHERE id = ?", (courier_id,))
         
-        success = cursor.rowcount > 0
-        
-        conn.commit()
-        conn.close()
-        
-        return success
+        package_cache.clear()
+        return cursor.rowcount > 0
     except Exception as e:
         print(f"Ошибка при удалении курьера: {e}")
         return False
 
-# Функции для работы с отзывами
-def create_review(tracking_number, customer_name, rating, comment):
+ACTIVE_COURIERS_SQL = "SELECT id, name, zone, active_load FROM couriers WHERE status = ?"
+
+def get_active_couriers():
     """
-    Добавление нового отзыва в базу данных
+    Получение курьеров, которым можно назначать посылки
+    
+    Returns:
+        list: Словари с ключами id, name, zone, active_load или пустой список в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(ACTIVE_COURIERS_SQL, (COURIER_ACTIVE_STATUS,)).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при получении активных курьеров: {e}")
+        return []
+
+PENDING_PACKAGES_SQL = (
+    "SELECT id, tracking_number, recipient_address FROM packages INDEXED BY idx_packages_unassigned "
+    f"WHERE courier_id IS NULL AND status = '{INITIAL_STATUS}' ORDER BY created_at LIMIT ?"
+)
+
+def assign_pending_packages(plan, limit=5000):
+    """
+    Назначение курьеров новым посылкам без курьера (самым старым первыми)
+    
+    Чтение очереди, расчет назначений и их запись выполняются в одной
+    транзакции записи, поэтому одновременно запущенные распределения не
+    назначают одну посылку дважды. Нагрузка курьеров (active_load)
+    обновляется триггерами.
     
     Args:
-        tracking_number (str): Номер отслеживания
-        customer_name (str): Имя клиента
-        rating (int): Рейтинг (1-5)
-        comment (str): Комментарий
+        plan (callable): Функция (посылки, курьеры) -> пары (id посылки, id курьера);
+            посылки - словари id, tracking_number, recipient_address,
+            курьеры - словари из get_active_couriers()
+        limit (int): Сколько посылок распределить за один вызов
         
     Returns:
-        bool: True если отзыв успешно добавлен, False в случае ошибки
+        dict: pending - посылок взято из очереди, assigned - назначено, couriers - активных курьеров;
+            None в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
+        conn = get_connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            couriers = [dict(row) for row in conn.execute(ACTIVE_COURIERS_SQL, (COURIER_ACTIVE_STATUS,))]
+            parcels = []
+            if couriers:
+                parcels = [dict(row) for row in conn.execute(PENDING_PACKAGES_SQL, (limit,))]
+            assignments = [(courier_id, parcel_id) for parcel_id, courier_id in plan(parcels, couriers)] if parcels else []
+            conn.executemany("UPDATE packages SET courier_id = ? WHERE id = ?", assignments)
         
-        cursor.execute(
-            "INSERT INTO reviews (tracking_number, customer_name, rating, comment, created_at) VALUES (?, ?, ?, ?, ?)",
-            (tracking_number, customer_name, rating, comment, datetime.now())
-        )
+        for parcel in parcels:
+            invalidate_package_cache(parcel["tracking_number"])
+        return {"pending": len(parcels), "assigned": len(assignments), "couriers": len(couriers)}
+    except Exception as e:
+        print(f"Ошибка при назначении посылок курьерам: {e}")
+        return None
+
+COURIER_PACKAGES_SQL = (
+    f"SELECT * FROM packages WHERE courier_id = ? AND {_active_parcel_sql('packages')} "
+    "ORDER BY created_at DESC LIMIT ?"
+)
+
+def get_courier_packages(courier_id, limit=100):
+    """
+    Получение незавершенных посылок курьера (новые первыми)
+    
+    Args:
+        courier_id (int): ID курьера
+        limit (int): Максимальное количество посылок
         
-        conn.commit()
-        conn.close()
+    Returns:
+        list: Список посылок или пустой список в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(COURIER_PACKAGES_SQL, (courier_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при получении посылок курьера: {e}")
+        return []
+
+# Функции для работы с координатами адресов
+PACKAGE_ADDRESSES_PAGE_SQL = "SELECT id, sender_address, recipient_address FROM packages WHERE id > ? ORDER BY id LIMIT ?"
+
+def get_package_addresses_page(after_id=0, limit=1000):
+    """
+    Получение адресов посылок в порядке id (для пакетного геокодирования)
+    
+    Args:
+        after_id (int): id последней посылки предыдущей страницы
+        limit (int): Максимальное количество посылок
+        
+    Returns:
+        list: Словари с ключами id, sender_address, recipient_address; None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(PACKAGE_ADDRESSES_PAGE_SQL, (after_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при получении адресов посылок: {e}")
+        return None
+
+GEOCODES_SQL = "SELECT address, lat, lon, precision FROM geocodes WHERE address IN ({placeholders})"
+
+def get_geocodes(addresses):
+    """
+    Получение закэшированных координат адресов
+    
+    Args:
+        addresses (list): Адреса (как они записаны в посылках)
+        
+    Returns:
+        dict: {адрес: {"lat", "lon", "precision"}} для адресов, уже бывших в геокодировании
+            (lat и lon равны None, если адрес не найден); None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        result = {}
+        for start in range(0, len(addresses), MAX_QUERY_PARAMS):
+            chunk = addresses[start:start + MAX_QUERY_PARAMS]
+            cursor = conn.execute(GEOCODES_SQL.format(placeholders=", ".join("?" * len(chunk))), chunk)
+            result.update((row["address"], {"lat": row["lat"], "lon": row["lon"], "precision": row["precision"]})
+                          for row in cursor)
+        return result
+    except Exception as e:
+        print(f"Ошибка при получении координат адресов: {e}")
+        return None
+
+def save_geocodes(geocodes):
+    """
+    Сохранение координат адресов в кэш
+    
+    Args:
+        geocodes (list): Кортежи (адрес, lat, lon, точность); lat и lon - None для ненайденного адреса
+        
+    Returns:
+        int: Количество сохраненных адресов или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        now = datetime.now()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocodes (address, lat, lon, precision, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(address, lat, lon, precision, now) for address, lat, lon, precision in geocodes]
+            )
+        return len(geocodes)
+    except Exception as e:
+        print(f"Ошибка при сохранении координат адресов: {e}")
+        return None
+
+def clear_geocodes(missing_only=True):
+    """
+    Очистка кэша координат (например, после замены справочника адресов)
+    
+    Args:
+        missing_only (bool): Удалить только адреса, не найденные в справочнике;
+            иначе удаляются и координаты посылок в пространственном индексе
+        
+    Returns:
+        int: Количество удаленных адресов или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM geocodes" + (" WHERE lat IS NULL" if missing_only else ""))
+            if not missing_only:
+                conn.execute("DELETE FROM package_locations")
+        return cursor.rowcount
+    except Exception as e:
+        print(f"Ошибка при очистке кэша координат: {e}")
+        return None
+
+def save_package_locations(locations):
+    """
+    Добавление координат посылок в пространственный индекс
+    
+    Посылки, уже бывшие в индексе, не изменяются.
+    
+    Args:
+        locations (list): Кортежи (id посылки, широта, долгота)
+        
+    Returns:
+        int: Количество переданных посылок или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO package_locations (id, min_lat, max_lat, min_lon, max_lon, lat, lon) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(package_id, lat, lat, lon, lon, lat, lon) for package_id, lat, lon in locations]
+            )
+        return len(locations)
+    except Exception as e:
+        print(f"Ошибка при сохранении координат посылок: {e}")
+        return None
+
+PACKAGES_IN_BOX_SQL = (
+    "SELECT p.id, p.tracking_number, p.status, p.recipient, p.recipient_address, p.courier_id, l.lat, l.lon "
+    "FROM package_locations AS l JOIN packages AS p ON p.id = l.id "
+    "WHERE l.max_lat >= ? AND l.min_lat <= ? AND l.max_lon >= ? AND l.min_lon <= ?"
+)
+ACTIVE_PACKAGES_IN_BOX_SQL = f"{PACKAGES_IN_BOX_SQL} AND {_active_parcel_sql('p')}"
+
+def get_packages_in_box(min_lat, max_lat, min_lon, max_lon, active_only=True):
+    """
+    Посылки с координатами в прямоугольнике (поиск по индексу R*Tree)
+    
+    Args:
+        min_lat, max_lat, min_lon, max_lon (float): Границы прямоугольника
+        active_only (bool): Только посылки не в конечном статусе
+        
+    Returns:
+        list: Словари с ключами id, tracking_number, status, recipient, recipient_address,
+            courier_id, lat, lon; None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(
+            ACTIVE_PACKAGES_IN_BOX_SQL if active_only else PACKAGES_IN_BOX_SQL,
+            (min_lat, max_lat, min_lon, max_lon)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при поиске посылок по координатам: {e}")
+        return None
+
+def set_courier_location(courier_id, lat, lon):
+    """
+    Сохранение текущих координат курьера
+    
+    Args:
+        courier_id (int): ID курьера
+        lat (float): Широта
+        lon (float): Долгота
+        
+    Returns:
+        bool: True если курьер найден и координаты сохранены
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            if conn.execute("SELECT 1 FROM couriers WHERE id = ?", (courier_id,)).fetchone() is None:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO courier_locations (id, min_lat, max_lat, min_lon, max_lon, lat, lon) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (courier_id, lat, lat, lon, lon, lat, lon)
+            )
+        return True
+    except Exception as e:
+        print(f"Ошибка при сохранении координат курьера: {e}")
+        return False
+
+def get_unlocated_couriers():
+    """
+    Активные курьеры с зоной, но без координат (для размещения в центре зоны)
+    
+    Returns:
+        list: Словари с ключами id и zone или пустой список в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(
+            "SELECT id, zone FROM couriers WHERE status = ? AND zone != '' "
+            "AND id NOT IN (SELECT id FROM courier_locations)",
+            (COURIER_ACTIVE_STATUS,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при получении курьеров без координат: {e}")
+        return []
+
+# CROSS JOIN закрепляет порядок: сначала R*Tree, иначе планировщик может выбрать
+# индекс по статусу курьеров и просматривать R*Tree для каждого активного курьера
+COURIERS_IN_BOX_SQL = (
+    "SELECT c.id, c.name, c.phone, c.zone, c.active_load, l.lat, l.lon "
+    "FROM courier_locations AS l CROSS JOIN couriers AS c ON c.id = l.id "
+    "WHERE l.max_lat >= ? AND l.min_lat <= ? AND l.max_lon >= ? AND l.min_lon <= ? AND c.status = ?"
+)
+
+def get_couriers_in_box(min_lat, max_lat, min_lon, max_lon):
+    """
+    Активные курьеры с координатами в прямоугольнике (поиск по индексу R*Tree)
+    
+    Args:
+        min_lat, max_lat, min_lon, max_lon (float): Границы прямоугольника
+        
+    Returns:
+        list: Словари с ключами id, name, phone, zone, active_load, lat, lon; None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(COURIERS_IN_BOX_SQL, (min_lat, max_lat, min_lon, max_lon, COURIER_ACTIVE_STATUS)).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при поиске курьеров по координатам: {e}")
+        return None
+
+def get_courier_location(courier_id):
+    """
+    Текущие координаты курьера
+    
+    Returns:
+        tuple: (широта, долгота) или None, если координаты неизвестны или произошла ошибка
+    """
+    try:
+        conn = get_connection()
+        row = conn.execute("SELECT lat, lon FROM courier_locations WHERE id = ?", (courier_id,)).fetchone()
+        return (row["lat"], row["lon"]) if row else None
+    except Exception as e:
+        print(f"Ошибка при получении координат курьера: {e}")
+        return None
+
+COURIER_ROUTE_STOPS_SQL = (
+    "SELECT p.id, p.tracking_number, p.status, p.recipient, p.recipient_address, l.lat, l.lon "
+    "FROM packages AS p LEFT JOIN package_locations AS l ON l.id = p.id "
+    f"WHERE p.courier_id = ? AND {_active_parcel_sql('p')} ORDER BY p.created_at"
+)
+
+def get_courier_route_stops(courier_id):
+    """
+    Незавершенные посылки курьера с координатами адресов получателей
+    
+    Args:
+        courier_id (int): ID курьера
+        
+    Returns:
+        list: Словари с ключами id, tracking_number, status, recipient, recipient_address,
+            lat, lon (None, если адрес не геокодирован) в порядке назначения (старые первыми);
+            None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        rows = conn.execute(COURIER_ROUTE_STOPS_SQL, (courier_id,)).fetchall()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        print(f"Ошибка при получении остановок маршрута курьера: {e}")
+        return None
+
+# Архив посылок. Посылки в конечном статусе переносятся из packages в помесячные
+# таблицы (по месяцу создания посылки) той же базы данных, поэтому перенос
+# порции - одна транзакция. История статусов остается в package_events.
+ARCHIVE_TABLE_PREFIX = "packages_archive_"
+_ARCHIVE_PARTITION_RE = re.compile(r"\d{4}_\d{2}")
+# Месяц посылок без даты создания
+ARCHIVE_UNKNOWN_PARTITION = "0000_00"
+# Начало определения таблицы packages в sqlite_master
+_PACKAGES_DDL_RE = re.compile(
+    r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:"packages"|`packages`|\[packages\]|packages)\b', re.IGNORECASE
+)
+
+def archive_table(partition):
+    """
+    Имя таблицы архива за месяц
+    
+    Args:
+        partition (str): Месяц в виде ГГГГ_ММ
+        
+    Returns:
+        str: Имя таблицы
+        
+    Raises:
+        ValueError: Если месяц задан в другом виде
+    """
+    if not _ARCHIVE_PARTITION_RE.fullmatch(partition):
+        raise ValueError(f"Неверный месяц архива: {partition}")
+    return ARCHIVE_TABLE_PREFIX + partition
+
+def _create_archive_table(conn, partition):
+    """
+    Создание таблицы архива за месяц, если ее еще нет
+    
+    Таблица создается по определению packages из sqlite_master (со столбцами,
+    добавленными миграциями), поэтому сохраняет типы, PRIMARY KEY, NOT NULL и
+    UNIQUE на tracking_number - уникальный индекс для поиска посылки по номеру.
+    """
+    table = archive_table(partition)
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'packages'").fetchone()[0]
+    conn.execute(_PACKAGES_DDL_RE.sub(f"CREATE TABLE IF NOT EXISTS {table}", sql, count=1))
+    return table
+
+ARCHIVED_PARTITIONS_SQL = "SELECT tracking_number, partition FROM archived_packages WHERE tracking_number IN ({placeholders})"
+
+def _get_archived_packages(conn, tracking_numbers):
+    """
+    Поиск посылок в архиве
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        tracking_numbers (list): Номера отслеживания
+        
+    Returns:
+        dict: {номер: информация_о_посылке} для найденных в архиве посылок
+    """
+    partitions = {}
+    for start in range(0, len(tracking_numbers), MAX_QUERY_PARAMS):
+        chunk = tracking_numbers[start:start + MAX_QUERY_PARAMS]
+        cursor = conn.execute(ARCHIVED_PARTITIONS_SQL.format(placeholders=", ".join("?" * len(chunk))), chunk)
+        for tracking_number, partition in cursor:
+            partitions.setdefault(partition, []).append(tracking_number)
+    
+    found = {}
+    for partition, numbers in partitions.items():
+        placeholders = ", ".join("?" * len(numbers))
+        cursor = conn.execute(
+            f"SELECT * FROM {archive_table(partition)} WHERE tracking_number IN ({placeholders})", numbers
+        )
+        found.update((row["tracking_number"], dict(row)) for row in cursor)
+    return found
+
+# Завершенная раньше cutoff посылка и создана раньше cutoff: условие на
+# created_at позволяет отбирать кандидатов по индексу (status, created_at)
+ARCHIVE_CANDIDATES_SQL = (
+    f"SELECT id, tracking_number, COALESCE(strftime('%Y_%m', created_at), '{ARCHIVE_UNKNOWN_PARTITION}') "
+    f"FROM packages WHERE status IN ({', '.join('?' * len(TERMINAL_STATUSES))}) AND created_at < ? "
+    "AND COALESCE(status_updated_at, created_at) < ? LIMIT ?"
+)
+
+def archive_packages(cutoff, limit=1000):
+    """
+    Перенос порции посылок в конечном статусе в архив
+    
+    Переносятся посылки, статус которых последний раз менялся раньше cutoff.
+    Строки копируются в таблицу архива за месяц создания посылки, номер
+    записывается в archived_packages, после чего строка удаляется из packages
+    (триггеры убирают ее из полнотекстового и пространственного индексов).
+    
+    Args:
+        cutoff (datetime): Граница: архивируются посылки, завершенные раньше нее
+        limit (int): Наибольшее количество посылок за вызов (одна транзакция)
+        
+    Returns:
+        dict: archived - сколько посылок перенесено, partitions - {месяц: количество};
+            None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS archive_batch ("
+                "id INTEGER PRIMARY KEY, tracking_number TEXT NOT NULL, partition TEXT NOT NULL)"
+            )
+            conn.execute("DELETE FROM archive_batch")
+            conn.execute(f"INSERT INTO archive_batch (id, tracking_number, partition) {ARCHIVE_CANDIDATES_SQL}",
+                         TERMINAL_STATUSES + (cutoff, cutoff, limit))
+            partitions = dict(conn.execute(
+                "SELECT partition, COUNT(*) FROM archive_batch GROUP BY partition"
+            ).fetchall())
+            
+            for partition in partitions:
+                table = _create_archive_table(conn, partition)
+                columns = ", ".join(f'"{row["name"]}"' for row in conn.execute(f"PRAGMA table_info({table})"))
+                conn.execute(
+                    f"INSERT INTO {table} ({columns}) SELECT {columns} FROM packages "
+                    "WHERE id IN (SELECT id FROM archive_batch WHERE partition = ?)",
+                    (partition,)
+                )
+            conn.execute("INSERT INTO archived_packages (tracking_number, partition) "
+                         "SELECT tracking_number, partition FROM archive_batch")
+            conn.execute("DELETE FROM packages WHERE id IN (SELECT id FROM archive_batch)")
+            
+            archived = [row[0] for row in conn.execute("SELECT tracking_number FROM archive_batch")]
+            conn.execute("DELETE FROM archive_batch")
+        
+        for tracking_number in archived:
+            invalidate_package_cache(tracking_number)
+        return {"archived": len(archived), "partitions": partitions}
+    except Exception as e:
+        print(f"Ошибка при переносе посылок в архив: {e}")
+        return None
+
+def get_archive_partitions():
+    """
+    Таблицы архива и количество посылок в них
+    
+    Returns:
+        list: Пары (месяц ГГГГ_ММ, количество посылок) по возрастанию месяца
+            или пустой список в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        return [tuple(row) for row in conn.execute(
+            "SELECT partition, COUNT(*) FROM archived_packages GROUP BY partition ORDER BY partition"
+        )]
+    except Exception as e:
+        print(f"Ошибка при получении списка таблиц архива: {e}")
+        return []
+
+# Функции для работы с отзывами
+def create_review(tracking_number, customer_name, rating, comment):
+    """
+    Добавление нового отзыва в базу данных
+    
+    Args:
+        tracking_number (str): Номер отслеживания
+        customer_name (str): Имя клиента
+        rating (int): Рейтинг (1-5)
+        comment (str): Комментарий
+        
+    Returns:
+        bool: True если отзыв успешно добавлен, False в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        with conn:
+            insert_review(conn, tracking_number, customer_name, rating, comment)
         return True
     except Exception as e:
         print(f"Ошибка при добавлении отзыва: {e}")
         return False
 
+def insert_review(conn, tracking_number, customer_name, rating, comment):
+    """
+    Запись нового отзыва и его оценки в агрегатах в открытой транзакции
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с открытой транзакцией
+        tracking_number (str): Номер отслеживания
+        customer_name (str): Имя клиента
+        rating (int): Рейтинг (1-5)
+        comment (str): Комментарий
+        
+    Returns:
+        bool: True (ошибки передаются исключениями)
+    """
+    now = datetime.now()
+    conn.execute(
+        "INSERT INTO reviews (tracking_number, customer_name, rating, comment, created_at) VALUES (?, ?, ?, ?, ?)",
+        (tracking_number, customer_name, rating, comment, now)
+    )
+    _add_ratings(conn, [(tracking_number, rating, now)])
+    return True
+
+def _add_ratings(conn, ratings):
+    """
+    Учет новых оценок в агрегатах rating_aggregates
+    
+    Вызывается в транзакции добавления отзывов, поэтому агрегаты всегда
+    согласованы с таблицей reviews. Оценки сначала суммируются по ключам,
+    и каждая строка агрегатов обновляется один раз.
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с открытой транзакцией
+        ratings (iterable): Кортежи (tracking_number, rating, created_at), где
+            tracking_number может быть пустым, а created_at - datetime
+    """
+    deltas = {}
+    for tracking_number, rating, created_at in ratings:
+        keys = [(RATING_SCOPE_ALL, ""), (RATING_SCOPE_DAY, created_at.date().isoformat())]
+        if tracking_number:
+            keys.append((RATING_SCOPE_PARCEL, tracking_number))
+        for key in keys:
+            delta = deltas.setdefault(key, [0, 0, 0, 0, 0, 0, 0])
+            delta[0] += 1
+            delta[1] += rating
+            delta[1 + rating] += 1
+    conn.executemany(
+        """
+        INSERT INTO rating_aggregates (scope, key, count, total, r1, r2, r3, r4, r5)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (scope, key) DO UPDATE SET
+            count = count + excluded.count, total = total + excluded.total,
+            r1 = r1 + excluded.r1, r2 = r2 + excluded.r2, r3 = r3 + excluded.r3,
+            r4 = r4 + excluded.r4, r5 = r5 + excluded.r5
+        """,
+        [key + tuple(delta) for key, delta in deltas.items()]
+    )
+
+RATING_AGGREGATE_SQL = "SELECT count, total, r1, r2, r3, r4, r5 FROM rating_aggregates WHERE scope = ? AND key = ?"
+
+def get_rating_aggregate(scope=RATING_SCOPE_ALL, key=""):
+    """
+    Получение агрегата оценок отзывов
+    
+    Args:
+        scope (str): Область: RATING_SCOPE_ALL, RATING_SCOPE_DAY или RATING_SCOPE_PARCEL
+        key (str): Ключ области: "", дата ГГГГ-ММ-ДД или номер отслеживания
+        
+    Returns:
+        dict: count, total и histogram {оценка: количество}; нулевой агрегат,
+            если отзывов нет, или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        row = conn.execute(RATING_AGGREGATE_SQL, (scope, key)).fetchone()
+        
+        if row is None:
+            return {"count": 0, "total": 0, "histogram": {rating: 0 for rating in range(1, 6)}}
+        return {
+            "count": row["count"],
+            "total": row["total"],
+            "histogram": {rating: row[f"r{rating}"] for rating in range(1, 6)},
+        }
+    except Exception as e:
+        print(f"Ошибка при получении статистики оценок: {e}")
+        return None
+
+def create_reviews_bulk(rows):
+    """
+    Пакетное добавление отзывов в одной транзакции вместе с агрегатами оценок
+    
+    Args:
+        rows (list): Кортежи (tracking_number, customer_name, rating, comment)
+        
+    Returns:
+        int: Количество добавленных отзывов или None в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        now = datetime.now()
+        with conn:
+            conn.executemany(
+                "INSERT INTO reviews (tracking_number, customer_name, rating, comment, created_at) VALUES (?, ?, ?, ?, ?)",
+                [row + (now,) for row in rows]
+            )
+            _add_ratings(conn, ((row[0], row[2], now) for row in rows))
+        return len(rows)
+    except Exception as e:
+        print(f"Ошибка при пакетном добавлении отзывов: {e}")
+        return None
+
+ALL_REVIEWS_SQL = "SELECT * FROM reviews ORDER BY created_at DESC"
+
 def get_all_reviews():
     """
     Получение списка всех отзывов
@@ -267,20 +1728,16 @@ def get_all_reviews():
         list: Список отзывов или пустой список в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM reviews ORDER BY created_at DESC")
-        reviews = cursor.fetchall()
-        
-        conn.close()
+        conn = get_connection()
+        reviews = conn.execute(ALL_REVIEWS_SQL).fetchall()
         
         return [dict(review) for review in reviews]
     except Exception as e:
         print(f"Ошибка при получении списка отзывов: {e}")
         return []
 
+ALL_PACKAGES_SQL = "SELECT * FROM packages ORDER BY created_at DESC"
+
 def get_all_packages():
     """
     Получение списка всех посылок
@@ -289,16 +1746,350 @@ def get_all_packages():
         list: Список посылок или пустой список в случае ошибки
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM packages ORDER BY created_at DESC")
-        packages = cursor.fetchall()
-        
-        conn.close()
+        conn = get_connection()
+        packages = conn.execute(ALL_PACKAGES_SQL).fetchall()
         
         return [dict(package) for package in packages]
     except Exception as e:
         print(f"Ошибка при получении списка посылок: {e}")
         return []
+
+REVIEWS_BY_TRACKING_SQL = "SELECT * FROM reviews WHERE tracking_number = ? ORDER BY created_at DESC"
+
+def get_reviews_by_tracking(tracking_number):
+    """
+    Получение отзывов о конкретной посылке
+    
+    Args:
+        tracking_number (str): Номер отслеживания
+        
+    Returns:
+        list: Список отзывов или пустой список в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        reviews = conn.execute(REVIEWS_BY_TRACKING_SQL, (tracking_number,)).fetchall()
+        
+        return [dict(review) for review in reviews]
+    except Exception as e:
+        print(f"Ошибка при получении отзывов о посылке: {e}")
+        return []
+
+# Порядок постраничного вывода таблиц: (столбец сортировки, направление).
+# Вторым ключом всегда служит id, чтобы порядок был однозначным.
+PAGE_ORDERS = {
+    "packages": ("created_at", "DESC"),
+    "reviews": ("created_at", "DESC"),
+    "couriers": ("name", "ASC"),
+}
+
+def _page_sql(table, keyed):
+    """
+    Запрос страницы таблицы из PAGE_ORDERS (его же проверяет audit_query_plans())
+
+    Args:
+        table (str): Имя таблицы
+        keyed (bool): Страница после ключа (параметры: ключ, limit, offset) или первая (limit, offset)
+    """
+    column, direction = PAGE_ORDERS[table]
+    order = f"ORDER BY {column} {direction}, id {direction} LIMIT ? OFFSET ?"
+    if not keyed:
+        return f"SELECT * FROM {table} {order}"
+    operator = "<" if direction == "DESC" else ">"
+    return f"SELECT * FROM {table} WHERE ({column}, id) {operator} (?, ?) {order}"
+
+def _get_page(table, after, limit, offset=0):
+    """
+    Получение страницы строк таблицы в порядке PAGE_ORDERS
+    
+    Используется keyset-пагинация: следующая страница начинается после
+    ключа (столбец_сортировки, id) последней строки предыдущей, поэтому
+    стоимость запроса не зависит от номера страницы. Смещение offset
+    нужно только для произвольного перехода в середину списка.
+    
+    Args:
+        table (str): Имя таблицы из PAGE_ORDERS
+        after (tuple): Ключ page_key() последней полученной строки или None
+        limit (int): Максимальное количество строк
+        offset (int): Сколько строк пропустить после ключа after
+        
+    Returns:
+        list: Список строк в виде словарей
+    """
+    conn = get_connection()
+    if after is None:
+        rows = conn.execute(_page_sql(table, False), (limit, offset)).fetchall()
+    else:
+        rows = conn.execute(_page_sql(table, True), (after[0], after[1], limit, offset)).fetchall()
+    return [dict(row) for row in rows]
+
+def page_key(row, table="packages"):
+    """Ключ keyset-пагинации для строки таблицы table"""
+    return row[PAGE_ORDERS[table][0]], row["id"]
+
+def get_packages_page(after=None, limit=100, offset=0):
+    """
+    Получение страницы посылок (новые первыми)
+    
+    Args:
+        after (tuple): Ключ page_key() последней посылки предыдущей страницы или None
+        limit (int): Размер страницы
+        offset (int): Сколько посылок пропустить после ключа after
+        
+    Returns:
+        list: Список посылок или пустой список в случае ошибки
+    """
+    try:
+        return _get_page("packages", after, limit, offset)
+    except Exception as e:
+        print(f"Ошибка при получении страницы посылок: {e}")
+        return []
+
+def get_reviews_page(after=None, limit=100, offset=0):
+    """
+    Получение страницы отзывов (новые первыми)
+    
+    Args:
+        after (tuple): Ключ page_key() последнего отзыва предыдущей страницы или None
+        limit (int): Размер страницы
+        offset (int): Сколько отзывов пропустить после ключа after
+        
+    Returns:
+        list: Список отзывов или пустой список в случае ошибки
+    """
+    try:
+        return _get_page("reviews", after, limit, offset)
+    except Exception as e:
+        print(f"Ошибка при получении страницы отзывов: {e}")
+        return []
+
+def get_couriers_page(after=None, limit=100, offset=0):
+    """
+    Получение страницы курьеров (по имени)
+    
+    Args:
+        after (tuple): Ключ page_key(row, "couriers") последнего курьера или None
+        limit (int): Размер страницы
+        offset (int): Сколько курьеров пропустить после ключа after
+        
+    Returns:
+        list: Список курьеров или пустой список в случае ошибки
+    """
+    try:
+        return _get_page("couriers", after, limit, offset)
+    except Exception as e:
+        print(f"Ошибка при получении страницы курьеров: {e}")
+        return []
+
+def count_rows(table):
+    """
+    Подсчет количества строк таблицы из PAGE_ORDERS
+    
+    Args:
+        table (str): Имя таблицы
+        
+    Returns:
+        int: Количество строк или 0 в случае ошибки
+    """
+    if table not in PAGE_ORDERS:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    try:
+        return get_connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    except Exception as e:
+        print(f"Ошибка при подсчете строк таблицы {table}: {e}")
+        return 0
+
+def _iter_pages(get_page, batch_size):
+    """Последовательный обход всех строк по страницам get_page"""
+    after = None
+    while True:
+        page = get_page(after, batch_size)
+        yield from page
+        if len(page) < batch_size:
+            break
+        after = page_key(page[-1])
+
+def iter_packages(batch_size=500):
+    """
+    Ленивый обход всех посылок (новые первыми)
+    
+    В памяти одновременно находится не более одной страницы, а между
+    страницами не удерживается открытый курсор.
+    
+    Args:
+        batch_size (int): Количество посылок, читаемых за один запрос
+        
+    Yields:
+        dict: Информация о посылке
+    """
+    return _iter_pages(get_packages_page, batch_size)
+
+def iter_reviews(batch_size=500):
+    """
+    Ленивый обход всех отзывов (новые первыми)
+    
+    Args:
+        batch_size (int): Количество отзывов, читаемых за один запрос
+        
+    Yields:
+        dict: Информация об отзыве
+    """
+    return _iter_pages(get_reviews_page, batch_size)
+
+# Таблицы, доступные для выгрузки: ключ обхода (по индексу, без сортировки
+# в памяти) и столбцы для фильтров по дате и статусу
+EXPORT_TABLES = {
+    "packages": {"key": ("created_at", "id"), "date_column": "created_at", "status_column": "status"},
+    "reviews": {"key": ("created_at", "id"), "date_column": "created_at", "status_column": None},
+    "couriers": {"key": ("id",), "date_column": "created_at", "status_column": "status"},
+}
+
+def _export_query(table, after=None, date_from=None, date_to=None, status=None):
+    """
+    Запрос выгрузки строк таблицы (его же проверяет audit_query_plans())
+    
+    Аргументы - как у iter_export_rows().
+    
+    Returns:
+        tuple: (sql, параметры)
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    options = EXPORT_TABLES[table]
+    key = options["key"]
+    
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append(f"({', '.join(key)}) > ({', '.join('?' * len(key))})")
+        params.extend(after)
+    if date_from is not None:
+        conditions.append(f"{options['date_column']} >= ?")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append(f"{options['date_column']} < ?")
+        params.append(date_to)
+    if status is not None:
+        if options["status_column"] is None:
+            raise ValueError(f"У таблицы {table} нет статуса")
+        conditions.append(f"{options['status_column']} = ?")
+        params.append(status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    return f"SELECT * FROM {table} {where} ORDER BY {', '.join(key)}", params
+
+def iter_export_rows(table, after=None, date_from=None, date_to=None, status=None, batch_size=5000):
+    """
+    Потоковое чтение строк таблицы для выгрузки
+    
+    Строки читаются одним курсором порциями fetchmany в порядке ключа
+    EXPORT_TABLES[table]["key"], поэтому в памяти находится не больше одной
+    порции, а прерванную выгрузку можно продолжить с ключа последней строки.
+    
+    Args:
+        table (str): Имя таблицы из EXPORT_TABLES
+        after (tuple): Ключ последней уже выгруженной строки или None
+        date_from (str): Начало периода (created_at >= date_from) или None
+        date_to (str): Конец периода, не включая (created_at < date_to) или None
+        status (str): Статус (для таблиц со столбцом статуса) или None
+        batch_size (int): Количество строк в порции
+        
+    Yields:
+        list: Порция строк в виде словарей
+    """
+    sql, params = _export_query(table, after, date_from, date_to, status)
+    cursor = get_connection().execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+    finally:
+        cursor.close()
+
+def get_table_columns(table):
+    """Имена столбцов таблицы из EXPORT_TABLES"""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    return [row["name"] for row in get_connection().execute(f"PRAGMA table_info({table})")]
+
+def export_key(row, table):
+    """Ключ обхода EXPORT_TABLES для строки таблицы table"""
+    return tuple(row[column] for column in EXPORT_TABLES[table]["key"])
+
+# Запросы приложения, планы которых проверяет audit_query_plans(): те же константы,
+# что выполняют функции. Новый запрос к большим таблицам следует добавлять сюда.
+AUDITED_QUERIES = {
+    "get_package_by_tracking": (PACKAGE_BY_TRACKING_SQL, ("XX-0000000",)),
+    "get_packages_by_tracking": (
+        PACKAGES_BY_TRACKING_SQL.format(placeholders="?, ?, ?"), ("XX-0000000", "XX-0000001", "XX-0000002")
+    ),
+    "get_all_packages": (ALL_PACKAGES_SQL, ()),
+    "get_all_reviews": (ALL_REVIEWS_SQL, ()),
+    "get_reviews_by_tracking": (REVIEWS_BY_TRACKING_SQL, ("XX-0000000",)),
+    "get_all_couriers": (ALL_COURIERS_SQL, ()),
+    "get_package_events": (PACKAGE_EVENTS_SQL, ("XX-0000000",)),
+    "get_packages_page": (_page_sql("packages", True), ("2000-01-01", 0, 100, 0)),
+    "get_reviews_page": (_page_sql("reviews", True), ("2000-01-01", 0, 100, 0)),
+    "get_couriers_page": (_page_sql("couriers", True), ("", 0, 100, 0)),
+    "search_packages": (SEARCH_MATCH_SQL, ('"x"*', 100)),
+    "get_rating_aggregate": (RATING_AGGREGATE_SQL, (RATING_SCOPE_ALL, "")),
+    "export_packages": _export_query("packages", ("2000-01-01", 0), date_to="2100-01-01", status="Отправлена"),
+    "export_reviews": _export_query("reviews", ("2000-01-01", 0)),
+    "get_active_couriers": (ACTIVE_COURIERS_SQL, (COURIER_ACTIVE_STATUS,)),
+    "assign_pending_packages": (PENDING_PACKAGES_SQL, (5000,)),
+    "get_courier_packages": (COURIER_PACKAGES_SQL, (1, 100)),
+    "get_package_addresses_page": (PACKAGE_ADDRESSES_PAGE_SQL, (0, 1000)),
+    "get_geocodes": (GEOCODES_SQL.format(placeholders="?, ?"), ("", "")),
+    "get_packages_in_box": (ACTIVE_PACKAGES_IN_BOX_SQL, (55.7, 55.8, 37.5, 37.7)),
+    "get_couriers_in_box": (COURIERS_IN_BOX_SQL, (55.7, 55.8, 37.5, 37.7, COURIER_ACTIVE_STATUS)),
+    "get_courier_route_stops": (COURIER_ROUTE_STOPS_SQL, (1,)),
+    "archive_packages": (ARCHIVE_CANDIDATES_SQL, TERMINAL_STATUSES + ("2000-01-01", "2000-01-01", 1000)),
+    "get_archived_packages": (ARCHIVED_PARTITIONS_SQL.format(placeholders="?, ?"), ("XX-0000000", "XX-0000001")),
+}
+
+def explain_query_plan(sql, params=()):
+    """
+    Получение плана выполнения запроса
+    
+    Args:
+        sql (str): Текст запроса
+        params (tuple): Параметры запроса
+        
+    Returns:
+        list: Строки плана (поле detail из EXPLAIN QUERY PLAN)
+    """
+    conn = get_connection()
+    return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def is_full_scan(detail):
+    """
+    Проверка, означает ли строка плана полный просмотр таблицы или сортировку
+    
+    Просмотр таблицы по индексу ("SCAN ... USING INDEX") полным просмотром не считается:
+    так выполняется ORDER BY по индексированному столбцу без сортировки. Виртуальная
+    таблица (FTS5) просматривается полностью, только если ей не передано ни одно условие.
+    """
+    if detail.startswith("USE TEMP B-TREE"):
+        return True
+    if " VIRTUAL TABLE INDEX " in detail:
+        return detail.endswith(":")
+    return detail.startswith("SCAN ") and " USING " not in detail
+
+def audit_query_plans(queries=None):
+    """
+    Проверка, что запросы приложения не выполняются полным просмотром таблиц
+    
+    Args:
+        queries (dict): Проверяемые запросы {имя: (sql, параметры)}, по умолчанию AUDITED_QUERIES
+        
+    Returns:
+        dict: Запросы с проблемными планами {имя: строки_плана}; пустой словарь если все в порядке
+    """
+    offenders = {}
+    for name, (sql, params) in (queries or AUDITED_QUERIES).items():
+        plan = explain_query_plan(sql, params)
+        if any(is_full_scan(detail) for detail in plan):
+            offenders[name] = plan
+    return offenders
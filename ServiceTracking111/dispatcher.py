@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Политики распределения новых посылок между курьерами службы доставки.
+
+Политика - функция (посылки, курьеры), возвращающая пары
+(id посылки, id курьера). Посылки - словари с ключами id, tracking_number,
+recipient_address; курьеры - словари с ключами id, zone, active_load
+(см. database.assign_pending_packages). Нагрузка курьеров хранится в куче,
+поэтому распределение n посылок между k курьерами занимает O(n log k).
+"""
+
+import heapq
+import re
+
+POLICY_LEAST_LOADED = "least-loaded"
+POLICY_ZONE = "zone"
+DEFAULT_POLICY = POLICY_LEAST_LOADED
+
+# Город в адресе вида "г. Москва, ул. ..."
+_CITY_RE = re.compile(r"(?:^|[\s,])г\.\s*([^,]+)", re.IGNORECASE)
+
+def normalize_zone(zone):
+    """Зона в виде для сравнения (без регистра и лишних пробелов)"""
+    return " ".join((zone or "").split()).casefold()
+
+def address_zone(address):
+    """
+    Зона доставки посылки по адресу получателя
+
+    Зоной считается город ("г. Казань, ...") или, если он не указан,
+    первая часть адреса до запятой.
+
+    Returns:
+        str: Нормализованная зона или пустая строка
+    """
+    if not address:
+        return ""
+    match = _CITY_RE.search(address)
+    return normalize_zone(match.group(1) if match else address.split(",", 1)[0])
+
+def assign_least_loaded(parcels, couriers):
+    """
+    Назначение каждой посылки наименее загруженному курьеру
+
+    Args:
+        parcels (list): Посылки в порядке очереди
+        couriers (list): Активные курьеры
+
+    Returns:
+        list: Пары (id посылки, id курьера)
+    """
+    if not couriers:
+        return []
+    heap = [(courier["active_load"], courier["id"]) for courier in couriers]
+    heapq.heapify(heap)
+    assignments = []
+    for parcel in parcels:
+        load, courier_id = heap[0]
+        heapq.heapreplace(heap, (load + 1, courier_id))
+        assignments.append((parcel["id"], courier_id))
+    return assignments
+
+def assign_by_zone(parcels, couriers):
+    """
+    Назначение посылки наименее загруженному курьеру ее зоны
+
+    Если в зоне посылки нет курьеров, посылка достается наименее загруженному
+    курьеру среди всех. Курьер входит в кучу своей зоны и в общую кучу;
+    после назначения устаревшая запись курьера в другой куче отбрасывается
+    при извлечении (ленивое удаление).
+
+    Args:
+        parcels (list): Посылки в порядке очереди
+        couriers (list): Активные курьеры (zone - город курьера или пустая строка)
+
+    Returns:
+        list: Пары (id посылки, id курьера)
+    """
+    if not couriers:
+        return []
+    loads = {courier["id"]: courier["active_load"] for courier in couriers}
+    zone_of = {}
+    zone_heaps = {}
+    for courier in couriers:
+        zone = normalize_zone(courier["zone"])
+        zone_of[courier["id"]] = zone
+        if zone:
+            zone_heaps.setdefault(zone, []).append((courier["active_load"], courier["id"]))
+    all_heap = [(load, courier_id) for courier_id, load in loads.items()]
+    heapq.heapify(all_heap)
+    for heap in zone_heaps.values():
+        heapq.heapify(heap)
+
+    assignments = []
+    for parcel in parcels:
+        heap = zone_heaps.get(address_zone(parcel["recipient_address"]), all_heap)
+        # Отбрасывание устаревших записей: нагрузка курьера изменилась через другую кучу
+        while heap[0][0] != loads[heap[0][1]]:
+            heapq.heappop(heap)
+        load, courier_id = heap[0]
+        loads[courier_id] = load + 1
+        heapq.heapreplace(heap, (load + 1, courier_id))
+        other = all_heap if heap is not all_heap else zone_heaps.get(zone_of[courier_id])
+        if other is not None:
+            heapq.heappush(other, (load + 1, courier_id))
+        assignments.append((parcel["id"], courier_id))
+    return assignments
+
+POLICIES = {
+    POLICY_LEAST_LOADED: assign_least_loaded,
+    POLICY_ZONE: assign_by_zone,
+}
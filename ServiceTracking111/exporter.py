@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Потоковая выгрузка данных приложения "Служба доставки" в CSV и JSONL.
+
+Строки читаются из базы данных порциями (database.iter_export_rows) и сразу
+записываются в файл, поэтому расход памяти не зависит от размера таблицы.
+Каждая порция дописывается в файл целиком как отдельный сегмент (при сжатии -
+отдельный член gzip-потока), после чего в файл состояния <файл>.state
+записываются ключ последней строки и размер файла. Прерванная выгрузка при
+повторном запуске обрезает файл до последнего сегмента и продолжается с
+сохраненного ключа; после успешного завершения файл состояния удаляется.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+
+import database
+
+FORMATS = ("csv", "jsonl")
+# Количество строк в одной порции (и между сохранениями состояния)
+DEFAULT_BATCH_SIZE = 5000
+
+def detect_format(path):
+    """
+    Определение формата и сжатия по имени файла
+
+    Args:
+        path (str): Путь к файлу, например packages.csv или reviews.jsonl.gz
+
+    Returns:
+        tuple: (формат или None, сжатие gzip)
+    """
+    name = path.lower()
+    compress = name.endswith(".gz")
+    if compress:
+        name = name[:-3]
+    for fmt, extensions in (("csv", (".csv",)), ("jsonl", (".jsonl", ".json", ".ndjson"))):
+        if name.endswith(extensions):
+            return fmt, compress
+    return None, compress
+
+def state_path(path):
+    """Путь к файлу состояния выгрузки"""
+    return path + ".state"
+
+def _load_state(path):
+    """Чтение состояния прерванной выгрузки или None"""
+    try:
+        with open(state_path(path), encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return None
+
+def _save_state(path, state):
+    """Атомарная запись состояния выгрузки"""
+    temp_path = state_path(path) + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, ensure_ascii=False)
+    os.replace(temp_path, state_path(path))
+
+def _encode_rows(rows, fmt, columns, header):
+    """
+    Преобразование порции строк в байты сегмента файла
+
+    Args:
+        rows (list): Строки в виде словарей
+        fmt (str): Формат из FORMATS
+        columns (list): Порядок столбцов CSV
+        header (bool): Добавить строку заголовка CSV
+    """
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(columns)
+        writer.writerows([row[column] for column in columns] for row in rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(row, ensure_ascii=False, default=str))
+            buffer.write("\n")
+    return buffer.getvalue().encode("utf-8")
+
+def export_table(table, path, fmt=None, compress=None, date_from=None, date_to=None, status=None,
+                 batch_size=DEFAULT_BATCH_SIZE, resume=True, progress=None):
+    """
+    Выгрузка таблицы в файл CSV или JSONL
+
+    Args:
+        table (str): Имя таблицы из database.EXPORT_TABLES
+        path (str): Путь к файлу выгрузки
+        fmt (str): Формат из FORMATS; по умолчанию определяется по имени файла
+        compress (bool): Сжатие gzip; по умолчанию - если имя файла оканчивается на .gz
+        date_from (str): Начало периода по дате создания (включительно) или None
+        date_to (str): Конец периода по дате создания (не включая) или None
+        status (str): Выгружать только строки с этим статусом или None
+        batch_size (int): Количество строк в порции
+        resume (bool): Продолжить прерванную выгрузку в этот же файл, если она есть
+        progress (callable): Функция (выгружено_строк), вызываемая после каждой порции
+
+    Returns:
+        dict: rows - количество строк в файле, resumed - была ли выгрузка продолжена
+
+    Raises:
+        ValueError: Неизвестные таблица или формат либо файл состояния от другой выгрузки
+    """
+    if table not in database.EXPORT_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    detected_fmt, detected_compress = detect_format(path)
+    fmt = fmt or detected_fmt
+    compress = detected_compress if compress is None else compress
+    if fmt is None:
+        raise ValueError("Не удалось определить формат по имени файла, укажите csv или jsonl")
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    params = {"table": table, "format": fmt, "compress": compress,
+              "date_from": date_from, "date_to": date_to, "status": status}
+    state = _load_state(path) if resume else None
+    if state is not None and state["params"] != params:
+        raise ValueError(f"Файл {state_path(path)} относится к другой выгрузке; удалите его или укажите другой файл")
+
+    if state is not None and os.path.exists(path):
+        # Продолжение: все, что записано после последнего сохранения состояния, отбрасывается
+        output = open(path, "r+b")
+        output.truncate(state["offset"])
+        output.seek(state["offset"])
+        resumed = True
+    else:
+        output = open(path, "wb")
+        state = {"params": params, "after": None, "rows": 0, "offset": 0, "columns": None}
+        resumed = False
+
+    with output:
+        after = tuple(state["after"]) if state["after"] is not None else None
+        for rows in database.iter_export_rows(table, after, date_from, date_to, status, batch_size):
+            header = state["columns"] is None
+            if header:
+                state["columns"] = list(rows[0])
+            data = _encode_rows(rows, fmt, state["columns"], header)
+            if compress:
+                # Каждая порция - отдельный завершенный член gzip-потока
+                data = gzip.compress(data)
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+
+            state["after"] = list(database.export_key(rows[-1], table))
+            state["rows"] += len(rows)
+            state["offset"] = output.tell()
+            _save_state(path, state)
+            if progress is not None:
+                progress(state["rows"])
+
+        if state["columns"] is None and fmt == "csv":
+            # Пустая выгрузка: CSV-файл только с заголовком по столбцам таблицы
+            data = _encode_rows([], fmt, database.get_table_columns(table), True)
+            output.write(gzip.compress(data) if compress else data)
+
+    try:
+        os.remove(state_path(path))
+    except FileNotFoundError:
+        pass
+    return {"rows": state["rows"], "resumed": resumed}
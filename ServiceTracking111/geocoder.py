@@ -0,0 +1,581 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Автономное геокодирование адресов посылок для приложения "Служба доставки".
+
+Координаты берутся из локального справочника адресов - файла CSV со
+столбцами city, street, lat, lon (строка с пустым street задает центр
+города). Справочник загружается в компактный индекс: отсортированный список
+ключей "город + улица" для точного поиска и поиска по началу названия
+(бинарным поиском) и индексы триграмм для названий с опечатками (для улиц -
+отдельный индекс на каждый город). Координаты
+хранятся в массивах array, а не в отдельном объекте на каждую улицу.
+
+Найденные координаты сохраняются в таблице geocodes, поэтому каждый адрес
+геокодируется только один раз (см. geocode_addresses). Координаты адресов
+получателей попадают в пространственный индекс посылок (package_locations),
+а курьеры без координат размещаются в центре своей зоны (courier_locations).
+"""
+
+import csv
+import gzip
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+
+import database
+
+# Справочник адресов по умолчанию (рядом с модулем)
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+# Количество посылок, читаемых за один запрос при пакетном геокодировании
+DEFAULT_BATCH_SIZE = 2000
+# Наименьшее сходство триграмм названия с опечаткой (коэффициент Жаккара)
+MIN_SIMILARITY = 0.4
+
+# Точность найденных координат
+PRECISION_STREET = "street"
+PRECISION_CITY = "city"
+PRECISION_NONE = "none"
+
+# Типы улиц и их краткая запись в ключе справочника
+STREET_TYPES = {
+    "ул": "ул", "улица": "ул",
+    "пр": "пр", "пр-т": "пр", "просп": "пр", "проспект": "пр",
+    "пер": "пер", "переулок": "пер",
+    "б-р": "б-р", "бул": "б-р", "бульвар": "б-р",
+    "ш": "ш", "шоссе": "ш",
+    "наб": "наб",
+    "пл": "пл", "площадь": "пл",
+    "проезд": "проезд",
+    "мкр": "мкр", "микрорайон": "мкр",
+    "тракт": "тракт",
+    "аллея": "аллея",
+}
+CITY_MARKERS = {"г", "город", "пос", "поселок", "пгт", "с", "село", "дер", "деревня", "ст-ца", "станица"}
+# Части адреса, не влияющие на координаты улицы
+REGION_MARKERS = {"обл", "область", "респ", "республика", "край", "р-н", "район", "ао"}
+HOUSE_MARKERS = {"д", "дом", "кв", "квартира", "корп", "корпус", "к", "стр", "строение", "оф", "офис", "лит"}
+COUNTRY_NAMES = {"россия", "рф", "российская федерация"}
+
+_TOKEN_RE = re.compile(r"[^\w-]+")
+# Номер дома в конце названия улицы: "5", "12а", "7/2", "10-б"
+_HOUSE_NUMBER_RE = re.compile(r"^\d+[\w/-]*$")
+
+def _tokens(text):
+    """Слова части адреса без регистра, с "е" вместо "ё\""""
+    return [token.strip("-") for token in _TOKEN_RE.split(text.casefold().replace("ё", "е")) if token.strip("-")]
+
+def normalize_name(text):
+    """Название города или улицы в виде ключа справочника"""
+    return " ".join(_tokens(text))
+
+def normalize_street(street):
+    """
+    Ключ улицы: название и краткий тип в конце ("ул. Ленина" -> "ленина ул")
+
+    Тип ставится в конец, чтобы поиск по началу ключа находил улицу по
+    одному названию, без типа.
+    """
+    tokens = _tokens(street)
+    kinds = [STREET_TYPES[token] for token in tokens if token in STREET_TYPES]
+    name = [token for token in tokens if token not in STREET_TYPES]
+    if not name:
+        # "Набережная", "Проспект": тип и есть название
+        return " ".join(tokens)
+    return " ".join(name + kinds[:1])
+
+def _strip_house_number(tokens):
+    """Слова без номера дома в конце ("ленина 5" -> "ленина")"""
+    while len(tokens) > 1 and _HOUSE_NUMBER_RE.match(tokens[-1]):
+        tokens = tokens[:-1]
+    return tokens
+
+def _leading_city(tokens, city_names):
+    """
+    Длина названия известного города в начале слов части адреса
+
+    Рассматриваются только слова до типа улицы, и хотя бы одно слово
+    остается на улицу ("санкт-петербург невский пр 10" -> 1).
+
+    Returns:
+        int: Количество слов названия города или 0
+    """
+    street_at = next((i for i, token in enumerate(tokens) if token in STREET_TYPES), len(tokens))
+    for length in range(min(street_at, len(tokens) - 1), 0, -1):
+        if " ".join(tokens[:length]) in city_names:
+            return length
+    return 0
+
+def split_address(address, city_names=()):
+    """
+    Разбор адреса на части по запятым с определением их роли
+
+    Args:
+        address (str): Адрес в свободной форме
+        city_names (container): Нормализованные названия известных городов: в адресе
+            без запятых город без "г." в начале отделяется от улицы
+
+    Returns:
+        list: Пары (роль, слова), роль - "city", "street" или "unknown";
+            номера домов, квартиры, регионы, страна и индекс отброшены
+    """
+    parts = []
+    address = address or ""
+    for part in address.split(","):
+        tokens = _tokens(part)
+        if not tokens or all(token.isdigit() for token in tokens):
+            continue
+        words = set(tokens)
+        if tokens[0] in HOUSE_MARKERS or " ".join(tokens) in COUNTRY_NAMES or words & REGION_MARKERS:
+            continue
+        if tokens[0] in CITY_MARKERS and len(tokens) > 1:
+            # "г. Москва ул. Ленина 5" без запятой: улица начинается с ее типа
+            street_at = next((i for i, token in enumerate(tokens[2:], 2) if token in STREET_TYPES), None)
+            parts.append(("city", tokens[1:street_at]))
+            if street_at is not None:
+                parts.append(("street", _strip_house_number(tokens[street_at:])))
+        elif words & STREET_TYPES.keys():
+            city_length = _leading_city(tokens, city_names) if "," not in address else 0
+            if city_length:
+                parts.append(("city", tokens[:city_length]))
+            parts.append(("street", _strip_house_number(tokens[city_length:])))
+        else:
+            parts.append(("unknown", _strip_house_number(tokens)))
+    return parts
+
+def _trigrams(key):
+    """Множество триграмм ключа (с границами слов)"""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class _TrigramIndex:
+    """Индекс триграмм: поиск ключа, наиболее похожего на слово с опечаткой"""
+
+    def __init__(self):
+        self._postings = {}
+        self._sizes = array("H")
+        self._ids = array("I")
+
+    def add(self, key, key_id=None):
+        """
+        Добавление ключа
+
+        Args:
+            key (str): Ключ
+            key_id (int): Номер, возвращаемый best() для этого ключа; по умолчанию
+                ключи нумеруются по порядку добавления
+        """
+        position = len(self._sizes)
+        trigrams = _trigrams(key)
+        for trigram in trigrams:
+            postings = self._postings.get(trigram)
+            if postings is None:
+                postings = self._postings[trigram] = array("I")
+            postings.append(position)
+        self._sizes.append(min(len(trigrams), 0xFFFF))
+        self._ids.append(position if key_id is None else key_id)
+
+    def best(self, key, threshold=MIN_SIMILARITY):
+        """
+        Номер наиболее похожего ключа
+
+        Args:
+            key (str): Искомый ключ
+            threshold (float): Наименьшее сходство
+
+        Returns:
+            int: Номер ключа или None, если похожих нет
+        """
+        trigrams = _trigrams(key)
+        common = {}
+        for trigram in trigrams:
+            for position in self._postings.get(trigram, ()):
+                common[position] = common.get(position, 0) + 1
+        best_position, best_score = None, threshold
+        for position, count in common.items():
+            score = count / (len(trigrams) + self._sizes[position] - count)
+            if score >= best_score:
+                if score > best_score or best_position is None or position < best_position:
+                    best_position, best_score = position, score
+        return None if best_position is None else self._ids[best_position]
+
+class GazetteerIndex:
+    """Справочник адресов в памяти: города и улицы с координатами"""
+
+    def __init__(self):
+        self._city_names = []
+        self._city_ids = {}
+        self._city_lat = array("d")
+        self._city_lon = array("d")
+        self._city_explicit = array("b")
+        self._city_trigrams = _TrigramIndex()
+        # Улицы: ключи "<номер города>\x1f<ключ улицы>" в порядке сортировки
+        self._street_keys = []
+        self._street_lat = array("d")
+        self._street_lon = array("d")
+        # Индексы триграмм улиц по номерам городов: поиск с опечаткой
+        # просматривает только улицы своего города
+        self._street_trigrams = {}
+        self.skipped = 0
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Загрузка справочника из файла CSV (возможно .gz)
+
+        Args:
+            path (str): Путь к файлу со столбцами city, street, lat, lon
+
+        Returns:
+            GazetteerIndex: Загруженный справочник
+
+        Raises:
+            OSError: Файл не удалось прочитать
+            ValueError: В файле нет нужных столбцов
+        """
+        opener = gzip.open if path.lower().endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8-sig", newline="") as source:
+            reader = csv.DictReader(source)
+            missing = {"city", "lat", "lon"} - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"В справочнике адресов нет столбцов: {', '.join(sorted(missing))}")
+            return cls.from_rows((row.get("city"), row.get("street"), row.get("lat"), row.get("lon"))
+                                 for row in reader)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Построение справочника из строк (город, улица, широта, долгота)
+
+        Строки с пустой улицей задают центр города; для городов без такой
+        строки центром считается среднее координат их улиц. Некорректные
+        строки пропускаются (их количество - в атрибуте skipped).
+        """
+        index = cls()
+        streets = {}
+        sums = {}
+        for city, street, lat, lon in rows:
+            city_key = normalize_name(city or "")
+            try:
+                lat, lon = float(lat), float(lon)
+            except (TypeError, ValueError):
+                index.skipped += 1
+                continue
+            if not city_key or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                index.skipped += 1
+                continue
+            city_id = index._city(city_key)
+            street_key = normalize_street(street or "")
+            if not street_key:
+                index._city_lat[city_id], index._city_lon[city_id] = lat, lon
+                index._city_explicit[city_id] = 1
+                continue
+            # Повтор улицы в файле не заменяет первую запись
+            streets.setdefault(f"{city_id}\x1f{street_key}", (city_id, lat, lon))
+            total = sums.setdefault(city_id, [0.0, 0.0, 0])
+            total[0] += lat
+            total[1] += lon
+            total[2] += 1
+
+        for city_id, (lat_sum, lon_sum, count) in sums.items():
+            if not index._city_explicit[city_id]:
+                index._city_lat[city_id], index._city_lon[city_id] = lat_sum / count, lon_sum / count
+        for key in sorted(streets):
+            city_id, lat, lon = streets[key]
+            index._street_keys.append(key)
+            index._street_lat.append(lat)
+            index._street_lon.append(lon)
+            trigrams = index._street_trigrams.get(city_id)
+            if trigrams is None:
+                trigrams = index._street_trigrams[city_id] = _TrigramIndex()
+            trigrams.add(key.split("\x1f", 1)[1], len(index._street_keys) - 1)
+        return index
+
+    def _city(self, city_key):
+        """Номер города (новый город добавляется)"""
+        city_id = self._city_ids.get(city_key)
+        if city_id is None:
+            city_id = self._city_ids[city_key] = len(self._city_names)
+            self._city_names.append(city_key)
+            self._city_lat.append(0.0)
+            self._city_lon.append(0.0)
+            self._city_explicit.append(0)
+            self._city_trigrams.add(city_key)
+        return city_id
+
+    @property
+    def cities(self):
+        """Количество городов"""
+        return len(self._city_names)
+
+    @property
+    def streets(self):
+        """Количество улиц"""
+        return len(self._street_keys)
+
+    def find_city(self, name, fuzzy=True):
+        """
+        Номер города по названию
+
+        Args:
+            name (str): Название (нормализованное или нет)
+            fuzzy (bool): Искать похожее название, если точного нет
+
+        Returns:
+            int: Номер города или None
+        """
+        key = normalize_name(name)
+        city_id = self._city_ids.get(key)
+        if city_id is None and fuzzy and key:
+            city_id = self._city_trigrams.best(key)
+        return city_id
+
+    def _lookup(self, key):
+        """
+        Номер улицы с ключом key или первой улицы, ключ которой начинается с key и пробела
+
+        Ключи отсортированы, поэтому это один бинарный поиск: "ленина" находит
+        и "ленина", и "ленина пр", но не "ленинградская ул".
+        """
+        position = bisect_left(self._street_keys, key)
+        if position < len(self._street_keys):
+            found = self._street_keys[position]
+            if found == key or found.startswith(key + " "):
+                return position
+        return None
+
+    def find_street(self, city_id, street):
+        """
+        Номер улицы города: точное совпадение, затем по названию без типа, затем похожее
+
+        Returns:
+            int: Номер улицы или None
+        """
+        key = normalize_street(street)
+        if not key:
+            return None
+        prefix = f"{city_id}\x1f"
+        street_id = self._lookup(prefix + key)
+        if street_id is None:
+            # Тип улицы в адресе не совпал со справочником: поиск по одному названию
+            name, _, kind = key.rpartition(" ")
+            if name and kind in STREET_TYPES.values():
+                street_id = self._lookup(prefix + name)
+        if street_id is None and city_id in self._street_trigrams:
+            street_id = self._street_trigrams[city_id].best(key)
+        return street_id
+
+    def resolve(self, address):
+        """
+        Координаты адреса
+
+        Args:
+            address (str): Адрес в свободной форме ("г. Казань, ул. Баумана, д. 5")
+
+        Returns:
+            tuple: (широта, долгота, точность) или None, если город не найден
+        """
+        city_id = None
+        streets = []
+        unknown = []
+        for role, tokens in split_address(address, self._city_ids):
+            if role == "city" and city_id is None:
+                city_id = self.find_city(" ".join(tokens))
+            elif role == "street":
+                streets.append(tokens)
+            elif role == "unknown":
+                unknown.append(tokens)
+
+        for tokens in unknown:
+            if city_id is None:
+                # Город без "г.": вся часть или ее начало ("Москва Ленина 5")
+                for length in range(len(tokens), 0, -1):
+                    found = self.find_city(" ".join(tokens[:length]), fuzzy=False)
+                    if found is not None:
+                        city_id = found
+                        if length < len(tokens):
+                            streets.append(tokens[length:])
+                        break
+                else:
+                    streets.append(tokens)
+            else:
+                streets.append(tokens)
+        if city_id is None:
+            # Последняя попытка: город с опечаткой без "г."
+            for tokens in unknown:
+                city_id = self.find_city(" ".join(tokens))
+                if city_id is not None:
+                    streets = [street for street in streets if street is not tokens]
+                    break
+        if city_id is None:
+            return None
+
+        for tokens in streets:
+            street_id = self.find_street(city_id, " ".join(tokens))
+            if street_id is not None:
+                return self._street_lat[street_id], self._street_lon[street_id], PRECISION_STREET
+        return self._city_lat[city_id], self._city_lon[city_id], PRECISION_CITY
+
+_index = None
+_index_lock = threading.Lock()
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """
+    Загрузка справочника адресов для геокодирования
+
+    Args:
+        path (str): Файл CSV справочника
+
+    Returns:
+        GazetteerIndex: Загруженный справочник или None в случае ошибки
+    """
+    global _index
+    try:
+        index = GazetteerIndex.from_csv(path)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка при загрузке справочника адресов: {e}")
+        return None
+    with _index_lock:
+        _index = index
+    return index
+
+def get_index():
+    """
+    Справочник адресов процесса (загружается из GAZETTEER_PATH при первом обращении)
+
+    Returns:
+        GazetteerIndex: Справочник или None, если его не удалось загрузить
+    """
+    if _index is None:
+        with _index_lock:
+            loaded = _index
+        if loaded is None:
+            return load_gazetteer()
+    return _index
+
+def geocode_addresses(addresses, stats=None):
+    """
+    Координаты адресов с использованием кэша в базе данных
+
+    Адреса, которых еще нет в кэше, разбираются по справочнику одним
+    проходом и сохраняются в кэш (в том числе ненайденные), поэтому каждый
+    адрес геокодируется один раз.
+
+    Args:
+        addresses (iterable): Адреса в том виде, в каком они записаны в посылках
+        stats (dict): Словарь для счетчиков cached и geocoded (дополняется)
+
+    Returns:
+        dict: {адрес: (широта, долгота, точность) или None если адрес не найден};
+            None в случае ошибки базы данных
+    """
+    unique = list(dict.fromkeys(address.strip() for address in addresses if address and address.strip()))
+    if not unique:
+        return {}
+    cached = database.get_geocodes(unique)
+    if cached is None:
+        return None
+
+    result = {}
+    missing = []
+    for address in unique:
+        row = cached.get(address)
+        if row is None:
+            missing.append(address)
+        elif row["lat"] is None:
+            result[address] = None
+        else:
+            result[address] = (row["lat"], row["lon"], row["precision"])
+
+    index = get_index() if missing else None
+    geocoded = []
+    if index is not None:
+        for address in missing:
+            found = index.resolve(address)
+            result[address] = found
+            geocoded.append((address,) + found if found else (address, None, None, PRECISION_NONE))
+        if database.save_geocodes(geocoded) is None:
+            return None
+    else:
+        # Без справочника ненайденные адреса не кэшируются: их можно будет найти позже
+        result.update((address, None) for address in missing)
+
+    if stats is not None:
+        stats["cached"] = stats.get("cached", 0) + len(unique) - len(missing)
+        stats["geocoded"] = stats.get("geocoded", 0) + len(geocoded)
+    return result
+
+def geocode_address(address):
+    """Координаты одного адреса (см. geocode_addresses)"""
+    result = geocode_addresses([address])
+    return result.get((address or "").strip()) if result else None
+
+def locate_couriers():
+    """
+    Размещение активных курьеров без координат в центре их зоны
+
+    Returns:
+        int: Количество размещенных курьеров
+    """
+    couriers = database.get_unlocated_couriers()
+    if not couriers:
+        return 0
+    result = geocode_addresses(courier["zone"] for courier in couriers)
+    if not result:
+        return 0
+    located = 0
+    for courier in couriers:
+        found = result.get(courier["zone"].strip())
+        if found and database.set_courier_location(courier["id"], found[0], found[1]):
+            located += 1
+    return located
+
+def geocode_packages(batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Геокодирование адресов отправителей и получателей всех посылок
+
+    Посылки читаются страницами по id; адреса, уже бывшие в геокодировании,
+    берутся из кэша, поэтому повторный запуск обрабатывает только новые адреса.
+    Посылки с найденным адресом получателя добавляются в пространственный индекс.
+
+    Args:
+        batch_size (int): Количество посылок, обрабатываемых за один раз
+        progress (callable): Функция (посылок_обработано, статистика) после каждой страницы
+
+    Returns:
+        dict: packages, addresses (заполненных адресов в посылках), resolved (из них
+            с координатами), cached и geocoded (разных адресов из кэша и вновь
+            геокодированных), couriers (курьеров размещено в центре зоны),
+            gazetteer (справочник загружен); None в случае ошибки
+    """
+    stats = {"packages": 0, "addresses": 0, "cached": 0, "geocoded": 0, "resolved": 0,
+             "gazetteer": get_index() is not None, "couriers": locate_couriers()}
+    after_id = 0
+    while True:
+        page = database.get_package_addresses_page(after_id, batch_size)
+        if page is None:
+            return None
+        if not page:
+            return stats
+        addresses = [address for row in page for address in (row["sender_address"], row["recipient_address"])]
+        result = geocode_addresses(addresses, stats)
+        if result is None:
+            return None
+        stats["packages"] += len(page)
+        for address in addresses:
+            if address and address.strip():
+                stats["addresses"] += 1
+                stats["resolved"] += result[address.strip()] is not None
+        locations = []
+        for row in page:
+            found = result.get((row["recipient_address"] or "").strip())
+            if found:
+                locations.append((row["id"], found[0], found[1]))
+        if locations and database.save_package_locations(locations) is None:
+            return None
+        after_id = page[-1]["id"]
+        if progress is not None:
+            progress(stats["packages"], stats)
@@ -7,8 +7,12 @@
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from datetime import date
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+import instrumentation
 import package_service
+from background import BackgroundExecutor
+from widgets import PagedSource, VirtualList
 
 # Определение цветовой схемы
 COLORS = {
@@ -21,6 +25,11 @@ COLORS = {
     "button_fg": "#FFFFFF",   # Белый текст на кнопках
 }
 
+# Количество строк, подгружаемых в списки за один запрос
+PAGE_SIZE = 100
+# Период обновления окна диагностики (мс)
+DIAGNOSTICS_REFRESH_MS = 2000
+
 class DeliveryServiceApp:
     """Класс основного приложения службы доставки"""
     
@@ -35,6 +44,7 @@ class DeliveryServiceApp:
         self.root.title("Служба доставки")
         self.root.geometry("800x600")
         self.root.minsize(640, 480)
+        self.diagnostics_window = None
         
         # Настройка стилей
         self.setup_styles()
@@ -42,6 +52,23 @@ class DeliveryServiceApp:
         # Создание главного меню
         self.create_main_menu()
         
+        # Статусная строка с индикатором выполнения фоновых запросов
+        status_frame = ttk.Frame(self.root, style="TFrame")
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var = tk.StringVar()
+        self.status_var.set("Готово к работе")
+        status_bar = ttk.Label(
+            status_frame, 
+            textvariable=self.status_var, 
+            relief=tk.SUNKEN, 
+            anchor=tk.W
+        )
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.busy_bar = ttk.Progressbar(status_frame, mode="indeterminate", length=120)
+        
+        # Обращения к сервису выполняются в фоновых потоках
+        self.tasks = BackgroundExecutor(self.root, on_busy_change=self.set_busy)
+        
         # Создание вкладок
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -70,17 +97,35 @@ class DeliveryServiceApp:
         self.map_frame = ttk.Frame(self.notebook, style="TFrame")
         self.notebook.add(self.map_frame, text="Карта и адреса")
         self.setup_map_frame()
+    
+    def set_busy(self, busy):
+        """Показ или скрытие индикатора выполнения фоновых запросов"""
+        if busy:
+            self.busy_bar.pack(side=tk.RIGHT, padx=5)
+            self.busy_bar.start(10)
+        else:
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+    
+    def close(self):
+        """Остановка фоновых задач перед выходом"""
+        self.tasks.shutdown()
+    
+    def run_service_call(self, fn, *args, on_result=None, key=None):
+        """
+        Вызов функции сервиса в фоновом потоке
         
-        # Статусная строка
-        self.status_var = tk.StringVar()
-        self.status_var.set("Готово к работе")
-        status_bar = ttk.Label(
-            self.root, 
-            textvariable=self.status_var, 
-            relief=tk.SUNKEN, 
-            anchor=tk.W
-        )
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        Args:
+            fn (callable): Функция package_service
+            *args: Аргументы функции
+            on_result (callable): Обработчик результата (в потоке интерфейса)
+            key (str): Ключ задачи: новый вызов с тем же ключом отменяет предыдущий
+        """
+        def on_error(error):
+            self.status_var.set("Ошибка при обращении к базе данных")
+            messagebox.showerror("Ошибка", f"Ошибка при обращении к базе данных: {error}")
+        
+        self.tasks.submit(key, fn, *args, on_success=on_result, on_error=on_error)
     
     def setup_styles(self):
         """Настройка стилей для виджетов"""
@@ -127,6 +172,11 @@ class DeliveryServiceApp:
         file_menu.add_command(label="Выход", command=self.root.quit)
         menubar.add_cascade(label="Файл", menu=file_menu)
         
+        # Меню "Сервис"
+        service_menu = tk.Menu(menubar, tearoff=0)
+        service_menu.add_command(label="Диагностика производительности", command=self.show_diagnostics)
+        menubar.add_cascade(label="Сервис", menu=service_menu)
+        
         # Меню "Справка"
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="О программе", command=self.show_about)
@@ -175,7 +225,7 @@ class DeliveryServiceApp:
         self.description_text.grid(row=4, column=1, sticky=tk.W+tk.E, pady=5)
         
         # Кнопка отправки
-        send_button = tk.Button(
+        send_button = self.send_button = tk.Button(
             form_frame, 
             text="Отправить", 
             command=self.send_package,
@@ -267,6 +317,50 @@ class DeliveryServiceApp:
         # Дата отправки
         self.date_label = ttk.Label(self.info_frame, text="Дата отправки: Информация не найдена", style="TLabel")
         self.date_label.pack(anchor=tk.W, pady=2)
+        
+        # История статусов
+        timeline_label = ttk.Label(self.info_frame, text="История статусов:", style="TLabel")
+        timeline_label.pack(anchor=tk.W, pady=2)
+        self.timeline_listbox = tk.Listbox(self.info_frame, height=4, font=("Arial", 9))
+        self.timeline_listbox.pack(fill=tk.X, pady=5)
+        
+        # Проверка списка посылок
+        batch_frame = tk.LabelFrame(self.track_frame, text="Проверить список посылок",
+                                    bg=COLORS["bg_color"], fg=COLORS["text_color"],
+                                    font=("Arial", 10, "bold"))
+        batch_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        batch_label = ttk.Label(batch_frame, text="Номера (через пробел, запятую или с новой строки):", style="TLabel")
+        batch_label.grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
+        self.batch_numbers_text = scrolledtext.ScrolledText(batch_frame, width=40, height=3, wrap=tk.WORD)
+        self.batch_numbers_text.grid(row=1, column=0, sticky=tk.EW, pady=5, padx=5)
+        
+        self.batch_track_button = tk.Button(
+            batch_frame,
+            text="Проверить список",
+            command=self.track_packages,
+            bg=COLORS["button_bg"],
+            fg=COLORS["button_fg"],
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5,
+            relief=tk.RAISED,
+            cursor="hand2"
+        )
+        self.batch_track_button.grid(row=1, column=1, sticky=tk.N, padx=10, pady=5)
+        
+        columns = ("tracking_number", "status", "recipient", "updated")
+        self.batch_results_table = ttk.Treeview(batch_frame, columns=columns, show="headings", height=6)
+        for column, title, width in zip(columns, ("Номер", "Статус", "Получатель", "Обновлен"), (110, 160, 180, 140)):
+            self.batch_results_table.heading(column, text=title)
+            self.batch_results_table.column(column, width=width, anchor=tk.W)
+        self.batch_results_table.tag_configure("unknown", foreground=COLORS["red"])
+        batch_scrollbar = ttk.Scrollbar(batch_frame, orient=tk.VERTICAL, command=self.batch_results_table.yview)
+        self.batch_results_table.configure(yscrollcommand=batch_scrollbar.set)
+        self.batch_results_table.grid(row=2, column=0, columnspan=2, sticky=tk.NSEW, pady=5, padx=(5, 0))
+        batch_scrollbar.grid(row=2, column=2, sticky=tk.NS, pady=5)
+        batch_frame.columnconfigure(0, weight=1)
+        batch_frame.rowconfigure(2, weight=1)
     
     def send_package(self):
         """Обработчик отправки посылки"""
@@ -281,8 +375,22 @@ class DeliveryServiceApp:
             messagebox.showerror("Ошибка", "Пожалуйста, заполните все обязательные поля.")
             return
         
-        # Отправка посылки через сервис
-        success, result = package_service.send_package(description, sender, recipient, sender_address, recipient_address)
+        # Отправка посылки через сервис в фоновом потоке
+        self.send_button.config(state=tk.DISABLED)
+        self.status_var.set("Отправка посылки...")
+        self.tasks.submit(
+            None, package_service.send_package, description, sender, recipient, sender_address, recipient_address,
+            on_success=self.on_package_sent, on_error=self.on_package_send_error
+        )
+    
+    def on_package_send_error(self, error):
+        """Обработчик исключения при отправке посылки"""
+        self.on_package_sent((False, str(error)))
+    
+    def on_package_sent(self, response):
+        """Обработчик результата отправки посылки"""
+        self.send_button.config(state=tk.NORMAL)
+        success, result = response
         
         if success:
             self.result_var.set(f"Посылка успешно отправлена!\nНомер для отслеживания: {result}")
@@ -309,9 +417,24 @@ class DeliveryServiceApp:
             messagebox.showerror("Ошибка", "Пожалуйста, введите номер отслеживания.")
             return
         
-        # Получение информации о посылке через сервис
-        success, result = package_service.track_package(tracking_number)
+        # Получение информации о посылке через сервис. Новый запрос отменяет
+        # предыдущий, поэтому показывается результат только последнего поиска.
+        self.status_var.set(f"Поиск посылки {tracking_number}...")
+        self.tasks.submit(
+            "track", package_service.track_package, tracking_number,
+            on_success=lambda response: self.show_tracking_result(tracking_number, *response),
+            on_error=lambda error: self.show_tracking_result(tracking_number, False, str(error))
+        )
+    
+    def show_tracking_result(self, tracking_number, success, result):
+        """
+        Отображение результата отслеживания посылки
         
+        Args:
+            tracking_number (str): Номер отслеживания
+            success (bool): Успех запроса
+            result (dict | str): Информация о посылке или сообщение об ошибке
+        """
         if success and isinstance(result, dict):
             # Безопасное получение данных из словаря
             status = result.get('status', 'Не указано')
@@ -338,6 +461,11 @@ class DeliveryServiceApp:
                 date_str = created_at
             self.date_label.config(text=f"Дата отправки: {date_str}")
             
+            # История статусов загружается отдельным фоновым запросом
+            self.timeline_listbox.delete(0, tk.END)
+            self.run_service_call(package_service.get_package_timeline, tracking_number,
+                                  on_result=self.show_timeline, key="timeline")
+            
             self.status_var.set(f"Посылка {tracking_number} отслежена. Статус: {status}")
         else:
             # Сброс информации при ошибке
@@ -351,6 +479,8 @@ class DeliveryServiceApp:
             self.description_info.config(state=tk.DISABLED)
             
             self.date_label.config(text="Дата отправки: Информация не найдена")
+            self.tasks.cancel("timeline")
+            self.timeline_listbox.delete(0, tk.END)
             
             self.status_var.set(f"Ошибка при отслеживании посылки {tracking_number}")
             
@@ -359,6 +489,57 @@ class DeliveryServiceApp:
             else:
                 messagebox.showerror("Ошибка", "Посылка с таким номером не найдена")
     
+    def track_packages(self):
+        """Обработчик проверки списка посылок"""
+        numbers = package_service.parse_tracking_numbers(self.batch_numbers_text.get("1.0", tk.END))
+        
+        if not numbers:
+            messagebox.showerror("Ошибка", "Пожалуйста, вставьте номера отслеживания.")
+            return
+        
+        self.batch_track_button.config(state=tk.DISABLED)
+        self.status_var.set(f"Проверка посылок: {len(numbers)}...")
+        self.tasks.submit(
+            "track-batch", package_service.track_packages, numbers,
+            on_success=self.show_batch_results,
+            on_error=lambda error: self.show_batch_results((False, str(error)))
+        )
+    
+    def show_batch_results(self, response):
+        """Отображение результатов проверки списка посылок в таблице"""
+        self.batch_track_button.config(state=tk.NORMAL)
+        success, result = response
+        
+        if not success:
+            self.status_var.set("Ошибка при проверке списка посылок")
+            messagebox.showerror("Ошибка", result)
+            return
+        
+        self.batch_results_table.delete(*self.batch_results_table.get_children())
+        unknown = 0
+        for tracking_number, package in result.items():
+            if package is None:
+                unknown += 1
+                self.batch_results_table.insert("", tk.END, values=(tracking_number, "Не найдена", "", ""),
+                                                tags=("unknown",))
+                continue
+            updated = str(package.get('status_updated_at') or package.get('created_at') or "")
+            self.batch_results_table.insert("", tk.END, values=(
+                tracking_number, package['status'], package.get('recipient') or "", updated.split('.')[0]
+            ))
+        self.status_var.set(f"Проверено посылок: {len(result)}, не найдено: {unknown}")
+    
+    def show_timeline(self, response):
+        """Отображение истории статусов посылки"""
+        success, events = response
+        self.timeline_listbox.delete(0, tk.END)
+        if not success:
+            return
+        for event in events:
+            ts = str(event['ts'])
+            date_str = ts.split('.')[0] if '.' in ts else ts
+            self.timeline_listbox.insert(tk.END, f"{date_str} - {event['status']}")
+    
     def setup_review_frame(self):
         """Настройка фрейма для отзывов"""
         # Заголовок
@@ -415,16 +596,24 @@ class DeliveryServiceApp:
         reviews_label = ttk.Label(self.review_frame, text="Все отзывы:", style="Subheading.TLabel")
         reviews_label.pack(anchor=tk.W, padx=20, pady=(10, 5))
         
+        # Сводка оценок (читается из агрегатов, без пересчета отзывов)
+        self.rating_summary_var = tk.StringVar(value="Загрузка статистики оценок...")
+        rating_summary_label = ttk.Label(self.review_frame, textvariable=self.rating_summary_var, style="TLabel")
+        rating_summary_label.pack(anchor=tk.W, padx=20)
+        
         # Фрейм со скроллом для отзывов
         reviews_scroll_frame = tk.Frame(self.review_frame)
         reviews_scroll_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
-        self.reviews_listbox = tk.Listbox(reviews_scroll_frame, height=10, font=("Arial", 9))
-        scrollbar_reviews = tk.Scrollbar(reviews_scroll_frame, orient=tk.VERTICAL, command=self.reviews_listbox.yview)
-        self.reviews_listbox.config(yscrollcommand=scrollbar_reviews.set)
-        
-        self.reviews_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar_reviews.pack(side=tk.RIGHT, fill=tk.Y)
+        reviews_source = PagedSource(
+            package_service.list_reviews,
+            package_service.count_reviews,
+            lambda row: package_service.page_key(row, "reviews"),
+            page_size=PAGE_SIZE
+        )
+        self.reviews_list = VirtualList(reviews_scroll_frame, reviews_source, self.format_review,
+                                        height=10, executor=self.tasks)
+        self.reviews_list.pack(fill=tk.BOTH, expand=True)
         
         # Кнопка обновления списка отзывов
         refresh_reviews_button = tk.Button(
@@ -474,6 +663,12 @@ class DeliveryServiceApp:
         self.courier_email_entry = ttk.Entry(add_courier_frame, width=30)
         self.courier_email_entry.grid(row=2, column=1, sticky=tk.W, pady=5, padx=5)
         
+        # Зона доставки
+        zone_label = ttk.Label(add_courier_frame, text="Зона (город):", style="TLabel")
+        zone_label.grid(row=3, column=0, sticky=tk.W, pady=5, padx=5)
+        self.courier_zone_entry = ttk.Entry(add_courier_frame, width=30)
+        self.courier_zone_entry.grid(row=3, column=1, sticky=tk.W, pady=5, padx=5)
+        
         # Кнопка добавления курьера
         add_courier_button = tk.Button(
             add_courier_frame,
@@ -487,7 +682,7 @@ class DeliveryServiceApp:
             relief=tk.RAISED,
             cursor="hand2"
         )
-        add_courier_button.grid(row=3, column=1, sticky=tk.E, pady=10, padx=5)
+        add_courier_button.grid(row=4, column=1, sticky=tk.E, pady=10, padx=5)
         
         # Список курьеров
         couriers_label = ttk.Label(self.courier_frame, text="Список курьеров:", style="Subheading.TLabel")
@@ -497,12 +692,15 @@ class DeliveryServiceApp:
         couriers_scroll_frame = tk.Frame(self.courier_frame)
         couriers_scroll_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
-        self.couriers_listbox = tk.Listbox(couriers_scroll_frame, height=8, font=("Arial", 9))
-        scrollbar_couriers = tk.Scrollbar(couriers_scroll_frame, orient=tk.VERTICAL, command=self.couriers_listbox.yview)
-        self.couriers_listbox.config(yscrollcommand=scrollbar_couriers.set)
-        
-        self.couriers_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar_couriers.pack(side=tk.RIGHT, fill=tk.Y)
+        couriers_source = PagedSource(
+            package_service.list_couriers,
+            package_service.count_couriers,
+            lambda row: package_service.page_key(row, "couriers"),
+            page_size=PAGE_SIZE
+        )
+        self.couriers_list = VirtualList(couriers_scroll_frame, couriers_source, self.format_courier,
+                                         height=8, executor=self.tasks)
+        self.couriers_list.pack(fill=tk.BOTH, expand=True)
         
         # Кнопки управления курьерами
         buttons_frame = tk.Frame(self.courier_frame)
@@ -536,6 +734,34 @@ class DeliveryServiceApp:
         )
         delete_courier_button.pack(side=tk.LEFT, padx=5)
         
+        dispatch_button = tk.Button(
+            buttons_frame,
+            text="Распределить новые посылки",
+            command=self.dispatch_packages,
+            bg=COLORS["button_bg"],
+            fg=COLORS["button_fg"],
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5,
+            relief=tk.RAISED,
+            cursor="hand2"
+        )
+        dispatch_button.pack(side=tk.LEFT, padx=5)
+        
+        route_button = tk.Button(
+            buttons_frame,
+            text="Маршрут выбранного",
+            command=self.show_courier_route,
+            bg=COLORS["button_bg"],
+            fg=COLORS["button_fg"],
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5,
+            relief=tk.RAISED,
+            cursor="hand2"
+        )
+        route_button.pack(side=tk.LEFT, padx=5)
+        
         # Загрузка курьеров при инициализации
         self.refresh_couriers()
     
@@ -551,7 +777,12 @@ class DeliveryServiceApp:
             return
         
         # Добавление отзыва через сервис
-        success, result = package_service.add_review(tracking_number, customer_name, rating, comment)
+        self.run_service_call(package_service.add_review, tracking_number, customer_name, rating, comment,
+                              on_result=self.on_review_added)
+    
+    def on_review_added(self, response):
+        """Обработчик результата добавления отзыва"""
+        success, result = response
         
         if success:
             self.status_var.set("Отзыв успешно добавлен")
@@ -572,32 +803,62 @@ class DeliveryServiceApp:
     
     def refresh_reviews(self):
         """Обновление списка отзывов"""
-        self.reviews_listbox.delete(0, tk.END)
-        reviews = package_service.get_reviews()
+        self.reviews_list.refresh()
+        self.refresh_rating_summary()
+    
+    def refresh_rating_summary(self):
+        """Обновление сводки оценок"""
+        self.run_service_call(self.load_rating_summary, on_result=self.show_rating_summary, key="rating-summary")
+    
+    def load_rating_summary(self):
+        """Получение общей сводки оценок и сводки за сегодня (выполняется в фоновом потоке)"""
+        return package_service.get_rating_summary(), package_service.get_rating_summary(day=date.today())
+    
+    def show_rating_summary(self, response):
+        """Отображение сводки оценок в заголовке списка отзывов"""
+        (success, summary), (today_success, today) = response
+        if not success:
+            self.rating_summary_var.set(summary)
+            return
+        if not summary["count"]:
+            self.rating_summary_var.set("Отзывов пока нет")
+            return
         
-        for review in reviews:
-            rating_stars = "★" * review['rating'] + "☆" * (5 - review['rating'])
-            tracking_text = f" (Посылка: {review['tracking_number']})" if review['tracking_number'] else ""
-            date_str = review['created_at'].split('.')[0] if '.' in review['created_at'] else review['created_at']
-            
-            review_text = f"{rating_stars} {review['customer_name']}{tracking_text} - {date_str}"
-            if review['comment']:
-                review_text += f"\n   {review['comment'][:60]}{'...' if len(review['comment']) > 60 else ''}"
-            
-            self.reviews_listbox.insert(tk.END, review_text)
+        histogram = "  ".join(f"{rating}★: {summary['histogram'][rating]}" for rating in range(5, 0, -1))
+        text = f"Отзывов: {summary['count']}, средняя оценка: {summary['average']:.2f}  |  {histogram}"
+        if today_success and today["count"]:
+            text += f"  |  сегодня: {today['count']} (средняя {today['average']:.2f})"
+        self.rating_summary_var.set(text)
+    
+    def format_review(self, review):
+        """Форматирование строки списка отзывов"""
+        rating_stars = "★" * review['rating'] + "☆" * (5 - review['rating'])
+        tracking_text = f" (Посылка: {review['tracking_number']})" if review['tracking_number'] else ""
+        date_str = review['created_at'].split('.')[0] if '.' in review['created_at'] else review['created_at']
+        
+        review_text = f"{rating_stars} {review['customer_name']}{tracking_text} - {date_str}"
+        if review['comment']:
+            review_text += f"\n   {review['comment'][:60]}{'...' if len(review['comment']) > 60 else ''}"
+        
+        return review_text
     
     def add_courier(self):
         """Обработчик добавления курьера"""
         name = self.courier_name_entry.get().strip()
         phone = self.courier_phone_entry.get().strip()
         email = self.courier_email_entry.get().strip()
+        zone = self.courier_zone_entry.get().strip()
         
         if not name:
             messagebox.showerror("Ошибка", "Пожалуйста, введите имя курьера.")
             return
         
         # Добавление курьера через сервис
-        success, result = package_service.add_courier(name, phone, email)
+        self.run_service_call(package_service.add_courier, name, phone, email, zone, on_result=self.on_courier_added)
+    
+    def on_courier_added(self, response):
+        """Обработчик результата добавления курьера"""
+        success, result = response
         
         if success:
             self.status_var.set("Курьер успешно добавлен")
@@ -606,6 +867,7 @@ class DeliveryServiceApp:
             self.courier_name_entry.delete(0, tk.END)
             self.courier_phone_entry.delete(0, tk.END)
             self.courier_email_entry.delete(0, tk.END)
+            self.courier_zone_entry.delete(0, tk.END)
             
             # Обновление списка курьеров
             self.refresh_couriers()
@@ -617,41 +879,124 @@ class DeliveryServiceApp:
     
     def refresh_couriers(self):
         """Обновление списка курьеров"""
-        self.couriers_listbox.delete(0, tk.END)
-        couriers = package_service.get_couriers()
-        
-        for courier in couriers:
-            courier_text = f"ID: {courier['id']} | {courier['name']}"
-            if courier['phone']:
-                courier_text += f" | Тел: {courier['phone']}"
-            if courier['email']:
-                courier_text += f" | Email: {courier['email']}"
-            
-            self.couriers_listbox.insert(tk.END, courier_text)
+        self.couriers_list.refresh()
+    
+    def format_courier(self, courier):
+        """Форматирование строки списка курьеров"""
+        courier_text = f"ID: {courier['id']} | {courier['name']}"
+        if courier['phone']:
+            courier_text += f" | Тел: {courier['phone']}"
+        if courier['email']:
+            courier_text += f" | Email: {courier['email']}"
+        if courier.get('zone'):
+            courier_text += f" | Зона: {courier['zone']}"
+        courier_text += f" | Посылок в работе: {courier.get('active_load') or 0}"
+        
+        return courier_text
     
     def delete_courier(self):
         """Обработчик удаления курьера"""
-        selection = self.couriers_listbox.curselection()
+        courier = self.couriers_list.get_selected()
         
-        if not selection:
+        if not courier:
             messagebox.showerror("Ошибка", "Пожалуйста, выберите курьера для удаления.")
             return
         
-        # Получение ID курьера из выбранной строки
-        selected_text = self.couriers_listbox.get(selection[0])
-        courier_id = int(selected_text.split(" | ")[0].replace("ID: ", ""))
+        courier_id = courier['id']
         
         # Подтверждение удаления
         if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить этого курьера?"):
-            success, result = package_service.remove_courier(courier_id)
-            
-            if success:
-                self.status_var.set("Курьер успешно удален")
-                self.refresh_couriers()
-                messagebox.showinfo("Успех", result)
-            else:
-                self.status_var.set("Ошибка при удалении курьера")
-                messagebox.showerror("Ошибка", result)
+            self.run_service_call(package_service.remove_courier, courier_id, on_result=self.on_courier_removed)
+    
+    def dispatch_packages(self):
+        """Распределение новых посылок между курьерами (по зонам, если у курьеров указаны зоны)"""
+        self.status_var.set("Распределение посылок...")
+        self.run_service_call(package_service.dispatch_packages, "zone", on_result=self.on_packages_dispatched,
+                              key="dispatch")
+    
+    def show_courier_route(self):
+        """Построение маршрута объезда посылок выбранного курьера"""
+        courier = self.couriers_list.get_selected()
+        
+        if not courier:
+            messagebox.showerror("Ошибка", "Пожалуйста, выберите курьера.")
+            return
+        
+        self.status_var.set("Построение маршрута...")
+        self.run_service_call(package_service.plan_courier_route, courier['id'],
+                              on_result=lambda response: self.on_courier_route_planned(courier, response),
+                              key="courier-route")
+    
+    def on_courier_route_planned(self, courier, response):
+        """Окно с маршрутом курьера"""
+        success, result = response
+        
+        if not success:
+            self.status_var.set("Ошибка при построении маршрута")
+            messagebox.showerror("Ошибка", result)
+            return
+        if not result["stops"] and not result["unlocated"]:
+            self.status_var.set("У курьера нет посылок в работе")
+            messagebox.showinfo("Информация", "У курьера нет посылок в работе.")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Маршрут курьера {courier['name']}")
+        window.geometry("760x420")
+        window.configure(bg=COLORS["bg_color"])
+        
+        summary = (f"Остановок: {len(result['stops'])}, маршрут {result['total_km']:.1f} км "
+                   f"(в порядке назначения {result['naive_km']:.1f} км)")
+        if result["start"] is None:
+            summary += "; координаты курьера неизвестны, маршрут начинается с первой остановки"
+        ttk.Label(window, text=summary, style="TLabel", wraplength=720).pack(padx=10, pady=10, anchor=tk.W)
+        
+        list_frame = tk.Frame(window)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        stops_list = tk.Listbox(list_frame, font=("Arial", 9), yscrollcommand=scrollbar.set)
+        scrollbar.config(command=stops_list.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        stops_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        for number, stop in enumerate(result["stops"], 1):
+            stops_list.insert(
+                tk.END,
+                f"{number}. {stop['tracking_number']} | +{stop['leg_km']:.1f} км | {stop['recipient']} | "
+                f"{stop['recipient_address']}"
+            )
+        for package in result["unlocated"]:
+            stops_list.insert(
+                tk.END,
+                f"Без координат: {package['tracking_number']} | {package['recipient']} | "
+                f"{package['recipient_address'] or 'Адрес не указан'}"
+            )
+        self.status_var.set(summary)
+    
+    def on_packages_dispatched(self, response):
+        """Обработчик результата распределения посылок"""
+        success, result = response
+        
+        if success:
+            self.status_var.set(f"Распределено посылок: {result['assigned']}")
+            self.refresh_couriers()
+            if result["assigned"] == 0:
+                messagebox.showinfo("Информация", "Новых посылок без курьера нет.")
+        else:
+            self.status_var.set("Ошибка при распределении посылок")
+            messagebox.showerror("Ошибка", result)
+    
+    def on_courier_removed(self, response):
+        """Обработчик результата удаления курьера"""
+        success, result = response
+        
+        if success:
+            self.status_var.set("Курьер успешно удален")
+            self.refresh_couriers()
+            messagebox.showinfo("Успех", result)
+        else:
+            self.status_var.set("Ошибка при удалении курьера")
+            messagebox.showerror("Ошибка", result)
 
     def setup_map_frame(self):
         """Настройка фрейма для карты доставки"""
@@ -686,6 +1031,66 @@ class DeliveryServiceApp:
         )
         search_button.grid(row=0, column=2, sticky=tk.W, padx=10, pady=5)
         
+        # Недоставленные посылки и курьеры рядом с введенным адресом
+        radius_label = ttk.Label(search_frame, text="Радиус, км:", style="TLabel")
+        radius_label.grid(row=1, column=0, sticky=tk.W, pady=5, padx=5)
+        self.radius_entry = ttk.Entry(search_frame, width=10)
+        self.radius_entry.insert(0, "3")
+        self.radius_entry.grid(row=1, column=1, sticky=tk.W, pady=5, padx=5)
+        
+        nearby_button = tk.Button(
+            search_frame,
+            text="Посылки рядом",
+            command=self.search_nearby,
+            bg=COLORS["button_bg"],
+            fg=COLORS["button_fg"],
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5,
+            relief=tk.RAISED,
+            cursor="hand2"
+        )
+        nearby_button.grid(row=1, column=2, sticky=tk.W, padx=10, pady=5)
+        
+        self.nearby_list = tk.Listbox(search_frame, height=5, font=("Arial", 9), exportselection=False)
+        self.nearby_list.grid(row=2, column=0, columnspan=3, sticky=tk.EW, padx=5, pady=5)
+        search_frame.columnconfigure(1, weight=1)
+        
+        # Поиск посылок по имени, описанию или адресу
+        package_search_frame = tk.LabelFrame(self.map_frame, text="Поиск посылок",
+                                           bg=COLORS["bg_color"], fg=COLORS["text_color"],
+                                           font=("Arial", 10, "bold"))
+        package_search_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        query_label = ttk.Label(package_search_frame, text="Имя, описание или адрес:", style="TLabel")
+        query_label.grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
+        self.package_query_entry = ttk.Entry(package_search_frame, width=40)
+        self.package_query_entry.grid(row=0, column=1, sticky=tk.W, pady=5, padx=5)
+        # Поиск выполняется по мере ввода; устаревшие запросы отменяются
+        self.package_query_entry.bind("<KeyRelease>", lambda event: self.search_packages(quiet=True))
+        self.package_query_entry.bind("<Return>", lambda event: self.search_packages())
+        
+        package_search_button = tk.Button(
+            package_search_frame,
+            text="Найти посылки",
+            command=self.search_packages,
+            bg=COLORS["button_bg"],
+            fg=COLORS["button_fg"],
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5,
+            relief=tk.RAISED,
+            cursor="hand2"
+        )
+        package_search_button.grid(row=0, column=2, sticky=tk.W, padx=10, pady=5)
+        
+        self.search_results = []
+        self.search_results_list = tk.Listbox(package_search_frame, height=5, font=("Arial", 9),
+                                              exportselection=False)
+        self.search_results_list.grid(row=1, column=0, columnspan=3, sticky=tk.EW, padx=5, pady=5)
+        self.search_results_list.bind("<Double-Button-1>", lambda event: self.show_search_result())
+        package_search_frame.columnconfigure(1, weight=1)
+        
         # Информация об адресах посылок
         packages_frame = tk.LabelFrame(self.map_frame, text="Адреса посылок", 
                                      bg=COLORS["bg_color"], fg=COLORS["text_color"], 
@@ -693,12 +1098,15 @@ class DeliveryServiceApp:
         packages_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
         # Список посылок с адресами
-        self.packages_listbox = tk.Listbox(packages_frame, height=8, font=("Arial", 9))
-        scrollbar_packages = tk.Scrollbar(packages_frame, orient=tk.VERTICAL, command=self.packages_listbox.yview)
-        self.packages_listbox.config(yscrollcommand=scrollbar_packages.set)
-        
-        self.packages_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-        scrollbar_packages.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+        packages_source = PagedSource(
+            package_service.list_packages,
+            package_service.count_packages,
+            lambda row: package_service.page_key(row, "packages"),
+            page_size=PAGE_SIZE
+        )
+        self.packages_list = VirtualList(packages_frame, packages_source, self.format_package_addresses,
+                                         empty_text="Нет посылок с адресами", height=8, executor=self.tasks)
+        self.packages_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # Кнопки
         buttons_frame = tk.Frame(self.map_frame)
@@ -732,79 +1140,194 @@ class DeliveryServiceApp:
         )
         show_selected_button.pack(side=tk.LEFT, padx=5)
         
+        geocode_button = tk.Button(
+            buttons_frame,
+            text="Координаты адресов посылок",
+            command=self.geocode_packages,
+            bg=COLORS["button_bg"],
+            fg=COLORS["button_fg"],
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5,
+            relief=tk.RAISED,
+            cursor="hand2"
+        )
+        geocode_button.pack(side=tk.LEFT, padx=5)
+        
         # Загрузка списка при инициализации
         self.refresh_packages_list()
     
     def search_address(self):
-        """Поиск адреса на Яндекс.Картах"""
+        """Поиск адреса на Яндекс.Картах (по координатам из справочника, если адрес в нем есть)"""
         address = self.address_entry.get().strip()
         
         if not address:
             messagebox.showerror("Ошибка", "Пожалуйста, введите адрес для поиска.")
             return
         
+        self.run_service_call(package_service.geocode_address, address,
+                              on_result=lambda response: self.open_address_on_map(address, response),
+                              key="geocode-address")
+    
+    def open_address_on_map(self, address, response):
+        """Открытие адреса на Яндекс.Картах: точкой по координатам или текстовым поиском"""
         import webbrowser
         import urllib.parse
         
-        # Формирование URL для поиска адреса в Яндекс.Картах
-        encoded_address = urllib.parse.quote(address)
-        yandex_url = f"https://yandex.ru/maps/?text={encoded_address}"
+        success, result = response
+        if success:
+            lat, lon, precision = result
+            yandex_url = f"https://yandex.ru/maps/?ll={lon:.6f},{lat:.6f}&pt={lon:.6f},{lat:.6f}&z={16 if precision == 'street' else 11}"
+            coordinates = f" ({lat:.5f}, {lon:.5f})"
+        else:
+            # Формирование URL для поиска адреса в Яндекс.Картах
+            encoded_address = urllib.parse.quote(address)
+            yandex_url = f"https://yandex.ru/maps/?text={encoded_address}"
+            coordinates = ""
         
         try:
             webbrowser.open(yandex_url)
-            self.status_var.set(f"Адрес '{address}' открыт в Яндекс.Картах")
-            messagebox.showinfo("Успех", f"Адрес '{address}' открыт в Яндекс.Картах!")
+            self.status_var.set(f"Адрес '{address}'{coordinates} открыт в Яндекс.Картах")
+            messagebox.showinfo("Успех", f"Адрес '{address}'{coordinates} открыт в Яндекс.Картах!")
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось открыть браузер: {e}")
     
-    def refresh_packages_list(self):
-        """Обновление списка посылок с адресами"""
+    def search_nearby(self):
+        """Поиск недоставленных посылок и ближайших курьеров рядом с введенным адресом"""
+        address = self.address_entry.get().strip()
+        if not address:
+            messagebox.showerror("Ошибка", "Пожалуйста, введите адрес для поиска.")
+            return
         try:
-            from database import get_all_packages
-        except ImportError:
-            # Если функция не существует, создадим её
-            self.packages_listbox.delete(0, tk.END)
-            self.packages_listbox.insert(tk.END, "Список посылок недоступен")
+            radius = float(self.radius_entry.get().replace(",", "."))
+        except ValueError:
+            messagebox.showerror("Ошибка", "Радиус должен быть числом.")
+            return
+        self.run_service_call(package_service.packages_near_address, address, radius,
+                              on_result=self.show_nearby, key="nearby")
+    
+    def show_nearby(self, response):
+        """Отображение посылок и курьеров рядом с адресом"""
+        success, result = response
+        self.nearby_list.delete(0, tk.END)
+        
+        if not success:
+            self.nearby_list.insert(tk.END, result)
+            self.status_var.set(result)
             return
         
-        self.packages_listbox.delete(0, tk.END)
-        packages = get_all_packages()
+        for courier in result["couriers"]:
+            self.nearby_list.insert(
+                tk.END,
+                f"Курьер {courier['name']} | {courier['distance_km']:.1f} км | посылок в работе: {courier['active_load']}"
+            )
+        for package in result["packages"]:
+            self.nearby_list.insert(
+                tk.END,
+                f"{package['tracking_number']} | {package['distance_km']:.1f} км | {package['status']} | "
+                f"{package['recipient_address'] or 'Адрес не указан'}"
+            )
+        lat, lon, precision = result["point"]
+        note = " (только город)" if precision != "street" else ""
+        self.status_var.set(f"Посылок рядом: {len(result['packages'])}, точка {lat:.5f}, {lon:.5f}{note}")
+    
+    def geocode_packages(self):
+        """Определение координат адресов всех посылок по локальному справочнику"""
+        self.status_var.set("Определение координат адресов посылок...")
+        self.run_service_call(package_service.geocode_packages, on_result=self.on_packages_geocoded,
+                              key="geocode-packages")
+    
+    def on_packages_geocoded(self, response):
+        """Обработчик результата геокодирования адресов посылок"""
+        success, result = response
         
-        if not packages:
-            self.packages_listbox.insert(tk.END, "Нет посылок с адресами")
+        if success:
+            self.status_var.set(f"Адресов с координатами: {result['resolved']} из {result['addresses']}")
+            messagebox.showinfo(
+                "Информация",
+                f"Обработано посылок: {result['packages']}\n"
+                f"Адресов с координатами: {result['resolved']} из {result['addresses']}\n"
+                f"Новых адресов в справочнике координат: {result['geocoded']}"
+            )
+        else:
+            self.status_var.set("Ошибка при определении координат")
+            messagebox.showerror("Ошибка", result)
+    
+    def search_packages(self, quiet=False):
+        """
+        Поиск посылок по введенному запросу
+        
+        Args:
+            quiet (bool): Не сообщать об ошибках (поиск по мере ввода)
+        """
+        query = self.package_query_entry.get().strip()
+        if not query:
+            self.tasks.cancel("package-search")
+            self.show_search_results((False, ""), quiet=True)
             return
+        self.tasks.submit("package-search", package_service.search_packages, query,
+                          on_success=lambda response: self.show_search_results(response, quiet))
+    
+    def show_search_results(self, response, quiet=False):
+        """Отображение результатов поиска посылок"""
+        success, result = response
+        self.search_results_list.delete(0, tk.END)
+        self.search_results = result if success else []
         
-        for package in packages:
-            sender_address = package.get('sender_address', 'Не указан')
-            recipient_address = package.get('recipient_address', 'Не указан')
-            
-            package_text = f"Посылка {package['tracking_number']}"
-            if sender_address and sender_address != 'Не указан':
-                package_text += f" | От: {sender_address[:30]}..."
-            if recipient_address and recipient_address != 'Не указан':
-                package_text += f" | До: {recipient_address[:30]}..."
-            
-            self.packages_listbox.insert(tk.END, package_text)
+        if success:
+            for package in result:
+                self.search_results_list.insert(
+                    tk.END,
+                    f"{package['tracking_number']} | {package['recipient']} | {package.get('recipient_address') or 'Адрес не указан'}"
+                )
+            self.status_var.set(f"Найдено посылок: {len(result)}")
+        elif result:
+            self.search_results_list.insert(tk.END, result)
+            if not quiet:
+                self.status_var.set(result)
+    
+    def show_search_result(self):
+        """Показать на карте адрес посылки, выбранной в результатах поиска"""
+        selection = self.search_results_list.curselection()
+        if not selection or selection[0] >= len(self.search_results):
+            return
+        package = self.search_results[selection[0]]
+        self.on_selected_package_loaded((True, package))
+    
+    def refresh_packages_list(self):
+        """Обновление списка посылок с адресами"""
+        self.packages_list.refresh()
+    
+    def format_package_addresses(self, package):
+        """Форматирование строки списка посылок с адресами"""
+        sender_address = package.get('sender_address', 'Не указан')
+        recipient_address = package.get('recipient_address', 'Не указан')
+        
+        package_text = f"Посылка {package['tracking_number']}"
+        if sender_address and sender_address != 'Не указан':
+            package_text += f" | От: {sender_address[:30]}..."
+        if recipient_address and recipient_address != 'Не указан':
+            package_text += f" | До: {recipient_address[:30]}..."
+        
+        return package_text
     
     def show_selected_address(self):
         """Показать выбранный адрес на карте"""
-        selection = self.packages_listbox.curselection()
+        package = self.packages_list.get_selected()
         
-        if not selection:
+        if not package:
             messagebox.showerror("Ошибка", "Пожалуйста, выберите посылку из списка.")
             return
         
-        selected_text = self.packages_listbox.get(selection[0])
-        
-        if "Нет посылок" in selected_text or "недоступен" in selected_text:
-            messagebox.showinfo("Информация", "Выберите реальную посылку из списка.")
-            return
-        
-        # Извлечение номера посылки
-        tracking_number = selected_text.split()[1]  # "Посылка XX-123456"
+        tracking_number = package['tracking_number']
         
         # Получение информации о посылке
-        success, result = package_service.track_package(tracking_number)
+        self.run_service_call(package_service.track_package, tracking_number,
+                              on_result=self.on_selected_package_loaded, key="selected-address")
+    
+    def on_selected_package_loaded(self, response):
+        """Обработчик получения информации о выбранной посылке"""
+        success, result = response
         
         if success and isinstance(result, dict):
             sender_address = result.get('sender_address', '')
@@ -821,6 +1344,111 @@ class DeliveryServiceApp:
         else:
             messagebox.showerror("Ошибка", "Не удалось найти информацию о посылке.")
 
+    def show_diagnostics(self):
+        """Окно с метриками вызовов сервиса и базы данных"""
+        if self.diagnostics_window is not None:
+            self.diagnostics_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Диагностика производительности")
+        window.geometry("900x420")
+        window.configure(bg=COLORS["bg_color"])
+        self.diagnostics_window = window
+        
+        controls = ttk.Frame(window, style="TFrame")
+        controls.pack(fill=tk.X, padx=10, pady=5)
+        self.instrumentation_var = tk.BooleanVar(value=instrumentation.enabled)
+        tk.Checkbutton(
+            controls,
+            text="Сбор метрик включен",
+            variable=self.instrumentation_var,
+            command=self.toggle_instrumentation,
+            bg=COLORS["bg_color"],
+            fg=COLORS["text_color"],
+            font=("Arial", 10)
+        ).pack(side=tk.LEFT)
+        for text, command in (("Сохранить (Prometheus)", self.save_metrics), ("Сбросить", self.reset_diagnostics)):
+            tk.Button(
+                controls,
+                text=text,
+                command=command,
+                bg=COLORS["button_bg"],
+                fg=COLORS["button_fg"],
+                font=("Arial", 10, "bold"),
+                padx=10,
+                relief=tk.RAISED,
+                cursor="hand2"
+            ).pack(side=tk.RIGHT, padx=5)
+        
+        columns = ("function", "calls", "errors", "total", "avg", "p99", "connect", "execute", "fetch")
+        titles = ("Функция", "Вызовы", "Ошибки", "Всего, мс", "Среднее, мс", "p99 ≤, мс",
+                  "Соединение, мс", "Запросы, мс", "Чтение, мс")
+        table_frame = ttk.Frame(window, style="TFrame")
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.diagnostics_table = ttk.Treeview(table_frame, columns=columns, show="headings")
+        for column, title in zip(columns, titles):
+            self.diagnostics_table.heading(column, text=title)
+            self.diagnostics_table.column(column, width=260 if column == "function" else 80,
+                                          anchor=tk.W if column == "function" else tk.E)
+        self.diagnostics_table.tag_configure("errors", foreground=COLORS["red"])
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.diagnostics_table.yview)
+        self.diagnostics_table.configure(yscrollcommand=scrollbar.set)
+        self.diagnostics_table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def on_close():
+            window.after_cancel(self.diagnostics_refresh_id)
+            self.diagnostics_window = None
+            window.destroy()
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        self.refresh_diagnostics()
+    
+    def refresh_diagnostics(self):
+        """Обновление таблицы метрик, пока окно диагностики открыто"""
+        if self.diagnostics_window is None:
+            return
+        
+        def ms(value):
+            return "" if value is None else f"{value:.3f}"
+        
+        self.diagnostics_table.delete(*self.diagnostics_table.get_children())
+        for row in instrumentation.registry.snapshot():
+            self.diagnostics_table.insert("", tk.END, tags=("errors",) if row["errors"] else (), values=(
+                row["function"], row["calls"], row["errors"], ms(row["total_ms"]), ms(row["avg_ms"]),
+                ms(row["p99_ms"]), ms(row["connect_ms"]), ms(row["execute_ms"]), ms(row["fetch_ms"])
+            ))
+        self.diagnostics_refresh_id = self.diagnostics_window.after(DIAGNOSTICS_REFRESH_MS, self.refresh_diagnostics)
+    
+    def toggle_instrumentation(self):
+        """Включение или выключение сбора метрик"""
+        if self.instrumentation_var.get():
+            instrumentation.enable()
+            self.status_var.set("Сбор метрик включен")
+        else:
+            instrumentation.disable()
+            self.status_var.set("Сбор метрик выключен")
+    
+    def reset_diagnostics(self):
+        """Сброс собранных метрик"""
+        instrumentation.registry.reset()
+        self.diagnostics_table.delete(*self.diagnostics_table.get_children())
+    
+    def save_metrics(self):
+        """Сохранение метрик в файл в текстовом формате Prometheus"""
+        path = filedialog.asksaveasfilename(
+            parent=self.diagnostics_window,
+            title="Сохранить метрики",
+            defaultextension=".txt",
+            filetypes=(("Текстовые файлы", "*.txt"), ("Все файлы", "*.*"))
+        )
+        if not path:
+            return
+        if instrumentation.write_prometheus(path):
+            self.status_var.set(f"Метрики сохранены в {path}")
+        else:
+            messagebox.showerror("Ошибка", "Не удалось сохранить метрики", parent=self.diagnostics_window)
+
     def show_about(self):
         """Показывает информацию о программе"""
         about_text = "Служба доставки\n\nВерсия 1.0\n\nПростое приложение для отправки и отслеживания посылок,\nуправления курьерами, работы с отзывами клиентов\nи интеграцией с Яндекс.Картами"
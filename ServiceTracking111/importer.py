@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Потоковая загрузка данных партнеров в приложение "Служба доставки" из CSV и JSONL.
+
+Файл читается порциями. Разбор JSON и проверка записей (по тем же правилам,
+что и при вводе в интерфейсе: validate_package, validate_courier,
+validate_review) выполняются в пуле процессов, а записью в базу данных
+занимается один поток - основной, крупными пакетными транзакциями.
+Отклоненные записи с номером строки и причиной сохраняются в отдельный
+файл JSONL.
+"""
+
+import csv
+import gzip
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import database
+import package_service
+
+IMPORT_TABLES = ("packages", "couriers", "reviews")
+# Количество записей, передаваемых процессу проверки за один раз
+DEFAULT_CHUNK_SIZE = 2000
+# Количество записей в одной транзакции записи
+DEFAULT_BATCH_SIZE = 20000
+
+def detect_format(path):
+    """
+    Определение формата файла загрузки по имени
+
+    Returns:
+        str: "csv", "jsonl" или None
+    """
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".json", ".ndjson")):
+        return "jsonl"
+    return None
+
+def rejected_path(path):
+    """Путь к файлу отклоненных записей по умолчанию"""
+    return path + ".rejected.jsonl"
+
+def _text(value):
+    """Приведение значения поля к строке без пробелов по краям"""
+    return "" if value is None else str(value).strip()
+
+def validate_record(table, record):
+    """
+    Проверка и приведение одной записи
+
+    Args:
+        table (str): Таблица из IMPORT_TABLES
+        record (dict): Поля записи
+
+    Returns:
+        tuple: (кортеж_полей, None) для корректной записи или (None, сообщение_об_ошибке)
+    """
+    if not isinstance(record, dict):
+        return None, "Запись должна быть объектом"
+
+    if table == "packages":
+        fields = tuple(_text(record.get(name)) for name in
+                       ("description", "sender", "recipient", "sender_address", "recipient_address"))
+        error = package_service.validate_package(*fields[:3])
+    elif table == "couriers":
+        fields = tuple(_text(record.get(name)) for name in ("name", "phone", "email", "zone"))
+        error = package_service.validate_courier(*fields[:3])
+    else:
+        try:
+            rating = int(_text(record.get("rating")) or 0)
+        except ValueError:
+            return None, "Рейтинг должен быть числом от 1 до 5"
+        fields = (_text(record.get("tracking_number")), _text(record.get("customer_name")),
+                  rating, _text(record.get("comment")))
+        error = package_service.validate_review(*fields)
+    return (None, error) if error else (fields, None)
+
+def validate_chunk(table, fmt, lines):
+    """
+    Разбор и проверка порции записей (выполняется в процессе пула)
+
+    Args:
+        table (str): Таблица из IMPORT_TABLES
+        fmt (str): "csv" (записи уже разобраны в словари) или "jsonl" (строки JSON)
+        lines (list): Пары (номер_строки, запись)
+
+    Returns:
+        tuple: (корректные записи [(номер_строки, поля)],
+                отклоненные [(номер_строки, исходная_запись, сообщение)])
+    """
+    valid = []
+    rejected = []
+    for line_number, raw in lines:
+        record = raw
+        if fmt == "jsonl":
+            try:
+                record = json.loads(raw)
+            except ValueError as e:
+                rejected.append((line_number, raw, f"Некорректный JSON: {e}"))
+                continue
+        fields, error = validate_record(table, record)
+        if error:
+            rejected.append((line_number, record, error))
+        else:
+            valid.append((line_number, fields))
+    return valid, rejected
+
+def _read_chunks(path, fmt, chunk_size):
+    """Чтение файла порциями пар (номер_строки, запись)"""
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8-sig", newline="") as source:
+        if fmt == "csv":
+            reader = csv.DictReader(source)
+            records = ((reader.line_num, row) for row in reader)
+        else:
+            records = ((number, line) for number, line in enumerate(source, 1) if line.strip())
+        chunk = []
+        for item in records:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+class _Writer:
+    """Единственный писатель: накапливает корректные записи и пишет их пакетными транзакциями"""
+
+    def __init__(self, table, batch_size, reject):
+        self.table = table
+        self.batch_size = batch_size
+        self.reject = reject
+        self.pending = []
+        self.imported = 0
+
+    def add(self, rows):
+        """Добавление корректных записей [(номер_строки, поля)]"""
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленных записей в базу данных"""
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        if self.table == "packages":
+            for index, success, result in package_service.iter_send_packages_bulk(
+                    [fields for line_number, fields in batch], chunk_size=len(batch)):
+                if success:
+                    self.imported += 1
+                else:
+                    self.reject(batch[index][0], batch[index][1], result)
+            return
+
+        create = database.create_couriers_bulk if self.table == "couriers" else database.create_reviews_bulk
+        created = create([fields for line_number, fields in batch])
+        if created is None:
+            for line_number, fields in batch:
+                self.reject(line_number, fields, "Ошибка записи в базу данных")
+        else:
+            self.imported += created
+
+def import_file(table, path, fmt=None, rejected=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Загрузка записей из файла CSV или JSONL
+
+    Args:
+        table (str): Таблица из IMPORT_TABLES
+        path (str): Путь к файлу (.csv, .jsonl, возможно с .gz)
+        fmt (str): "csv" или "jsonl"; по умолчанию по имени файла
+        rejected (str): Файл отклоненных записей; по умолчанию <path>.rejected.jsonl
+        workers (int): Количество процессов проверки (0 - проверка в текущем процессе);
+            по умолчанию по числу процессоров
+        chunk_size (int): Записей в одной порции для процесса проверки
+        batch_size (int): Записей в одной транзакции записи
+        progress (callable): Функция (прочитано, загружено, отклонено) после каждой порции
+
+    Returns:
+        dict: read, imported, rejected, elapsed (с), rows_per_second и rejected_path
+            (None если отклоненных записей нет)
+
+    Raises:
+        ValueError: Неизвестные таблица или формат
+    """
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    fmt = fmt or detect_format(path)
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError("Не удалось определить формат по имени файла, укажите csv или jsonl")
+    rejected = rejected or rejected_path(path)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    stats = {"read": 0, "rejected": 0}
+    rejected_file = None
+    # Отклоненные записи прошлой загрузки этого файла больше не актуальны
+    if os.path.exists(rejected):
+        os.remove(rejected)
+
+    def reject(line_number, record, error):
+        nonlocal rejected_file
+        if rejected_file is None:
+            rejected_file = open(rejected, "w", encoding="utf-8")
+        rejected_file.write(json.dumps({"line": line_number, "error": error, "record": record},
+                                       ensure_ascii=False, default=str) + "\n")
+        stats["rejected"] += 1
+
+    writer = _Writer(table, batch_size, reject)
+
+    def consume(result, size):
+        valid, invalid = result
+        stats["read"] += size
+        for line_number, record, error in invalid:
+            reject(line_number, record, error)
+        writer.add(valid)
+        if progress is not None:
+            progress(stats["read"], writer.imported, stats["rejected"])
+
+    start = time.perf_counter()
+    try:
+        chunks = _read_chunks(path, fmt, chunk_size)
+        if workers <= 0:
+            for chunk in chunks:
+                consume(validate_chunk(table, fmt, chunk), len(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Не больше двух порций на процесс в обработке: файл не читается в память целиком
+                in_flight = deque()
+                for chunk in chunks:
+                    in_flight.append((pool.submit(validate_chunk, table, fmt, chunk), len(chunk)))
+                    if len(in_flight) >= workers * 2:
+                        future, size = in_flight.popleft()
+                        consume(future.result(), size)
+                while in_flight:
+                    future, size = in_flight.popleft()
+                    consume(future.result(), size)
+        writer.flush()
+    finally:
+        if rejected_file is not None:
+            rejected_file.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "read": stats["read"],
+        "imported": writer.imported,
+        "rejected": stats["rejected"],
+        "elapsed": elapsed,
+        "rows_per_second": stats["read"] / elapsed if elapsed > 0 else 0.0,
+        "rejected_path": rejected if rejected_file is not None else None,
+    }
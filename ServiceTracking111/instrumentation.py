@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Сбор метрик горячих путей приложения "Служба доставки".
+
+По умолчанию сбор выключен: функции модулей не обернуты, соединения с базой
+данных - обычные sqlite3.Connection, поэтому накладных расходов нет.
+enable() заменяет открытые функции модулей database и package_service (и
+ссылки на них, импортированные другими модулями приложения) обертками,
+которые считают вызовы, ошибки и гистограмму времени выполнения, а
+соединения открываются заново с классом TracedConnection, который замеряет
+время выполнения запросов и чтения результатов. Время открытия соединения,
+выполнения запросов (включая фиксацию транзакций) и чтения строк относится к
+самой внутренней инструментированной функции, из которой оно было вызвано.
+
+Ошибкой считается исключение, вышедшее из функции, а также ошибка SQLite при
+выполнении запроса, даже если функция database.py ее перехватила.
+
+Метрики доступны через registry.snapshot() (окно диагностики в интерфейсе) и
+render_prometheus() (текстовый формат Prometheus, GET /metrics сервера API).
+"""
+
+import functools
+import importlib
+import inspect
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+import database
+
+# Модули, открытые функции которых инструментируются
+INSTRUMENTED_MODULES = ("database", "package_service")
+# Служебные функции, которые не оборачиваются
+EXCLUDED_FUNCTIONS = ("database.get_connection", "database.close_connections", "database.reopen_connections")
+# Границы интервалов гистограмм времени (с)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ("connect", "execute", "fetch")
+# Имя функции для запросов, выполненных вне инструментированных функций
+UNATTRIBUTED = "(прочее)"
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_lock = threading.Lock()
+_state = threading.local()
+# Замененные атрибуты модулей: (модуль, имя, исходное значение)
+_patched = []
+# Функции (sql, parameters, elapsed, error), вызываемые после каждого запроса
+_statement_listeners = []
+enabled = False
+
+class Histogram:
+    """Гистограмма значений с фиксированными границами интервалов"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Добавление значения"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        """
+        Оценка перцентиля сверху: граница интервала, в который он попадает
+
+        Returns:
+            float: Значение или None, если значений нет
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+class _FunctionStats:
+    """Метрики одной функции"""
+
+    __slots__ = ("calls", "errors", "latency", "phases")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+        self.phases = {phase: Histogram() for phase in PHASES}
+
+class Registry:
+    """Потокобезопасное хранилище метрик по функциям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._functions = {}
+
+    def _stats(self, name):
+        stats = self._functions.get(name)
+        if stats is None:
+            stats = self._functions[name] = _FunctionStats()
+        return stats
+
+    def observe_call(self, name, elapsed, error=False):
+        """Учет завершенного вызова функции"""
+        with self._lock:
+            stats = self._stats(name)
+            stats.calls += 1
+            if error:
+                stats.errors += 1
+            stats.latency.observe(elapsed)
+
+    def observe_phase(self, name, phase, elapsed, error=False):
+        """Учет времени фазы (connect, execute, fetch) внутри функции"""
+        with self._lock:
+            stats = self._stats(name)
+            stats.phases[phase].observe(elapsed)
+            if error:
+                stats.errors += 1
+
+    def reset(self):
+        """Сброс всех метрик"""
+        with self._lock:
+            self._functions.clear()
+
+    def snapshot(self):
+        """
+        Сводка метрик, упорядоченная по суммарному времени
+
+        Returns:
+            list: Словари с ключами function, calls, errors, total_ms, avg_ms, p50_ms, p99_ms
+                и connect_ms, execute_ms, fetch_ms (суммарное время фаз)
+        """
+        with self._lock:
+            rows = []
+            for name, stats in self._functions.items():
+                latency = stats.latency
+                row = {
+                    "function": name,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "total_ms": latency.sum * 1000,
+                    "avg_ms": latency.sum * 1000 / latency.count if latency.count else None,
+                    "p50_ms": _to_ms(latency.quantile(0.5)),
+                    "p99_ms": _to_ms(latency.quantile(0.99)),
+                }
+                for phase, histogram in stats.phases.items():
+                    row[f"{phase}_ms"] = histogram.sum * 1000
+                rows.append(row)
+        rows.sort(key=lambda row: max(row["total_ms"], row["execute_ms"] + row["fetch_ms"]), reverse=True)
+        return rows
+
+    def render_prometheus(self):
+        """
+        Метрики в текстовом формате Prometheus
+
+        Returns:
+            str: Текст для ответа на запрос /metrics
+        """
+        lines = [
+            "# HELP delivery_calls_total Количество вызовов функции",
+            "# TYPE delivery_calls_total counter",
+        ]
+        with self._lock:
+            functions = sorted(self._functions.items())
+            for name, stats in functions:
+                lines.append(f'delivery_calls_total{{function="{name}"}} {stats.calls}')
+            lines += [
+                "# HELP delivery_errors_total Количество ошибок в функции (исключения и ошибки SQLite)",
+                "# TYPE delivery_errors_total counter",
+            ]
+            for name, stats in functions:
+                lines.append(f'delivery_errors_total{{function="{name}"}} {stats.errors}')
+            lines += [
+                "# HELP delivery_call_duration_seconds Время выполнения функции",
+                "# TYPE delivery_call_duration_seconds histogram",
+            ]
+            for name, stats in functions:
+                if stats.latency.count:
+                    lines += _histogram_lines("delivery_call_duration_seconds", f'function="{name}"', stats.latency)
+            lines += [
+                "# HELP delivery_db_phase_duration_seconds Время открытия соединения, выполнения запросов и чтения строк",
+                "# TYPE delivery_db_phase_duration_seconds histogram",
+            ]
+            for name, stats in functions:
+                for phase, histogram in stats.phases.items():
+                    if histogram.count:
+                        lines += _histogram_lines("delivery_db_phase_duration_seconds",
+                                                  f'function="{name}",phase="{phase}"', histogram)
+        return "\n".join(lines) + "\n"
+
+def _to_ms(value):
+    """Перевод секунд в миллисекунды с сохранением None"""
+    return None if value is None else value * 1000
+
+def _histogram_lines(metric, labels, histogram):
+    """Строки гистограммы в формате Prometheus (накопленные значения по границам)"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.9f}")
+    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+    return lines
+
+registry = Registry()
+
+def _stack():
+    """Стек инструментированных функций текущего потока"""
+    stack = getattr(_state, "stack", None)
+    if stack is None:
+        stack = _state.stack = []
+    return stack
+
+def current_function():
+    """Имя самой внутренней выполняющейся инструментированной функции текущего потока"""
+    stack = getattr(_state, "stack", None)
+    return stack[-1] if stack else UNATTRIBUTED
+
+def _observe_phase(phase, elapsed, error=False):
+    """Учет фазы для текущей функции (запросы при открытии соединения относятся к connect)"""
+    if enabled and not getattr(_state, "connecting", False):
+        registry.observe_phase(current_function(), phase, elapsed, error)
+
+def _on_execute(sql, parameters, elapsed, error):
+    """Учет выполненного запроса"""
+    _observe_phase("execute", elapsed, error is not None)
+    for listener in _statement_listeners:
+        listener(sql, parameters, elapsed, error)
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор с замером времени выполнения запросов и чтения строк"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception as e:
+            _on_execute(sql, parameters, time.perf_counter() - start, e)
+            raise
+        _on_execute(sql, parameters, time.perf_counter() - start, None)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except Exception as e:
+            _on_execute(sql, None, time.perf_counter() - start, e)
+            raise
+        _on_execute(sql, None, time.perf_counter() - start, None)
+        return self
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            _observe_phase("fetch", time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._fetch(super().fetchmany)
+        return self._fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, запросы которого выполняются через TracedCursor"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _finish(self, method, sql):
+        start = time.perf_counter()
+        try:
+            method()
+        except Exception as e:
+            _on_execute(sql, (), time.perf_counter() - start, e)
+            raise
+        _on_execute(sql, (), time.perf_counter() - start, None)
+
+    def commit(self):
+        self._finish(super().commit, "COMMIT")
+
+    def rollback(self):
+        self._finish(super().rollback, "ROLLBACK")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # sqlite3.Connection.__exit__ фиксирует транзакцию в обход commit(), поэтому то же самое здесь
+        if exc_type is None:
+            try:
+                self.commit()
+            except Exception:
+                self.rollback()
+                raise
+        else:
+            self.rollback()
+        return False
+
+def _wrap_function(name, fn):
+    """Обертка функции со счетчиком вызовов, ошибок и временем выполнения"""
+    if inspect.isgeneratorfunction(fn):
+        return _wrap_generator(name, fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = _stack()
+        stack.append(name)
+        error = False
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            registry.observe_call(name, elapsed, error)
+    return wrapper
+
+def _wrap_generator(name, fn):
+    """Обертка генератора: учитывается время получения элементов, а не время жизни генератора"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stack = _stack()
+        generator = fn(*args, **kwargs)
+        elapsed = 0.0
+        error = False
+        try:
+            while True:
+                stack.append(name)
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - start
+                    stack.pop()
+                yield item
+        finally:
+            generator.close()
+            registry.observe_call(name, elapsed, error)
+    return wrapper
+
+def _wrap_connect(fn):
+    """Обертка открытия соединения: время учитывается как фаза connect"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        _state.connecting = True
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _state.connecting = False
+            _observe_phase("connect", time.perf_counter() - start)
+    return wrapper
+
+def _app_modules():
+    """Загруженные модули приложения (из каталога этого файла)"""
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == _APP_DIR:
+            yield module
+
+def _update_connection_factory():
+    """Выбор класса соединений: с замерами, если он кому-то нужен; соединения открываются заново"""
+    factory = TracedConnection if enabled or _statement_listeners else sqlite3.Connection
+    if database.connection_factory is not factory:
+        database.connection_factory = factory
+        database.reopen_connections()
+
+def enable():
+    """Включение сбора метрик"""
+    global enabled
+    with _lock:
+        if enabled:
+            return
+        wrappers = {}
+        for module_name in INSTRUMENTED_MODULES:
+            module = importlib.import_module(module_name)
+            for name, value in vars(module).items():
+                qualified = f"{module_name}.{name}"
+                if (inspect.isfunction(value) and value.__module__ == module_name
+                        and not name.startswith("_") and qualified not in EXCLUDED_FUNCTIONS):
+                    wrappers[value] = _wrap_function(qualified, value)
+        wrappers[database._open_connection] = _wrap_connect(database._open_connection)
+
+        # Функции, импортированные через "from ... import", заменяются и в импортировавших модулях
+        for module in _app_modules():
+            for name, value in list(vars(module).items()):
+                if inspect.isfunction(value) and value in wrappers:
+                    _patched.append((module, name, value))
+                    setattr(module, name, wrappers[value])
+        enabled = True
+        _update_connection_factory()
+
+def disable():
+    """Выключение сбора метрик и восстановление исходных функций (собранные метрики сохраняются)"""
+    global enabled
+    with _lock:
+        if not enabled:
+            return
+        while _patched:
+            module, name, value = _patched.pop()
+            setattr(module, name, value)
+        enabled = False
+        _update_connection_factory()
+
+def add_statement_listener(listener):
+    """
+    Подписка на выполненные запросы (соединения открываются заново с замерами)
+
+    Args:
+        listener (callable): Функция (sql, parameters, elapsed, error); parameters - None
+            для executemany, error - исключение или None
+    """
+    with _lock:
+        _statement_listeners.append(listener)
+        _update_connection_factory()
+
+def remove_statement_listener(listener):
+    """Отмена подписки add_statement_listener"""
+    with _lock:
+        if listener in _statement_listeners:
+            _statement_listeners.remove(listener)
+        _update_connection_factory()
+
+def render_prometheus():
+    """Метрики в текстовом формате Prometheus"""
+    return registry.render_prometheus()
+
+def write_prometheus(path):
+    """
+    Сохранение метрик в файл в текстовом формате Prometheus
+
+    Returns:
+        bool: True если файл записан
+    """
+    try:
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(render_prometheus())
+        return True
+    except OSError as e:
+        print(f"Ошибка при сохранении метрик: {e}")
+        return False
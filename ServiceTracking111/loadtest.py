@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Нагрузочный тест HTTP API службы доставки (см. server.py).
+
+Клиенты держат keep-alive соединения и отправляют запросы отслеживания
+друг за другом; по окончании выводятся пропускная способность и
+перцентили задержки. Перед замером создаются тестовые посылки.
+
+Запуск (сервер лучше запускать на отдельной базе данных):
+    python main.py serve --port 8080
+    python loadtest.py --port 8080 --concurrency 32 --requests 20000
+    python loadtest.py --port 8080 --batch-size 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmark import percentile
+
+class Client:
+    """HTTP/1.1 клиент с одним keep-alive соединением"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """
+        Выполнение запроса
+
+        Returns:
+            tuple: (код_ответа, тело_ответа)
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        )
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, json.loads(data)
+
+    async def close(self):
+        """Закрытие соединения"""
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+async def create_packages(host, port, count, concurrency):
+    """Создание тестовых посылок через API, возвращает их номера"""
+    numbers = []
+
+    async def worker(indexes):
+        client = Client(host, port)
+        for index in indexes:
+            status, data = await client.request("POST", "/packages", {
+                "description": f"Нагрузочный тест {index}",
+                "sender": "Отправитель",
+                "recipient": f"Получатель {index}",
+            })
+            if status == 201:
+                numbers.append(data["result"]["tracking_number"])
+        await client.close()
+
+    await asyncio.gather(*(worker(range(i, count, concurrency)) for i in range(concurrency)))
+    return numbers
+
+async def run_load(args):
+    """Создание данных, замер и вывод результатов"""
+    numbers = await create_packages(args.host, args.port, args.packages, min(args.concurrency, 16))
+    if not numbers:
+        print("Не удалось создать тестовые посылки")
+        return 1
+    # Часть запросов - к неизвестным номерам
+    unknown = [f"ZZ-{i:07d}" for i in range(100)]
+
+    latencies = []
+    errors = 0
+    per_client = args.requests // args.concurrency
+
+    async def worker():
+        nonlocal errors
+        client = Client(args.host, args.port)
+        for _ in range(per_client):
+            if args.batch_size > 1:
+                batch = random.sample(numbers, min(args.batch_size, len(numbers)))
+                method, path, payload = "POST", "/track", {"tracking_numbers": batch}
+            else:
+                number = random.choice(unknown) if random.random() < args.unknown_share else random.choice(numbers)
+                method, path, payload = "GET", f"/track/{number}", None
+            start = time.perf_counter()
+            try:
+                status, data = await client.request(method, path, payload)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                await client.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status not in (200, 404):
+                errors += 1
+        await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    kind = f"пакеты по {args.batch_size}" if args.batch_size > 1 else "по одному номеру"
+    print(f"Отслеживание ({kind}): {len(latencies)} запросов за {elapsed:.2f} с, "
+          f"{len(latencies) / elapsed:.0f} запр/с, ошибок: {errors}")
+    if latencies:
+        print(f"p50 {percentile(latencies, 0.5) * 1000:.2f} мс, p90 {percentile(latencies, 0.9) * 1000:.2f} мс, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f} мс, max {latencies[-1] * 1000:.2f} мс")
+    return 0
+
+def main():
+    """Разбор аргументов командной строки и запуск теста"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API службы доставки")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес сервера")
+    parser.add_argument("--port", type=int, default=8080, help="Порт сервера")
+    parser.add_argument("--concurrency", type=int, default=32, help="Количество одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=20000, help="Общее количество запросов")
+    parser.add_argument("--packages", type=int, default=1000, help="Сколько тестовых посылок создать")
+    parser.add_argument("--batch-size", type=int, default=1, help="Номеров в одном запросе (1 - GET /track/<номер>)")
+    parser.add_argument("--unknown-share", type=float, default=0.05, help="Доля запросов к неизвестным номерам")
+    args = parser.parse_args()
+    return asyncio.run(run_load(args))
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,22 +3,293 @@
 
 """
 Главный исполняемый файл приложения "Служба доставки".
-Запускает основной интерфейс приложения.
+Запускает основной интерфейс приложения или служебные команды.
+
+Запуск:
+    python main.py                  - графический интерфейс
+    python main.py audit-queries    - проверка планов выполнения запросов
+    python main.py serve            - HTTP API без графического интерфейса
+    python main.py serve --group-commit  - с групповой фиксацией записей из рабочих потоков
+    python main.py export packages packages.csv.gz --from 2025-01-01 --status Доставлена
+    python main.py import couriers couriers.csv
+    python main.py dispatch --policy zone         - распределение новых посылок между курьерами
+    python main.py geocode --gazetteer addresses.csv  - координаты адресов посылок по справочнику
+    python main.py route 12 --time-budget 1        - маршрут объезда посылок курьера
+    python main.py archive --older-than 180        - перенос завершенных посылок в архив
+    python main.py --instrument serve              - со сбором метрик (GET /metrics)
+    python main.py --metrics-file metrics.txt import packages packages.jsonl
+    python main.py --profile-sql --slow-ms 20 --profile-log slow.log serve  - журнал медленных запросов
 """
 
-import tkinter as tk
-from database import initialize_db
-from gui import DeliveryServiceApp
+import argparse
+import sys
+import time
+import database
+import dispatcher
+import geocoder
+import importer
+import instrumentation
+import package_service
+import profiler
+import routing
+import server
+import write_queue
+from database import initialize_db, close_connections
 
-def main():
-    """Основная функция запуска приложения"""
-    # Инициализация базы данных
-    initialize_db()
+def run_gui(args):
+    """Запуск графического интерфейса"""
+    import tkinter as tk
+    from gui import DeliveryServiceApp
     
     # Создание и запуск GUI приложения
     root = tk.Tk()
     app = DeliveryServiceApp(root)
     root.mainloop()
+    app.close()
+    return 0
+
+def run_audit_queries(args):
+    """Проверка, что запросы приложения не выполняются полным просмотром таблиц"""
+    for name, (sql, params) in database.AUDITED_QUERIES.items():
+        print(f"{name}:")
+        for detail in database.explain_query_plan(sql, params):
+            marker = "!!" if database.is_full_scan(detail) else "  "
+            print(f"  {marker} {detail}")
+    
+    offenders = database.audit_query_plans()
+    if offenders:
+        print(f"\nПолный просмотр таблицы или сортировка в запросах: {', '.join(offenders)}")
+        return 1
+    print("\nВсе запросы используют индексы")
+    return 0
+
+def run_serve(args):
+    """Запуск HTTP API без графического интерфейса"""
+    if args.group_commit:
+        package_service.enable_write_queue(args.max_batch, args.max_delay)
+    try:
+        server.run_server(args.host, args.port, args.workers)
+    finally:
+        package_service.disable_write_queue()
+    return 0
+
+def run_export(args):
+    """Потоковая выгрузка таблицы в CSV или JSONL"""
+    def progress(rows):
+        print(f"\rВыгружено строк: {rows}", end="", flush=True)
+    
+    success, result = package_service.export_data(
+        args.table, args.output, date_from=args.date_from, date_to=args.date_to, status=args.status,
+        fmt=args.format, compress=True if args.gzip else None, resume=not args.restart, progress=progress
+    )
+    print()
+    if not success:
+        print(f"Ошибка: {result}")
+        return 1
+    resumed = " (продолжение прерванной выгрузки)" if result["resumed"] else ""
+    print(f"Выгружено строк: {result['rows']} в {args.output}{resumed}")
+    return 0
+
+def run_import(args):
+    """Загрузка данных из CSV или JSONL"""
+    def progress(read, imported, rejected):
+        print(f"\rПрочитано: {read}, загружено: {imported}, отклонено: {rejected}", end="", flush=True)
+    
+    success, result = package_service.import_data(
+        args.table, args.input, fmt=args.format, rejected=args.rejected, workers=args.workers, progress=progress
+    )
+    print()
+    if not success:
+        print(f"Ошибка: {result}")
+        return 1
+    print(f"Загружено: {result['imported']} из {result['read']} за {result['elapsed']:.2f} с "
+          f"({result['rows_per_second']:.0f} строк/с)")
+    if result["rejected"]:
+        print(f"Отклонено: {result['rejected']}, подробности в {result['rejected_path']}")
+        return 2
+    return 0
+
+def run_dispatch(args):
+    """Распределение всех новых посылок без курьера порциями"""
+    assigned = 0
+    while True:
+        success, result = package_service.dispatch_packages(args.policy, args.batch_size)
+        if not success:
+            print(f"Ошибка: {result}")
+            return 1
+        assigned += result["assigned"]
+        print(f"\rРаспределено посылок: {assigned}", end="", flush=True)
+        if result["pending"] < args.batch_size:
+            break
+    print(f"\nРаспределено посылок: {assigned} между {result['couriers']} курьерами")
+    return 0
+
+def run_geocode(args):
+    """Геокодирование адресов всех посылок по локальному справочнику"""
+    success, message = package_service.load_gazetteer(args.gazetteer)
+    print(message)
+    if not success:
+        return 1
+    if args.retry_missing:
+        database.clear_geocodes(missing_only=True)
+    
+    def progress(packages, stats):
+        print(f"\rОбработано посылок: {packages}, новых адресов: {stats['geocoded']}", end="", flush=True)
+    
+    success, result = package_service.geocode_packages(args.batch_size, progress)
+    print()
+    if not success:
+        print(f"Ошибка: {result}")
+        return 1
+    print(f"Адресов в посылках: {result['addresses']}, с координатами: {result['resolved']}; "
+          f"геокодировано впервые: {result['geocoded']}, из кэша: {result['cached']}")
+    return 0
+
+def run_route(args):
+    """Вывод маршрута объезда посылок курьера"""
+    success, result = package_service.plan_courier_route(args.courier_id, args.time_budget, args.return_to_start)
+    if not success:
+        print(f"Ошибка: {result}")
+        return 1
+    for number, stop in enumerate(result["stops"], 1):
+        print(f"{number:>4}. {stop['tracking_number']} +{stop['leg_km']:.1f} км  {stop['recipient_address']}")
+    for package in result["unlocated"]:
+        print(f"  без координат: {package['tracking_number']}  {package['recipient_address']}")
+    print(f"Остановок: {len(result['stops'])}, маршрут {result['total_km']:.1f} км "
+          f"(в порядке назначения {result['naive_km']:.1f} км)")
+    return 0
+
+def run_archive(args):
+    """Перенос завершенных посылок в архив порциями"""
+    archived = 0
+    batches = 0
+    while True:
+        success, result = package_service.archive_packages(args.older_than, args.batch_size)
+        if not success:
+            print(f"Ошибка: {result}")
+            return 1
+        archived += result["archived"]
+        batches += 1
+        print(f"\rПеренесено в архив: {archived}", end="", flush=True)
+        if result["archived"] < args.batch_size or batches == args.max_batches:
+            break
+        if args.pause:
+            time.sleep(args.pause)
+    print(f"\nПеренесено в архив: {archived}")
+    for partition, count in package_service.get_archive_stats():
+        print(f"  {database.archive_table(partition)}: {count}")
+    return 0
+
+def build_parser():
+    """Создание разборщика аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Служба доставки")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Собирать метрики вызовов (окно диагностики, GET /metrics)")
+    parser.add_argument("--metrics-file", help="Сохранить метрики в формате Prometheus при завершении")
+    parser.add_argument("--profile-sql", action="store_true",
+                        help="Профилировать запросы SQL: журнал медленных запросов и отчет при завершении")
+    parser.add_argument("--slow-ms", type=float, default=profiler.SLOW_QUERY_MS, metavar="МС",
+                        help=f"Порог медленного запроса для --profile-sql (по умолчанию {profiler.SLOW_QUERY_MS} мс)")
+    parser.add_argument("--profile-log", help="Файл журнала медленных запросов (по умолчанию вывод на экран)")
+    parser.set_defaults(func=run_gui)
+    subparsers = parser.add_subparsers(dest="command")
+    
+    audit = subparsers.add_parser("audit-queries", help="Проверка планов выполнения запросов")
+    audit.set_defaults(func=run_audit_queries)
+    
+    serve = subparsers.add_parser("serve", help="HTTP API без графического интерфейса")
+    serve.add_argument("--host", default=server.DEFAULT_HOST, help="Адрес для прослушивания")
+    serve.add_argument("--port", type=int, default=server.DEFAULT_PORT, help="Порт")
+    serve.add_argument("--workers", type=int, default=server.DEFAULT_WORKERS,
+                       help="Количество потоков для обращений к базе данных")
+    serve.add_argument("--group-commit", action="store_true",
+                       help="Фиксировать записи рабочих потоков группами через очередь записи")
+    serve.add_argument("--max-batch", type=int, default=write_queue.DEFAULT_MAX_BATCH,
+                       help="Наибольшее количество записей в одной транзакции")
+    serve.add_argument("--max-delay", type=float, default=write_queue.DEFAULT_MAX_DELAY_MS, metavar="МС",
+                       help="Сколько ждать следующих записей после первой в группе (мс)")
+    serve.set_defaults(func=run_serve)
+    
+    export = subparsers.add_parser("export", help="Выгрузка таблицы в CSV или JSONL")
+    export.add_argument("table", choices=sorted(database.EXPORT_TABLES), help="Выгружаемая таблица")
+    export.add_argument("output", help="Файл выгрузки (.csv, .jsonl; .gz - со сжатием)")
+    export.add_argument("--format", choices=("csv", "jsonl"), help="Формат (по умолчанию по расширению файла)")
+    export.add_argument("--gzip", action="store_true", help="Сжимать gzip независимо от расширения")
+    export.add_argument("--from", dest="date_from", help="Первый день периода (ГГГГ-ММ-ДД)")
+    export.add_argument("--to", dest="date_to", help="Последний день периода (ГГГГ-ММ-ДД)")
+    export.add_argument("--status", help="Только строки с этим статусом")
+    export.add_argument("--restart", action="store_true", help="Начать заново, не продолжая прерванную выгрузку")
+    export.set_defaults(func=run_export)
+    
+    load = subparsers.add_parser("import", help="Загрузка данных из CSV или JSONL")
+    load.add_argument("table", choices=importer.IMPORT_TABLES, help="Таблица для загрузки")
+    load.add_argument("input", help="Файл с данными (.csv, .jsonl; возможно .gz)")
+    load.add_argument("--format", choices=("csv", "jsonl"), help="Формат (по умолчанию по расширению файла)")
+    load.add_argument("--rejected", help="Файл для отклоненных записей (по умолчанию <файл>.rejected.jsonl)")
+    load.add_argument("--workers", type=int, help="Количество процессов проверки (0 - без пула процессов)")
+    load.set_defaults(func=run_import)
+    
+    dispatch = subparsers.add_parser("dispatch", help="Распределение новых посылок между курьерами")
+    dispatch.add_argument("--policy", choices=sorted(dispatcher.POLICIES), default=dispatcher.DEFAULT_POLICY,
+                          help="Политика: наименее загруженный курьер или курьер зоны посылки")
+    dispatch.add_argument("--batch-size", type=int, default=package_service.DISPATCH_BATCH_SIZE,
+                          help="Посылок в одной транзакции")
+    dispatch.set_defaults(func=run_dispatch)
+    
+    geocode = subparsers.add_parser("geocode", help="Координаты адресов посылок по локальному справочнику")
+    geocode.add_argument("--gazetteer", default=geocoder.GAZETTEER_PATH,
+                         help="Справочник адресов CSV: city, street, lat, lon")
+    geocode.add_argument("--batch-size", type=int, default=geocoder.DEFAULT_BATCH_SIZE,
+                         help="Посылок, обрабатываемых за один раз")
+    geocode.add_argument("--retry-missing", action="store_true",
+                         help="Повторить адреса, не найденные в прошлый раз (после замены справочника)")
+    geocode.set_defaults(func=run_geocode)
+    
+    route = subparsers.add_parser("route", help="Маршрут объезда незавершенных посылок курьера")
+    route.add_argument("courier_id", type=int, help="ID курьера")
+    route.add_argument("--time-budget", type=float, default=routing.DEFAULT_TIME_BUDGET, metavar="С",
+                       help="Время на улучшение маршрута (с)")
+    route.add_argument("--return", dest="return_to_start", action="store_true",
+                       help="Вернуться в начальную точку")
+    route.set_defaults(func=run_route)
+    
+    archive = subparsers.add_parser("archive", help="Перенос посылок в конечном статусе в помесячный архив")
+    archive.add_argument("--older-than", type=int, default=package_service.ARCHIVE_AFTER_DAYS, metavar="ДНЕЙ",
+                         help="Сколько дней посылка должна пробыть в конечном статусе")
+    archive.add_argument("--batch-size", type=int, default=package_service.ARCHIVE_BATCH_SIZE,
+                         help="Посылок в одной транзакции")
+    archive.add_argument("--max-batches", type=int, help="Остановиться после стольких порций")
+    archive.add_argument("--pause", type=float, default=0.0, metavar="С",
+                         help="Пауза между порциями, чтобы не мешать другим писателям (с)")
+    archive.set_defaults(func=run_archive)
+    
+    return parser
+
+def main():
+    """Основная функция запуска приложения"""
+    args = build_parser().parse_args()
+    
+    if args.instrument or args.metrics_file:
+        instrumentation.enable()
+    if args.profile_sql:
+        profiler.enable(args.slow_ms, args.profile_log)
+    
+    # Инициализация базы данных
+    initialize_db()
+    
+    try:
+        return args.func(args)
+    finally:
+        if args.metrics_file:
+            instrumentation.write_prometheus(args.metrics_file)
+        sql_profile = profiler.disable()
+        if sql_profile is not None:
+            report = sql_profile.report()
+            print(report)
+            if args.profile_log:
+                sql_profile.write(report)
+        # Закрытие соединений с базой данных
+        close_connections()
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
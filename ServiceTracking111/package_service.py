@@ -6,22 +6,124 @@
 Содержит бизнес-логику для работы с посылками.
 """
 
-import random
-import string
-from database import (create_package, get_package_by_tracking, update_package_status,
+from datetime import date, datetime, timedelta
+from itertools import islice
+import dispatcher
+import exporter
+import geocoder
+import importer
+import routing
+import spatial
+import tracking_numbers
+import write_queue
+from database import (create_package, create_packages_bulk, get_package_by_tracking, get_packages_by_tracking,
+                     update_package_status,
                      create_courier, get_all_couriers, delete_courier,
-                     create_review, get_all_reviews)
+                     assign_pending_packages, get_courier_packages as get_courier_packages_db,
+                     get_packages_in_box, get_couriers_in_box, set_courier_location,
+                     get_courier_location, get_courier_route_stops,
+                     archive_packages as archive_packages_db, get_archive_partitions,
+                     create_review, get_all_reviews, get_reviews_by_tracking,
+                     get_packages_page, get_reviews_page, get_couriers_page, count_rows,
+                     iter_packages, iter_reviews, page_key,
+                     configure_package_cache, get_package_cache_stats, get_package_events,
+                     update_package_statuses_bulk, search_packages as search_packages_db, SCAN_STATUSES,
+                     get_rating_aggregate, RATING_SCOPE_ALL, RATING_SCOPE_DAY, RATING_SCOPE_PARCEL)
+
+# Количество посылок в одной транзакции пакетного приема
+BULK_CHUNK_SIZE = 1000
+# Сколько раз пытаться подобрать свободный номер отслеживания для одной посылки
+MAX_TRACKING_ATTEMPTS = 3
+# Максимальное количество результатов поиска посылок
+SEARCH_LIMIT = 50
+# Максимальное количество номеров в одном запросе отслеживания нескольких посылок
+MAX_TRACK_BATCH = 500
+# Количество посылок, распределяемых между курьерами за один вызов
+DISPATCH_BATCH_SIZE = 5000
+# Наибольший радиус поиска посылок рядом с точкой (км) и количество найденных посылок
+MAX_NEARBY_RADIUS_KM = 100
+NEARBY_LIMIT = 200
+# Через сколько дней после завершения посылка переносится в архив и сколько посылок за вызов
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 1000
+
+# Очередь записи с групповой фиксацией (None - каждая запись в своей транзакции)
+_write_queue = None
 
 def generate_tracking_number():
     """
     Генерация уникального номера отслеживания посылки
     
+    Номера выдаются из зарезервированного в БД блока (см. tracking_numbers),
+    поэтому не повторяются и не требуют обращения к БД на каждый номер.
+    
+    Returns:
+        str: Номер отслеживания в формате XX-9999999 или None в случае ошибки
+    """
+    return tracking_numbers.get_generator().next()
+
+def validate_package(description, sender, recipient):
+    """
+    Проверка обязательных полей посылки
+    
+    Args:
+        description (str): Описание посылки
+        sender (str): Отправитель
+        recipient (str): Получатель
+        
+    Returns:
+        str: Сообщение об ошибке или None если данные корректны
+    """
+    if not description or not sender or not recipient:
+        return "Заполните все обязательные поля"
+    return None
+
+def enable_write_queue(max_batch=write_queue.DEFAULT_MAX_BATCH, max_delay_ms=write_queue.DEFAULT_MAX_DELAY_MS):
+    """
+    Включение групповой фиксации для приема посылок, смены статусов и отзывов
+    
+    Записи из разных потоков (например, рабочих потоков сервера API)
+    выполняются одним потоком записи и фиксируются группами.
+    
+    Args:
+        max_batch (int): Наибольшее количество операций в одной транзакции
+        max_delay_ms (float): Сколько ждать следующих операций после первой (мс)
+        
     Returns:
-        str: Номер отслеживания в формате XX-999999
+        WriteQueue: Включенная очередь записи
     """
-    letters = ''.join(random.choices(string.ascii_uppercase, k=2))
-    numbers = ''.join(random.choices(string.digits, k=6))
-    return f"{letters}-{numbers}"
+    global _write_queue
+    disable_write_queue()
+    _write_queue = write_queue.WriteQueue(max_batch, max_delay_ms)
+    return _write_queue
+
+def disable_write_queue():
+    """Выполнение операций, оставшихся в очереди записи, и ее выключение"""
+    global _write_queue
+    queue, _write_queue = _write_queue, None
+    if queue is not None:
+        queue.close()
+
+def _write(direct, queued, *args):
+    """
+    Выполнение записи через очередь с групповой фиксацией, если она включена
+    
+    Args:
+        direct (callable): Функция database, выполняющая запись в своей транзакции
+        queued (callable): Соответствующий метод WriteQueue
+        *args: Аргументы записи
+        
+    Returns:
+        Результат записи (True или False)
+    """
+    queue = _write_queue
+    if queue is not None:
+        try:
+            return queued(queue, *args).result()
+        except RuntimeError:
+            # Очередь закрыли между проверкой и постановкой операции
+            pass
+    return direct(*args)
 
 def send_package(description, sender, recipient, sender_address="", recipient_address=""):
     """
@@ -37,21 +139,137 @@ def send_package(description, sender, recipient, sender_address="", recipient_ad
     Returns:
         tuple: (успех, номер_отслеживания/сообщение_об_ошибке)
     """
-    if not description or not sender or not recipient:
-        return False, "Заполните все обязательные поля"
+    error = validate_package(description, sender, recipient)
+    if error:
+        return False, error
     
     # Генерация уникального номера отслеживания
     tracking_number = generate_tracking_number()
+    if tracking_number is None:
+        return False, "Ошибка при создании номера отслеживания"
     
     # Попытка создать посылку в БД
-    success = create_package(tracking_number, description, sender, recipient, sender_address, recipient_address)
+    success = _write(create_package, write_queue.WriteQueue.create_package,
+                     tracking_number, description, sender, recipient, sender_address, recipient_address)
     
     if success:
         return True, tracking_number
     else:
-        # Редкий случай коллизии номера отслеживания
+        # Номер мог быть занят посылкой, добавленной в обход генератора
         return False, "Ошибка при создании посылки. Пожалуйста, попробуйте еще раз."
 
+def _package_fields(item):
+    """
+    Приведение записи манифеста к кортежу полей посылки
+    
+    Args:
+        item (dict | tuple | list): Словарь с ключами description, sender, recipient,
+            sender_address, recipient_address или кортеж (список) в порядке аргументов send_package
+        
+    Returns:
+        tuple: (description, sender, recipient, sender_address, recipient_address)
+        
+    Raises:
+        ValueError: Если запись другого типа или в кортеже меньше трех полей
+    """
+    if isinstance(item, dict):
+        return (item.get("description"), item.get("sender"), item.get("recipient"),
+                item.get("sender_address") or "", item.get("recipient_address") or "")
+    # Строка тоже распаковывается по символам, поэтому принимаются только кортежи и списки
+    if not isinstance(item, (tuple, list)) or len(item) < 3:
+        raise ValueError("Некорректный формат записи")
+    description, sender, recipient, *addresses = item
+    addresses = list(addresses) + ["", ""]
+    return description, sender, recipient, addresses[0] or "", addresses[1] or ""
+
+def iter_send_packages_bulk(packages, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Пакетная отправка посылок с потоковой обработкой манифеста
+    
+    Входные данные читаются порциями по chunk_size, каждая порция
+    записывается одной транзакцией, поэтому расход памяти не зависит
+    от размера манифеста. Номера с коллизиями перегенерируются.
+    
+    Args:
+        packages (iterable): Записи посылок (см. _package_fields)
+        chunk_size (int): Количество посылок в одной транзакции
+        
+    Yields:
+        tuple: (индекс_записи, успех, номер_отслеживания/сообщение_об_ошибке)
+    """
+    records = enumerate(packages)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        
+        pending = {}
+        for index, item in chunk:
+            try:
+                fields = _package_fields(item)
+            except (TypeError, ValueError):
+                yield index, False, "Некорректный формат записи"
+                continue
+            error = validate_package(*fields[:3])
+            if error:
+                yield index, False, error
+                continue
+            pending[index] = fields
+        
+        for attempt in range(MAX_TRACKING_ATTEMPTS):
+            if not pending:
+                break
+            generated = tracking_numbers.get_generator().take(len(pending))
+            if generated is None:
+                break
+            numbers = dict(zip(pending, generated))
+            rows = [(numbers[index],) + fields for index, fields in pending.items()]
+            
+            result = create_packages_bulk(rows)
+            if result is None:
+                for index in pending:
+                    yield index, False, "Ошибка при создании посылки"
+                pending = {}
+                break
+            
+            duplicates = set(result[1])
+            retry = {}
+            for position, (index, fields) in enumerate(pending.items()):
+                if position in duplicates:
+                    retry[index] = fields
+                else:
+                    yield index, True, numbers[index]
+            pending = retry
+        
+        for index in pending:
+            yield index, False, "Не удалось подобрать свободный номер отслеживания"
+
+def send_packages_bulk(packages, chunk_size=BULK_CHUNK_SIZE, on_created=None):
+    """
+    Пакетная отправка посылок (например, ночного манифеста)
+    
+    Args:
+        packages (iterable): Записи посылок (словари или кортежи)
+        chunk_size (int): Количество посылок в одной транзакции
+        on_created (callable): Необязательный обработчик (индекс, номер_отслеживания)
+            для каждой созданной посылки
+        
+    Returns:
+        tuple: (успех, отчет) где отчет - словарь с ключами
+            created (количество созданных) и failed (список пар индекс, сообщение)
+    """
+    created = 0
+    failed = []
+    for index, success, result in iter_send_packages_bulk(packages, chunk_size):
+        if success:
+            created += 1
+            if on_created:
+                on_created(index, result)
+        else:
+            failed.append((index, result))
+    
+    return not failed, {"created": created, "failed": failed}
+
 def track_package(tracking_number):
     """
     Отслеживание посылки по номеру
@@ -72,6 +290,190 @@ def track_package(tracking_number):
     else:
         return False, "Посылка с таким номером не найдена"
 
+def parse_tracking_numbers(text):
+    """
+    Разбор списка номеров отслеживания, вставленного пользователем
+    
+    Номера могут разделяться пробелами, запятыми, точками с запятой или
+    переводами строк; повторы удаляются с сохранением порядка.
+    
+    Args:
+        text (str): Текст со списком номеров
+        
+    Returns:
+        list: Номера отслеживания в верхнем регистре
+    """
+    numbers = text.replace(",", " ").replace(";", " ").split()
+    return list(dict.fromkeys(number.upper() for number in numbers))
+
+def track_packages(tracking_numbers):
+    """
+    Отслеживание нескольких посылок одним обращением к базе данных
+    
+    Args:
+        tracking_numbers (list): Номера отслеживания (не более MAX_TRACK_BATCH)
+        
+    Returns:
+        tuple: (успех, результаты/сообщение_об_ошибке), где результаты - словарь
+            {номер: информация_о_посылке или None для неизвестного номера}
+            в порядке переданных номеров
+    """
+    numbers = list(dict.fromkeys(number.strip() for number in tracking_numbers if number and number.strip()))
+    if not numbers:
+        return False, "Введите номера отслеживания"
+    if len(numbers) > MAX_TRACK_BATCH:
+        return False, f"Не более {MAX_TRACK_BATCH} номеров за один запрос"
+    
+    packages = get_packages_by_tracking(numbers)
+    
+    if packages is None:
+        return False, "Ошибка при получении данных посылок"
+    return True, packages
+
+def search_packages(query, limit=SEARCH_LIMIT):
+    """
+    Поиск посылок по описанию, отправителю, получателю и адресам
+    
+    Слова запроса ищутся по началу слова, результаты упорядочены по
+    релевантности. Если запрос - номер отслеживания, найденная по нему
+    посылка идет первой.
+    
+    Args:
+        query (str): Поисковый запрос
+        limit (int): Максимальное количество результатов
+        
+    Returns:
+        tuple: (успех, список_посылок/сообщение_об_ошибке)
+    """
+    query = (query or "").strip()
+    if not query:
+        return False, "Введите запрос для поиска"
+    
+    results = []
+    exact = get_package_by_tracking(query.upper())
+    if exact:
+        results.append(exact)
+    results.extend(package for package in search_packages_db(query, limit)
+                   if not exact or package["id"] != exact["id"])
+    
+    if results:
+        return True, results[:limit]
+    else:
+        return False, "Посылки по запросу не найдены"
+
+def _parse_scan_time(ts):
+    """
+    Приведение времени сканирования к формату, в котором хранятся метки времени
+    
+    Время с часовым поясом переводится в локальное и хранится без пояса, как и
+    остальные метки в базе, чтобы строки сравнивались в хронологическом порядке.
+    
+    Args:
+        ts (datetime | str | None): Время сканирования; None - текущее время
+        
+    Returns:
+        str: Локальное время сканирования в формате "%Y-%m-%d %H:%M:%S.%f"
+    """
+    if ts is None:
+        ts = datetime.now()
+    elif not isinstance(ts, datetime):
+        ts = datetime.fromisoformat(str(ts).strip())
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def update_statuses_bulk(scans):
+    """
+    Пакетное обновление статусов посылок по данным сканеров курьеров
+    
+    Все сканирования применяются одной транзакцией. Сканирования, пришедшие
+    не по порядку, записываются в историю, но не откатывают статус к более
+    раннему; посылку в конечном статусе сканирование не меняет. Время
+    сканирования приводится к локальному времени без часового пояса;
+    сканирования раньше создания посылки пропускаются.
+    
+    Args:
+        scans (iterable): Кортежи (tracking_number, status, ts), где ts - datetime,
+            строка в формате ISO 8601 или None (текущее время)
+        
+    Returns:
+        tuple: (успех, отчет/сообщение_об_ошибке), где отчет - словарь с ключами
+            applied (сколько посылок сменили статус), recorded (сколько событий
+            записано в историю), unknown (неизвестные номера), before_created
+            (номера, сканирования которых раньше создания посылки) и invalid
+            (список пар индекс, сообщение для некорректных записей)
+    """
+    valid = []
+    invalid = []
+    for index, scan in enumerate(scans):
+        try:
+            tracking_number, status, ts = scan
+            ts = _parse_scan_time(ts)
+        except (TypeError, ValueError):
+            invalid.append((index, "Некорректный формат записи сканирования"))
+            continue
+        if not tracking_number:
+            invalid.append((index, "Не указан номер отслеживания"))
+        elif status not in SCAN_STATUSES:
+            invalid.append((index, f"Недопустимый статус: {status}"))
+        else:
+            valid.append((tracking_number, status, ts))
+    
+    result = {"applied": 0, "recorded": 0, "unknown": [], "before_created": []}
+    if valid:
+        result = update_package_statuses_bulk(valid)
+        if result is None:
+            return False, "Ошибка при обновлении статусов посылок"
+    
+    result["invalid"] = invalid
+    return not invalid and not result["unknown"] and not result["before_created"], result
+
+def get_package_timeline(tracking_number):
+    """
+    Получение истории статусов посылки
+    
+    Args:
+        tracking_number (str): Номер отслеживания
+        
+    Returns:
+        tuple: (успех, список_событий/сообщение_об_ошибке), где событие - словарь
+            с ключами status и ts в хронологическом порядке
+    """
+    if not tracking_number:
+        return False, "Введите номер отслеживания"
+    
+    events = get_package_events(tracking_number)
+    
+    if events:
+        return True, events
+    else:
+        return False, "История статусов посылки не найдена"
+
+def get_tracking_cache_stats():
+    """
+    Статистика кэша отслеживания посылок
+    
+    Returns:
+        dict: Размер кэша и счетчики попаданий (hits), промахов (misses) и вытеснений (evictions)
+    """
+    return get_package_cache_stats()
+
+def configure_tracking_cache(size=None, ttl=None, negative_ttl=None):
+    """
+    Настройка кэша отслеживания посылок
+    
+    Args:
+        size (int): Максимальное количество посылок в кэше (0 - кэш отключен)
+        ttl (float): Время жизни записи в секундах
+        negative_ttl (float): Время жизни записи "посылка не найдена" в секундах
+    """
+    kwargs = {}
+    if ttl is not None:
+        kwargs["ttl"] = ttl
+    if negative_ttl is not None:
+        kwargs["negative_ttl"] = negative_ttl
+    configure_package_cache(size, **kwargs)
+
 def update_status(tracking_number, new_status):
     """
     Обновление статуса посылки
@@ -83,10 +485,26 @@ def update_status(tracking_number, new_status):
     Returns:
         bool: True если статус успешно обновлен
     """
-    return update_package_status(tracking_number, new_status)
+    return _write(update_package_status, write_queue.WriteQueue.update_package_status, tracking_number, new_status)
 
 # Функции для работы с курьерами
-def add_courier(name, phone, email):
+def validate_courier(name, phone, email):
+    """
+    Проверка полей курьера
+    
+    Args:
+        name (str): Имя курьера
+        phone (str): Телефон курьера
+        email (str): Email курьера
+        
+    Returns:
+        str: Сообщение об ошибке или None если данные корректны
+    """
+    if not name:
+        return "Имя курьера обязательно для заполнения"
+    return None
+
+def add_courier(name, phone, email, zone=""):
     """
     Добавление нового курьера
     
@@ -94,14 +512,16 @@ def add_courier(name, phone, email):
         name (str): Имя курьера
         phone (str): Телефон курьера
         email (str): Email курьера
+        zone (str): Зона доставки (город) для распределения по зонам
         
     Returns:
         tuple: (успех, сообщение)
     """
-    if not name:
-        return False, "Имя курьера обязательно для заполнения"
+    error = validate_courier(name, phone, email)
+    if error:
+        return False, error
     
-    success = create_courier(name, phone, email)
+    success = create_courier(name, phone, email, zone)
     
     if success:
         return True, "Курьер успешно добавлен"
@@ -134,7 +554,324 @@ def remove_courier(courier_id):
     else:
         return False, "Ошибка при удалении курьера или курьер не найден"
 
+def dispatch_packages(policy=dispatcher.DEFAULT_POLICY, limit=DISPATCH_BATCH_SIZE):
+    """
+    Распределение новых посылок без курьера между активными курьерами
+    
+    Args:
+        policy (str): Политика из dispatcher.POLICIES: "least-loaded" - наименее
+            загруженному курьеру, "zone" - наименее загруженному курьеру зоны посылки
+        limit (int): Сколько посылок распределить за один вызов
+        
+    Returns:
+        tuple: (успех, результат/сообщение_об_ошибке), где результат - словарь
+            pending, assigned и couriers (см. database.assign_pending_packages)
+    """
+    plan = dispatcher.POLICIES.get(policy)
+    if plan is None:
+        return False, f"Неизвестная политика распределения: {policy}"
+    
+    result = assign_pending_packages(plan, limit)
+    
+    if result is None:
+        return False, "Ошибка при распределении посылок"
+    if not result["couriers"]:
+        return False, "Нет активных курьеров"
+    return True, result
+
+def get_courier_packages(courier_id, limit=100):
+    """
+    Получение незавершенных посылок курьера
+    
+    Args:
+        courier_id (int): ID курьера
+        limit (int): Максимальное количество посылок
+        
+    Returns:
+        list: Список посылок
+    """
+    return get_courier_packages_db(courier_id, limit)
+
+# Функции для работы с координатами адресов
+def load_gazetteer(path=geocoder.GAZETTEER_PATH):
+    """
+    Загрузка справочника адресов для геокодирования
+    
+    Args:
+        path (str): Файл CSV со столбцами city, street, lat, lon
+        
+    Returns:
+        tuple: (успех, сообщение)
+    """
+    index = geocoder.load_gazetteer(path)
+    if index is None:
+        return False, "Ошибка при загрузке справочника адресов"
+    message = f"Загружено городов: {index.cities}, улиц: {index.streets}"
+    if index.skipped:
+        message += f", пропущено некорректных строк: {index.skipped}"
+    return True, message
+
+def geocode_address(address):
+    """
+    Координаты адреса по локальному справочнику
+    
+    Args:
+        address (str): Адрес
+        
+    Returns:
+        tuple: (успех, (широта, долгота, точность)/сообщение_об_ошибке),
+            точность - "street" (найдена улица) или "city" (только город)
+    """
+    if not address or not address.strip():
+        return False, "Введите адрес"
+    if geocoder.get_index() is None:
+        return False, "Справочник адресов не загружен"
+    
+    result = geocoder.geocode_address(address)
+    
+    if result is None:
+        return False, "Адрес не найден в справочнике"
+    return True, result
+
+def geocode_packages(batch_size=geocoder.DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Геокодирование адресов всех посылок с сохранением координат в кэш
+    
+    Args:
+        batch_size (int): Количество посылок, обрабатываемых за один раз
+        progress (callable): Функция (посылок_обработано, статистика) после каждой порции
+        
+    Returns:
+        tuple: (успех, статистика/сообщение_об_ошибке), статистика - см. geocoder.geocode_packages
+    """
+    if geocoder.get_index() is None:
+        return False, "Справочник адресов не загружен"
+    
+    result = geocoder.geocode_packages(batch_size, progress)
+    
+    if result is None:
+        return False, "Ошибка при геокодировании адресов посылок"
+    return True, result
+
+def validate_point(lat, lon):
+    """
+    Проверка координат точки
+    
+    Returns:
+        str: Сообщение об ошибке или None если координаты корректны
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return "Координаты должны быть числами"
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return "Широта должна быть от -90 до 90, долгота - от -180 до 180"
+    return None
+
+def packages_within(lat, lon, radius_km, active_only=True, limit=NEARBY_LIMIT):
+    """
+    Посылки с адресом получателя в радиусе от точки (например, от склада)
+    
+    Args:
+        lat (float): Широта точки
+        lon (float): Долгота точки
+        radius_km (float): Радиус (км), не больше MAX_NEARBY_RADIUS_KM
+        active_only (bool): Только недоставленные посылки (не в конечном статусе)
+        limit (int): Максимальное количество посылок (ближайшие первыми)
+        
+    Returns:
+        tuple: (успех, список/сообщение_об_ошибке); посылки - словари с ключами
+            tracking_number, status, recipient, recipient_address, lat, lon, distance_km
+    """
+    error = validate_point(lat, lon)
+    if error:
+        return False, error
+    lat, lon = float(lat), float(lon)
+    if not 0 < radius_km <= MAX_NEARBY_RADIUS_KM:
+        return False, f"Радиус должен быть от 0 до {MAX_NEARBY_RADIUS_KM} км"
+    
+    rows = get_packages_in_box(*spatial.bounding_box(lat, lon, radius_km), active_only=active_only)
+    
+    if rows is None:
+        return False, "Ошибка при поиске посылок рядом"
+    return True, spatial.within_radius(rows, lat, lon, radius_km)[:limit]
+
+def nearest_packages(lat, lon, k=10, active_only=True):
+    """
+    k ближайших к точке посылок (по адресу получателя)
+    
+    Returns:
+        tuple: (успех, список/сообщение_об_ошибке), посылки по возрастанию расстояния
+    """
+    error = validate_point(lat, lon)
+    if error:
+        return False, error
+    lat, lon = float(lat), float(lon)
+    
+    result = spatial.nearest(lambda *box: get_packages_in_box(*box, active_only=active_only), lat, lon, k)
+    
+    if result is None:
+        return False, "Ошибка при поиске ближайших посылок"
+    return True, result
+
+def nearest_couriers(lat, lon, k=1):
+    """
+    k ближайших к точке активных курьеров
+    
+    Returns:
+        tuple: (успех, список/сообщение_об_ошибке); курьеры - словари с ключами
+            id, name, phone, zone, active_load, lat, lon, distance_km
+    """
+    error = validate_point(lat, lon)
+    if error:
+        return False, error
+    lat, lon = float(lat), float(lon)
+    
+    result = spatial.nearest(get_couriers_in_box, lat, lon, k)
+    
+    if result is None:
+        return False, "Ошибка при поиске ближайших курьеров"
+    return True, result
+
+def update_courier_location(courier_id, lat, lon):
+    """
+    Обновление текущих координат курьера
+    
+    Returns:
+        tuple: (успех, сообщение)
+    """
+    error = validate_point(lat, lon)
+    if error:
+        return False, error
+    
+    if set_courier_location(courier_id, float(lat), float(lon)):
+        return True, "Координаты курьера обновлены"
+    return False, "Ошибка при обновлении координат или курьер не найден"
+
+def plan_courier_route(courier_id, time_budget=routing.DEFAULT_TIME_BUDGET, return_to_start=False):
+    """
+    Порядок объезда незавершенных посылок курьера
+    
+    Маршрут начинается в текущих координатах курьера (если они известны)
+    и проходит через адреса получателей, для которых есть координаты
+    (см. geocode_packages); остальные посылки перечисляются отдельно.
+    
+    Args:
+        courier_id (int): ID курьера
+        time_budget (float): Бюджет времени на улучшение маршрута (с)
+        return_to_start (bool): Вернуться в начальную точку в конце маршрута
+        
+    Returns:
+        tuple: (успех, результат/сообщение_об_ошибке), где результат - словарь:
+            stops - посылки в порядке объезда (с расстоянием от предыдущей точки leg_km),
+            unlocated - посылки без координат, start - начальная точка или None,
+            total_km и naive_km - длина маршрута и объезда в порядке назначения
+    """
+    packages = get_courier_route_stops(courier_id)
+    if packages is None:
+        return False, "Ошибка при получении посылок курьера"
+    
+    located = [package for package in packages if package["lat"] is not None]
+    unlocated = [package for package in packages if package["lat"] is None]
+    start = get_courier_location(courier_id)
+    points = [(package["lat"], package["lon"]) for package in located]
+    
+    order, total = routing.plan_route(points, start, return_to_start, time_budget)
+    
+    stops = [located[index] for index in order]
+    previous = start
+    for stop in stops:
+        stop["leg_km"] = spatial.haversine_km(*previous, stop["lat"], stop["lon"]) if previous else 0.0
+        previous = (stop["lat"], stop["lon"])
+    return True, {
+        "stops": stops,
+        "unlocated": unlocated,
+        "start": start,
+        "total_km": total,
+        "naive_km": routing.route_length(points, range(len(points)), start, return_to_start),
+    }
+
+def packages_near_address(address, radius_km, limit=NEARBY_LIMIT):
+    """
+    Недоставленные посылки и ближайшие курьеры рядом с адресом
+    
+    Args:
+        address (str): Адрес (определяется по локальному справочнику)
+        radius_km (float): Радиус поиска посылок (км)
+        limit (int): Максимальное количество посылок
+        
+    Returns:
+        tuple: (успех, результат/сообщение_об_ошибке), где результат - словарь
+            point (широта, долгота, точность), packages и couriers (три ближайших курьера)
+    """
+    success, point = geocode_address(address)
+    if not success:
+        return False, point
+    
+    success, packages = packages_within(point[0], point[1], radius_km, limit=limit)
+    if not success:
+        return False, packages
+    success, couriers = nearest_couriers(point[0], point[1], k=3)
+    if not success:
+        return False, couriers
+    return True, {"point": point, "packages": packages, "couriers": couriers}
+
+def archive_packages(older_than_days=ARCHIVE_AFTER_DAYS, limit=ARCHIVE_BATCH_SIZE):
+    """
+    Перенос в архив порции посылок, завершенных больше older_than_days дней назад
+    
+    Архивные посылки по-прежнему находятся по номеру отслеживания, но не
+    попадают в списки, поиск и выгрузку посылок.
+    
+    Args:
+        older_than_days (int): Сколько дней посылка должна пробыть в конечном статусе
+        limit (int): Сколько посылок перенести за один вызов (одна транзакция)
+        
+    Returns:
+        tuple: (успех, результат/сообщение_об_ошибке), где результат - словарь
+            archived и partitions (см. database.archive_packages)
+    """
+    if older_than_days < 0:
+        return False, "Срок хранения не может быть отрицательным"
+    if limit <= 0:
+        return False, "Размер порции должен быть положительным"
+    
+    result = archive_packages_db(datetime.now() - timedelta(days=older_than_days), limit)
+    
+    if result is None:
+        return False, "Ошибка при переносе посылок в архив"
+    return True, result
+
+def get_archive_stats():
+    """
+    Количество архивных посылок по месяцам
+    
+    Returns:
+        list: Пары (месяц ГГГГ_ММ, количество посылок)
+    """
+    return get_archive_partitions()
+
 # Функции для работы с отзывами
+def validate_review(tracking_number, customer_name, rating, comment):
+    """
+    Проверка полей отзыва
+    
+    Args:
+        tracking_number (str): Номер отслеживания (необязательный)
+        customer_name (str): Имя клиента
+        rating (int): Рейтинг (1-5)
+        comment (str): Комментарий
+        
+    Returns:
+        str: Сообщение об ошибке или None если данные корректны
+    """
+    if not customer_name or not rating:
+        return "Имя клиента и рейтинг обязательны для заполнения"
+    
+    if not (1 <= rating <= 5):
+        return "Рейтинг должен быть от 1 до 5"
+    return None
+
 def add_review(tracking_number, customer_name, rating, comment):
     """
     Добавление нового отзыва
@@ -148,13 +885,12 @@ def add_review(tracking_number, customer_name, rating, comment):
     Returns:
         tuple: (успех, сообщение)
     """
-    if not customer_name or not rating:
-        return False, "Имя клиента и рейтинг обязательны для заполнения"
-    
-    if not (1 <= rating <= 5):
-        return False, "Рейтинг должен быть от 1 до 5"
+    error = validate_review(tracking_number, customer_name, rating, comment)
+    if error:
+        return False, error
     
-    success = create_review(tracking_number, customer_name, rating, comment)
+    success = _write(create_review, write_queue.WriteQueue.create_review,
+                     tracking_number, customer_name, rating, comment)
     
     if success:
         return True, "Отзыв успешно добавлен"
@@ -169,3 +905,205 @@ def get_reviews():
         list: Список отзывов
     """
     return get_all_reviews()
+
+def get_rating_summary(tracking_number=None, day=None):
+    """
+    Сводка оценок отзывов: общая, за день или по посылке
+    
+    Читается одна строка поддерживаемых при добавлении отзывов агрегатов,
+    поэтому время не зависит от количества отзывов.
+    
+    Args:
+        tracking_number (str): Номер отслеживания для сводки по посылке
+        day (date | str): День (дата или строка ГГГГ-ММ-ДД) для сводки за день
+        
+    Returns:
+        tuple: (успех, сводка/сообщение_об_ошибке), где сводка - словарь с ключами
+            count, total, average (None если отзывов нет) и histogram {оценка: количество}
+    """
+    if tracking_number:
+        scope, key = RATING_SCOPE_PARCEL, tracking_number
+    elif day:
+        scope, key = RATING_SCOPE_DAY, day if isinstance(day, str) else day.isoformat()
+    else:
+        scope, key = RATING_SCOPE_ALL, ""
+    
+    summary = get_rating_aggregate(scope, key)
+    
+    if summary is None:
+        return False, "Ошибка при получении статистики оценок"
+    summary["average"] = summary["total"] / summary["count"] if summary["count"] else None
+    return True, summary
+
+def list_packages(after=None, limit=100, offset=0):
+    """
+    Получение страницы посылок (новые первыми)
+    
+    Args:
+        after (tuple): Ключ page_key() последней посылки предыдущей страницы или None
+        limit (int): Размер страницы
+        offset (int): Сколько посылок пропустить после ключа after
+        
+    Returns:
+        list: Список посылок
+    """
+    return get_packages_page(after, limit, offset)
+
+def list_reviews(after=None, limit=100, offset=0):
+    """
+    Получение страницы отзывов (новые первыми)
+    
+    Args:
+        after (tuple): Ключ page_key() последнего отзыва предыдущей страницы или None
+        limit (int): Размер страницы
+        offset (int): Сколько отзывов пропустить после ключа after
+        
+    Returns:
+        list: Список отзывов
+    """
+    return get_reviews_page(after, limit, offset)
+
+def list_couriers(after=None, limit=100, offset=0):
+    """
+    Получение страницы курьеров (по имени)
+    
+    Args:
+        after (tuple): Ключ page_key(row, "couriers") последнего курьера или None
+        limit (int): Размер страницы
+        offset (int): Сколько курьеров пропустить после ключа after
+        
+    Returns:
+        list: Список курьеров
+    """
+    return get_couriers_page(after, limit, offset)
+
+def count_packages():
+    """Количество посылок"""
+    return count_rows("packages")
+
+def count_reviews():
+    """Количество отзывов"""
+    return count_rows("reviews")
+
+def count_couriers():
+    """Количество курьеров"""
+    return count_rows("couriers")
+
+def stream_packages(batch_size=500):
+    """
+    Ленивый обход всех посылок (новые первыми) страницами по batch_size
+    
+    Args:
+        batch_size (int): Количество посылок, читаемых за один запрос
+        
+    Yields:
+        dict: Информация о посылке
+    """
+    return iter_packages(batch_size)
+
+def stream_reviews(batch_size=500):
+    """
+    Ленивый обход всех отзывов (новые первыми) страницами по batch_size
+    
+    Args:
+        batch_size (int): Количество отзывов, читаемых за один запрос
+        
+    Yields:
+        dict: Информация об отзыве
+    """
+    return iter_reviews(batch_size)
+
+def get_package_reviews(tracking_number):
+    """
+    Получение отзывов о посылке
+    
+    Args:
+        tracking_number (str): Номер отслеживания
+        
+    Returns:
+        list: Список отзывов о посылке
+    """
+    if not tracking_number:
+        return []
+    return get_reviews_by_tracking(tracking_number)
+
+def export_data(table, path, date_from=None, date_to=None, status=None, fmt=None, compress=None,
+                resume=True, progress=None):
+    """
+    Потоковая выгрузка посылок, отзывов или курьеров в CSV или JSONL
+    
+    Прерванная выгрузка в тот же файл с теми же параметрами продолжается
+    с места остановки (см. exporter).
+    
+    Args:
+        table (str): "packages", "reviews" или "couriers"
+        path (str): Путь к файлу (.csv, .jsonl, с .gz - со сжатием)
+        date_from (date | str): Первый день периода по дате создания (ГГГГ-ММ-ДД) или None
+        date_to (date | str): Последний день периода (включительно) или None
+        status (str): Выгружать только строки с этим статусом или None
+        fmt (str): "csv" или "jsonl"; по умолчанию по имени файла
+        compress (bool): Сжатие gzip; по умолчанию по имени файла
+        resume (bool): Продолжать прерванную выгрузку
+        progress (callable): Функция (выгружено_строк) для отображения хода выгрузки
+        
+    Returns:
+        tuple: (успех, отчет/сообщение_об_ошибке), где отчет - словарь с ключами
+            rows (строк в файле) и resumed (выгрузка была продолжена)
+    """
+    try:
+        if date_from is not None and not isinstance(date_from, date):
+            date_from = date.fromisoformat(str(date_from).strip())
+        if date_to is not None and not isinstance(date_to, date):
+            date_to = date.fromisoformat(str(date_to).strip())
+    except ValueError:
+        return False, "Дата должна быть в формате ГГГГ-ММ-ДД"
+    
+    try:
+        result = exporter.export_table(
+            table, path, fmt=fmt, compress=compress,
+            date_from=date_from.isoformat() if date_from else None,
+            # Последний день входит в период: граница - начало следующего дня
+            date_to=(date_to + timedelta(days=1)).isoformat() if date_to else None,
+            status=status or None, resume=resume, progress=progress
+        )
+    except ValueError as e:
+        return False, str(e)
+    except OSError as e:
+        return False, f"Ошибка записи файла выгрузки: {e}"
+    except Exception as e:
+        print(f"Ошибка при выгрузке данных: {e}")
+        return False, "Ошибка при выгрузке данных"
+    
+    return True, result
+
+def import_data(table, path, fmt=None, rejected=None, workers=None, progress=None):
+    """
+    Загрузка посылок, курьеров или отзывов из файла CSV или JSONL
+    
+    Записи проверяются по тем же правилам, что и при добавлении по одной
+    (validate_package, validate_courier, validate_review); отклоненные записи
+    сохраняются в отдельный файл (см. importer).
+    
+    Args:
+        table (str): "packages", "couriers" или "reviews"
+        path (str): Путь к файлу (.csv, .jsonl, возможно с .gz)
+        fmt (str): "csv" или "jsonl"; по умолчанию по имени файла
+        rejected (str): Файл отклоненных записей; по умолчанию <path>.rejected.jsonl
+        workers (int): Количество процессов проверки; по умолчанию по числу процессоров
+        progress (callable): Функция (прочитано, загружено, отклонено) для отображения хода загрузки
+        
+    Returns:
+        tuple: (успех, отчет/сообщение_об_ошибке), где отчет - словарь с ключами
+            read, imported, rejected, elapsed, rows_per_second и rejected_path
+    """
+    try:
+        result = importer.import_file(table, path, fmt=fmt, rejected=rejected, workers=workers, progress=progress)
+    except ValueError as e:
+        return False, str(e)
+    except OSError as e:
+        return False, f"Ошибка чтения файла: {e}"
+    except Exception as e:
+        print(f"Ошибка при загрузке данных: {e}")
+        return False, "Ошибка при загрузке данных"
+    
+    return True, result
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Режим профилирования запросов SQL приложения "Служба доставки".
+
+Включается явно (enable() или main.py --profile-sql) и подписывается на все
+запросы, выполняемые через соединения database.py (см.
+instrumentation.add_statement_listener). Для каждого запроса накапливаются
+количество, суммарное и максимальное время; IN-списки разной длины считаются
+одним запросом. Запросы дольше порога записываются в журнал медленных
+запросов вместе с типами и размерами параметров (сами значения не
+сохраняются) и планом EXPLAIN QUERY PLAN. При завершении report() выводит
+запросы с наибольшим суммарным временем.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+from itertools import groupby
+
+import database
+import instrumentation
+
+# Порог медленного запроса по умолчанию (мс)
+SLOW_QUERY_MS = 50
+# Количество запросов в отчете
+TOP_STATEMENTS = 10
+# Длина текста запроса в строке отчета
+REPORT_SQL_WIDTH = 160
+# Запросы, для которых строится план
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PLACEHOLDER_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+
+def normalize_sql(sql):
+    """Текст запроса в одну строку, списки "?, ?, ?" заменены на "?, ...\""""
+    return _PLACEHOLDER_LIST_RE.sub("?, ...", _WHITESPACE_RE.sub(" ", sql).strip())
+
+def parameter_shape(parameters):
+    """
+    Описание параметров запроса без их значений
+
+    Returns:
+        str: Например "(str[10], int, NULL)", повторы подряд - "(str[10] x50)";
+            для executemany - "executemany"
+    """
+    def describe(value):
+        if value is None:
+            return "NULL"
+        if isinstance(value, (str, bytes)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+
+    if parameters is None:
+        return "executemany"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{name}: {describe(value)}" for name, value in parameters.items()) + "}"
+    parts = []
+    for kind, run in groupby(describe(value) for value in parameters):
+        count = sum(1 for _ in run)
+        parts.append(f"{kind} x{count}" if count > 1 else kind)
+    return "(" + ", ".join(parts) + ")"
+
+def _shorten(text, width=REPORT_SQL_WIDTH):
+    """Обрезка длинного текста запроса для отчета"""
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+class _StatementStats:
+    """Накопленные показатели одного запроса"""
+
+    __slots__ = ("count", "total", "max", "errors", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.slow = 0
+
+class QueryProfiler:
+    """Подписчик на выполненные запросы: статистика по запросам и журнал медленных"""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, log_path=None, explain=True):
+        """
+        Инициализация профилировщика
+
+        Args:
+            threshold_ms (float): Порог медленного запроса (мс)
+            log_path (str): Файл журнала медленных запросов (дописывается); None - вывод на экран
+            explain (bool): Добавлять в журнал план EXPLAIN QUERY PLAN
+        """
+        self.threshold = threshold_ms / 1000
+        self.log_path = log_path
+        self.explain = explain
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._plans = {}
+        self._state = threading.local()
+
+    def __call__(self, sql, parameters, elapsed, error):
+        # Запросы самого профилировщика (EXPLAIN) не учитываются
+        if getattr(self._state, "explaining", False):
+            return
+        key = normalize_sql(sql)
+        slow = elapsed >= self.threshold
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = _StatementStats()
+            stats.count += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            if error is not None:
+                stats.errors += 1
+            if slow:
+                stats.slow += 1
+        if slow:
+            self.log_slow(key, sql, parameters, elapsed, error)
+
+    def query_plan(self, key, sql, parameters):
+        """План запроса (строится один раз для каждого запроса)"""
+        plan = self._plans.get(key)
+        if plan is not None:
+            return plan
+        if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+            return []
+        if parameters is None:
+            parameters = (None,) * sql.count("?")
+        self._state.explaining = True
+        try:
+            plan = database.explain_query_plan(sql, parameters)
+        except Exception as e:
+            return [f"план недоступен: {e}"]
+        finally:
+            self._state.explaining = False
+        self._plans[key] = plan
+        return plan
+
+    def log_slow(self, key, sql, parameters, elapsed, error):
+        """Запись медленного запроса в журнал"""
+        lines = [f"[{datetime.now():%Y-%m-%d %H:%M:%S}] медленный запрос {elapsed * 1000:.1f} мс"
+                 + (f" ({instrumentation.current_function()})" if instrumentation.enabled else "")
+                 + (f", ошибка: {error}" if error is not None else ""),
+                 f"  {key}",
+                 f"  параметры: {parameter_shape(parameters)}"]
+        if self.explain:
+            lines += [f"  план: {detail}" for detail in self.query_plan(key, sql, parameters)]
+        self.write("\n".join(lines))
+
+    def write(self, text):
+        """Вывод текста в журнал"""
+        if self.log_path is None:
+            print(text)
+            return
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as log:
+                log.write(text + "\n")
+        except OSError as e:
+            print(f"Ошибка при записи журнала медленных запросов: {e}")
+
+    def statements(self):
+        """
+        Статистика по запросам, упорядоченная по суммарному времени
+
+        Returns:
+            list: Словари с ключами sql, count, total_ms, avg_ms, max_ms, errors, slow
+        """
+        with self._lock:
+            rows = [{
+                "sql": key,
+                "count": stats.count,
+                "total_ms": stats.total * 1000,
+                "avg_ms": stats.total * 1000 / stats.count,
+                "max_ms": stats.max * 1000,
+                "errors": stats.errors,
+                "slow": stats.slow,
+            } for key, stats in self._statements.items()]
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def report(self, top=TOP_STATEMENTS):
+        """
+        Отчет о запросах с наибольшим суммарным временем
+
+        Returns:
+            str: Текст отчета
+        """
+        rows = self.statements()
+        total_ms = sum(row["total_ms"] for row in rows)
+        lines = [
+            f"Профиль запросов SQL за {time.perf_counter() - self.started:.1f} с: "
+            f"{sum(row['count'] for row in rows)} запросов ({len(rows)} разных), "
+            f"{total_ms / 1000:.3f} с в базе данных, медленных (от {self.threshold * 1000:g} мс): "
+            f"{sum(row['slow'] for row in rows)}",
+            f"{'всего, мс':>12} {'доля':>6} {'вызовов':>9} {'среднее, мс':>12} {'макс, мс':>10} {'медл.':>6} {'ошиб.':>6}  запрос",
+        ]
+        for row in rows[:top]:
+            share = row["total_ms"] / total_ms if total_ms else 0.0
+            lines.append(f"{row['total_ms']:>12.1f} {share:>6.1%} {row['count']:>9} {row['avg_ms']:>12.3f} "
+                         f"{row['max_ms']:>10.1f} {row['slow']:>6} {row['errors']:>6}  {_shorten(row['sql'])}")
+        return "\n".join(lines)
+
+_profiler = None
+
+def enable(threshold_ms=SLOW_QUERY_MS, log_path=None, explain=True):
+    """
+    Включение профилирования запросов
+
+    Args:
+        threshold_ms (float): Порог медленного запроса (мс)
+        log_path (str): Файл журнала медленных запросов; None - вывод на экран
+        explain (bool): Добавлять в журнал план запроса
+
+    Returns:
+        QueryProfiler: Включенный профилировщик
+    """
+    global _profiler
+    disable()
+    _profiler = QueryProfiler(threshold_ms, log_path, explain)
+    instrumentation.add_statement_listener(_profiler)
+    return _profiler
+
+def disable():
+    """
+    Выключение профилирования
+
+    Returns:
+        QueryProfiler: Профилировщик с накопленной статистикой или None, если профилирование не было включено
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        instrumentation.remove_statement_listener(profiler)
+    return profiler
+
+def report(top=TOP_STATEMENTS):
+    """Отчет включенного профилировщика или None"""
+    return _profiler.report(top) if _profiler is not None else None
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Планирование маршрута курьера по его посылкам для приложения "Служба доставки".
+
+Маршрут строится жадно (к ближайшей еще не посещенной остановке) и затем
+улучшается локальным поиском до исчерпания бюджета времени:
+2-opt (разворот участка маршрута) и Or-opt (перенос цепочки из 1-3
+остановок в другое место маршрута). Матрица расстояний и оценка всех
+вариантов хода для одной позиции вычисляются векторно средствами NumPy;
+без NumPy используется та же логика на списках Python (медленнее).
+
+Маршрут считается замкнутым обходом с неподвижной вершиной 0. Открытый
+маршрут (без возврата на склад или без заданного начала) получается
+добавлением фиктивной вершины с нулевыми расстояниями до всех остановок,
+которая тоже остается на месте.
+"""
+
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from spatial import EARTH_RADIUS_KM, haversine_km
+
+# Бюджет времени на улучшение маршрута по умолчанию (с)
+DEFAULT_TIME_BUDGET = 0.5
+# Наибольшая длина цепочки, переносимой ходом Or-opt
+OR_OPT_MAX_SEGMENT = 3
+# Улучшения меньше этого (км) не считаются: защита от зацикливания на погрешностях
+EPSILON = 1e-9
+
+def distance_matrix(points):
+    """
+    Матрица расстояний между точками по поверхности Земли (км)
+
+    Args:
+        points (list): Пары (широта, долгота)
+
+    Returns:
+        Матрица n x n: numpy.ndarray или, без NumPy, список списков
+    """
+    if np is None:
+        # Матрица симметрична: считается только верхний треугольник
+        radians = [(math.radians(lat), math.radians(lon), math.cos(math.radians(lat))) for lat, lon in points]
+        matrix = [[0.0] * len(points) for _ in points]
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        for i, (lat1, lon1, cos1) in enumerate(radians):
+            row = matrix[i]
+            for j in range(i + 1, len(radians)):
+                lat2, lon2, cos2 = radians[j]
+                a = sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * sin((lon2 - lon1) / 2) ** 2
+                row[j] = matrix[j][i] = 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+        return matrix
+    coordinates = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    lat = coordinates[:, 0][:, None]
+    lon = coordinates[:, 1][:, None]
+    a = np.sin((lat.T - lat) / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin((lon.T - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _with_dummy(matrix):
+    """Матрица с добавленной вершиной (последней), расстояние до которой от всех равно нулю"""
+    if np is None:
+        return [row + [0.0] for row in matrix] + [[0.0] * (len(matrix) + 1)]
+    return np.pad(matrix, ((0, 1), (0, 1)))
+
+def tour_length(tour, matrix):
+    """Длина замкнутого обхода (км)"""
+    return sum(matrix[tour[i - 1]][tour[i]] for i in range(len(tour)))
+
+def nearest_neighbour(matrix, start=0):
+    """
+    Жадный обход: каждый раз к ближайшей непосещенной вершине
+
+    Returns:
+        list: Порядок вершин, начиная со start
+    """
+    size = len(matrix)
+    tour = [start]
+    if np is not None:
+        visited = np.zeros(size, dtype=bool)
+        visited[start] = True
+        for _ in range(size - 1):
+            distances = np.where(visited, np.inf, matrix[tour[-1]])
+            current = int(distances.argmin())
+            visited[current] = True
+            tour.append(current)
+        return tour
+    unvisited = set(range(size)) - {start}
+    while unvisited:
+        row = matrix[tour[-1]]
+        current = min(unvisited, key=row.__getitem__)
+        unvisited.remove(current)
+        tour.append(current)
+    return tour
+
+def two_opt_pass(tour, matrix, deadline, fixed_tail=False):
+    """
+    Один проход 2-opt: для каждой позиции i - лучший разворот участка tour[i..j]
+
+    Обход изменяется на месте; tour[0] (и tour[-1] при fixed_tail) остаются на месте.
+
+    Returns:
+        bool: Было ли хотя бы одно улучшение
+    """
+    size = len(tour)
+    last = size - 1 if fixed_tail else size
+    improved = False
+    for i in range(1, last - 1):
+        if time.perf_counter() > deadline:
+            break
+        a, b = tour[i - 1], tour[i]
+        if np is not None:
+            route = np.asarray(tour + tour[:1])
+            c, e = route[i + 1:last], route[i + 2:last + 1]
+            deltas = matrix[a, c] + matrix[b, e] - matrix[a, b] - matrix[c, e]
+            k = int(deltas.argmin())
+            best, j = deltas[k], i + 1 + k
+        else:
+            row_a, row_b = matrix[a], matrix[b]
+            base = row_a[b]
+            best, j = 0.0, None
+            for k in range(i + 1, last):
+                c, e = tour[k], tour[(k + 1) % size]
+                delta = row_a[c] + row_b[e] - base - matrix[c][e]
+                if delta < best:
+                    best, j = delta, k
+        if j is not None and best < -EPSILON:
+            tour[i:j + 1] = tour[i:j + 1][::-1]
+            improved = True
+    return improved
+
+def or_opt_pass(tour, matrix, deadline, fixed_tail=False, max_segment=OR_OPT_MAX_SEGMENT):
+    """
+    Один проход Or-opt: перенос цепочек из 1..max_segment вершин (в прямом
+    или обратном порядке) между двумя другими соседними вершинами обхода
+
+    Обход изменяется на месте; tour[0] (и tour[-1] при fixed_tail) остаются на месте.
+
+    Returns:
+        bool: Было ли хотя бы одно улучшение
+    """
+    improved = False
+    for length in range(1, max_segment + 1):
+        i = 1
+        while len(tour) > length + 2:
+            last = len(tour) - 1 if fixed_tail else len(tour)
+            if i + length > last:
+                break
+            if time.perf_counter() > deadline:
+                return improved
+            segment = tour[i:i + length]
+            first, end = segment[0], segment[-1]
+            prev, after = tour[i - 1], tour[(i + length) % len(tour)]
+            removed = matrix[prev][first] + matrix[end][after] - matrix[prev][after]
+            rest = tour[:i] + tour[i + length:]
+            # Вставка между rest[k] и rest[k + 1]. Не рассматриваются прежнее место
+            # цепочки и, при неподвижном конце, место после него
+            excluded = (i - 1, len(rest) - 1) if fixed_tail else (i - 1,)
+            if np is not None:
+                u = np.asarray(rest)
+                v = np.roll(u, -1)
+                forward = matrix[u, first] + matrix[end, v] - matrix[u, v]
+                backward = matrix[u, end] + matrix[first, v] - matrix[u, v]
+                forward[list(excluded)] = backward[list(excluded)] = np.inf
+                k_forward, k_backward = int(forward.argmin()), int(backward.argmin())
+                if forward[k_forward] <= backward[k_backward]:
+                    k, added, reverse = k_forward, forward[k_forward], False
+                else:
+                    k, added, reverse = k_backward, backward[k_backward], True
+            else:
+                k, added, reverse = None, math.inf, False
+                for position in range(len(rest)):
+                    if position in excluded:
+                        continue
+                    u, v = rest[position], rest[(position + 1) % len(rest)]
+                    base = matrix[u][v]
+                    forward = matrix[u][first] + matrix[end][v] - base
+                    backward = matrix[u][end] + matrix[first][v] - base
+                    if forward < added:
+                        k, added, reverse = position, forward, False
+                    if backward < added:
+                        k, added, reverse = position, backward, True
+            if k is not None and added - removed < -EPSILON:
+                tour[:] = rest[:k + 1] + (segment[::-1] if reverse else segment) + rest[k + 1:]
+                improved = True
+            else:
+                i += 1
+    return improved
+
+def optimize_tour(tour, matrix, time_budget=DEFAULT_TIME_BUDGET, fixed_tail=False):
+    """
+    Улучшение обхода чередованием проходов 2-opt и Or-opt
+
+    Args:
+        tour (list): Начальный обход (изменяется на месте), tour[0] неподвижна
+        matrix: Матрица расстояний
+        time_budget (float): Бюджет времени (с)
+        fixed_tail (bool): tour[-1] тоже неподвижна
+
+    Returns:
+        list: Улучшенный обход (тот же список)
+    """
+    deadline = time.perf_counter() + time_budget
+    while time.perf_counter() < deadline:
+        improved = two_opt_pass(tour, matrix, deadline, fixed_tail)
+        improved = or_opt_pass(tour, matrix, deadline, fixed_tail) or improved
+        if not improved:
+            break
+    return tour
+
+def plan_route(points, start=None, return_to_start=False, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Порядок объезда точек
+
+    Args:
+        points (list): Пары (широта, долгота) остановок
+        start (tuple): Начальная точка маршрута (склад, положение курьера) или None -
+            начать с любой остановки
+        return_to_start (bool): Маршрут заканчивается в начальной точке
+        time_budget (float): Бюджет времени на улучшение маршрута (с)
+
+    Returns:
+        tuple: (порядок - индексы points, длина маршрута в км)
+    """
+    if not points:
+        return [], 0.0
+    if start is None:
+        # Фиктивная вершина - неподвижное начало обхода, концы маршрута свободны
+        matrix = _with_dummy(distance_matrix(points))
+        dummy = len(points)
+        tour = nearest_neighbour(matrix, dummy)
+        optimize_tour(tour, matrix, time_budget)
+        order = tour[1:]
+    elif return_to_start:
+        matrix = distance_matrix([start] + list(points))
+        tour = nearest_neighbour(matrix, 0)
+        optimize_tour(tour, matrix, time_budget)
+        order = [node - 1 for node in tour[1:]]
+    else:
+        # Фиктивная вершина - неподвижный конец обхода: возврат в начало ничего не стоит
+        base = distance_matrix([start] + list(points))
+        tour = nearest_neighbour(base, 0) + [len(points) + 1]
+        matrix = _with_dummy(base)
+        optimize_tour(tour, matrix, time_budget, fixed_tail=True)
+        order = [node - 1 for node in tour[1:-1]]
+    return order, float(tour_length(tour, matrix))
+
+def route_length(points, order, start=None, return_to_start=False):
+    """
+    Длина маршрута, проходящего остановки в заданном порядке (км)
+
+    Args:
+        points (list): Пары (широта, долгота) остановок
+        order (list): Порядок - индексы points
+        start (tuple): Начальная точка или None
+        return_to_start (bool): Возврат в начальную точку
+
+    Returns:
+        float: Длина маршрута
+    """
+    path = ([start] if start is not None else []) + [points[index] for index in order]
+    if start is not None and return_to_start:
+        path.append(start)
+    return sum(haversine_km(*path[i - 1], *path[i]) for i in range(1, len(path)))
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+HTTP API службы доставки без графического интерфейса.
+
+Сервер работает на asyncio: соединения и разбор HTTP обслуживаются в одном
+потоке событийного цикла, а обращения к package_service (и SQLite) выполняются
+в ограниченном пуле потоков. У каждого потока пула свое долгоживущее
+соединение с базой данных (см. database.get_connection). Соединения клиентов
+поддерживают keep-alive (HTTP/1.1).
+
+Методы API (ответы в JSON вида {"ok": true, "result": ...} или {"ok": false, "error": ...}):
+    GET  /health                        - проверка работоспособности
+    GET  /track/<номер>                 - отслеживание посылки
+    GET  /track?numbers=<номер>,<номер> - отслеживание нескольких посылок
+    POST /track                         - то же, тело {"tracking_numbers": [...]}
+    POST /packages                      - отправка посылки, тело {"description", "sender",
+                                          "recipient", "sender_address", "recipient_address"}
+    POST /reviews                       - отзыв, тело {"tracking_number", "customer_name",
+                                          "rating", "comment"}
+    GET  /couriers?limit=&offset=       - список курьеров
+    GET  /metrics                       - метрики в текстовом формате Prometheus
+                                          (собираются после instrumentation.enable())
+"""
+
+import asyncio
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import instrumentation
+import package_service
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Потоков для обращений к базе данных
+DEFAULT_WORKERS = 4
+# Сколько запросов может одновременно выполняться и ждать свободный поток; остальные получают 503
+MAX_PENDING = 256
+# Закрытие неактивного keep-alive соединения (с)
+KEEP_ALIVE_TIMEOUT = 15
+# Ограничения на размер запроса
+MAX_HEADER_LINES = 100
+MAX_BODY_SIZE = 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+class HTTPError(Exception):
+    """Ошибка запроса, возвращаемая клиенту с кодом status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class TrackingServer:
+    """HTTP-сервер API поверх package_service"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, max_pending=MAX_PENDING):
+        """
+        Инициализация сервера
+
+        Args:
+            host (str): Адрес для прослушивания
+            port (int): Порт (0 - выбрать свободный)
+            workers (int): Количество потоков для обращений к базе данных
+            max_pending (int): Сколько запросов одновременно может находиться в пуле
+                (выполняемых и ожидающих свободный поток)
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._server = None
+        self.routes = {
+            ("GET", "/health"): self.handle_health,
+            ("GET", "/track"): self.handle_track_batch,
+            ("POST", "/track"): self.handle_track_batch,
+            ("POST", "/packages"): self.handle_send_package,
+            ("POST", "/reviews"): self.handle_add_review,
+            ("GET", "/couriers"): self.handle_couriers,
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+
+    async def start(self):
+        """Запуск прослушивания порта"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="api-worker")
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """Обслуживание запросов до остановки"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """Остановка сервера и пула потоков"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def call(self, fn, *args):
+        """
+        Выполнение функции сервиса в пуле потоков
+
+        Очередь ThreadPoolExecutor не ограничена, поэтому запросы, отданные в пул
+        (выполняемые и ждущие свободный поток), считаются явно. Если их уже
+        max_pending, клиент сразу получает 503, а не ждет в неограниченной очереди.
+        Счетчик меняется только в потоке цикла событий, блокировка не нужна.
+        """
+        if self._pending >= self.max_pending:
+            raise HTTPError(503, "Сервер перегружен, повторите запрос позже")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def handle_connection(self, reader, writer):
+        """Обслуживание соединения клиента (несколько запросов при keep-alive)"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    await self.write_response(writer, e.status, {"ok": False, "error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                keep_alive = self.is_keep_alive(version, headers)
+                status, payload = await self.dispatch(method, target, body)
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_request(self, reader):
+        """
+        Чтение одного HTTP-запроса
+
+        Returns:
+            tuple: (метод, цель, версия, заголовки, тело) или None если клиент закрыл соединение
+        """
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Некорректная строка запроса")
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(400, "Слишком много заголовков")
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Некорректный Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Некорректный Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "Слишком большой запрос")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version, headers, body
+
+    def is_keep_alive(self, version, headers):
+        """Нужно ли сохранить соединение после ответа"""
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def write_response(self, writer, status, payload, keep_alive):
+        """Отправка ответа: JSON, а для строки - обычный текст"""
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        """
+        Выбор обработчика по методу и пути
+
+        Returns:
+            tuple: (код_ответа, тело_ответа)
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if path.startswith("/track/") and method == "GET":
+                return await self.handle_track(unquote(path[len("/track/"):]))
+            handler = self.routes.get((method, path))
+            if handler is None:
+                if any(route_path == path for route_method, route_path in self.routes):
+                    raise HTTPError(405, "Метод не поддерживается")
+                raise HTTPError(404, "Неизвестный адрес")
+            return await handler(query, self.parse_json(body) if method == "POST" else {})
+        except HTTPError as e:
+            return e.status, {"ok": False, "error": e.message}
+        except Exception as e:
+            print(f"Ошибка при обработке запроса {method} {target}: {e}")
+            return 500, {"ok": False, "error": "Внутренняя ошибка сервера"}
+
+    def parse_json(self, body):
+        """Разбор JSON-тела запроса"""
+        if not body:
+            return {}
+        try:
+            data = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(400, "Тело запроса должно быть JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Тело запроса должно быть JSON-объектом")
+        return data
+
+    @staticmethod
+    def service_response(response, success_status=200, error_status=400):
+        """Преобразование ответа package_service (успех, результат) в HTTP-ответ"""
+        success, result = response
+        if success:
+            return success_status, {"ok": True, "result": result}
+        return error_status, {"ok": False, "error": result}
+
+    async def handle_health(self, query, data):
+        """GET /health"""
+        return 200, {"ok": True, "result": "ok"}
+
+    async def handle_track(self, tracking_number):
+        """GET /track/<номер>"""
+        response = await self.call(package_service.track_package, tracking_number)
+        return self.service_response(response, error_status=404)
+
+    async def handle_track_batch(self, query, data):
+        """GET /track?numbers=... и POST /track: отслеживание нескольких посылок одним запросом к БД"""
+        if "tracking_numbers" in data:
+            numbers = data["tracking_numbers"]
+            if not isinstance(numbers, list) or not all(isinstance(number, str) for number in numbers):
+                raise HTTPError(400, "tracking_numbers должен быть списком строк")
+        else:
+            numbers = [number for number in query.get("numbers", "").split(",") if number]
+        response = await self.call(package_service.track_packages, numbers)
+        return self.service_response(response)
+
+    async def handle_send_package(self, query, data):
+        """POST /packages"""
+        fields = ("description", "sender", "recipient", "sender_address", "recipient_address")
+        values = [str(data.get(field) or "") for field in fields]
+        response = await self.call(package_service.send_package, *values)
+        status, payload = self.service_response(response, success_status=201)
+        if status == 201:
+            payload["result"] = {"tracking_number": response[1]}
+        return status, payload
+
+    async def handle_add_review(self, query, data):
+        """POST /reviews"""
+        rating = data.get("rating")
+        # bool - подкласс int, а 4.5 или "5" не должны молча превращаться в оценку
+        if not isinstance(rating, int) or isinstance(rating, bool):
+            raise HTTPError(400, "Рейтинг должен быть целым числом от 1 до 5")
+        response = await self.call(
+            package_service.add_review,
+            str(data.get("tracking_number") or ""),
+            str(data.get("customer_name") or ""),
+            rating,
+            str(data.get("comment") or ""),
+        )
+        return self.service_response(response, success_status=201)
+
+    async def handle_couriers(self, query, data):
+        """GET /couriers?limit=&offset="""
+        try:
+            # LIMIT -1 в SQLite означает "без ограничения"
+            limit = max(1, min(int(query.get("limit", 100)), 1000))
+            offset = max(int(query.get("offset", 0)), 0)
+        except ValueError:
+            raise HTTPError(400, "limit и offset должны быть числами")
+        couriers = await self.call(package_service.list_couriers, None, limit, offset)
+        return 200, {"ok": True, "result": couriers}
+
+    async def handle_metrics(self, query, data):
+        """GET /metrics"""
+        return 200, instrumentation.render_prometheus()
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS):
+    """
+    Запуск сервера до прерывания (Ctrl+C или SIGTERM)
+
+    Args:
+        host (str): Адрес для прослушивания
+        port (int): Порт
+        workers (int): Количество потоков для обращений к базе данных
+    """
+    async def main():
+        server = TrackingServer(host, port, workers)
+        await server.start()
+        print(f"Сервер API службы доставки: http://{server.host}:{server.port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        serving = asyncio.ensure_future(server.serve_forever())
+        try:
+            await stop.wait()
+        finally:
+            serving.cancel()
+            await server.stop()
+            print("Сервер остановлен")
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
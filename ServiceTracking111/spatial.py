@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Расстояния и пространственный поиск для приложения "Служба доставки".
+
+Координаты посылок и курьеров хранятся в индексах R*Tree (таблицы
+package_locations и courier_locations, см. database.py), которые отвечают
+на запрос "точки в прямоугольнике". Здесь - переход от радиуса к
+ограничивающему прямоугольнику, точная проверка расстояния и поиск k
+ближайших точек расширением прямоугольника.
+"""
+
+import math
+
+# Средний радиус Земли (км)
+EARTH_RADIUS_KM = 6371.0088
+# Длина одного градуса широты (км)
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Начальный радиус поиска ближайших точек (км), удваивается до MAX_SEARCH_RADIUS_KM
+INITIAL_SEARCH_RADIUS_KM = 1.0
+MAX_SEARCH_RADIUS_KM = 20038.0
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по поверхности Земли между двумя точками (км)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Прямоугольник, содержащий круг радиуса radius_km с центром в точке
+
+    Вблизи полюсов и для больших радиусов прямоугольник охватывает все
+    долготы; переход через 180-й меридиан не разбивается на два прямоугольника,
+    а расширяется до всех долгот.
+
+    Returns:
+        tuple: (min_lat, max_lat, min_lon, max_lon)
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - delta_lat), min(90.0, lat + delta_lat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-9 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    delta_lon = radius_km / (KM_PER_DEGREE * cos_lat)
+    if lon - delta_lon < -180 or lon + delta_lon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lon - delta_lon, lon + delta_lon
+
+def within_radius(rows, lat, lon, radius_km):
+    """
+    Точки из прямоугольного отбора, лежащие в круге, по возрастанию расстояния
+
+    Args:
+        rows (list): Словари с ключами lat и lon (например, посылки с координатами)
+        lat (float): Широта центра
+        lon (float): Долгота центра
+        radius_km (float): Радиус (км)
+
+    Returns:
+        list: Те же словари с добавленным ключом distance_km
+    """
+    result = []
+    for row in rows:
+        distance = haversine_km(lat, lon, row["lat"], row["lon"])
+        if distance <= radius_km:
+            row["distance_km"] = distance
+            result.append(row)
+    result.sort(key=lambda row: row["distance_km"])
+    return result
+
+def nearest(fetch_box, lat, lon, k, max_radius_km=MAX_SEARCH_RADIUS_KM):
+    """
+    k ближайших точек расширением прямоугольника поиска
+
+    Радиус удваивается, пока в круге не окажется k точек: точки за
+    пределами круга текущего радиуса еще не означают, что ближе их никого нет.
+
+    Args:
+        fetch_box (callable): Функция (min_lat, max_lat, min_lon, max_lon) -> список
+            словарей с ключами lat и lon или None в случае ошибки
+        lat (float): Широта точки
+        lon (float): Долгота точки
+        k (int): Количество ближайших точек
+        max_radius_km (float): Наибольший радиус поиска (км)
+
+    Returns:
+        list: До k словарей с ключом distance_km по возрастанию расстояния; None в случае ошибки
+    """
+    radius = INITIAL_SEARCH_RADIUS_KM
+    while True:
+        rows = fetch_box(*bounding_box(lat, lon, radius))
+        if rows is None:
+            return None
+        found = within_radius(rows, lat, lon, radius)
+        if len(found) >= k or radius >= max_radius_km:
+            return found[:k]
+        # Следующий радиус - не меньше, чем нужно, чтобы k точек прямоугольника попали в круг
+        distances = sorted(haversine_km(lat, lon, row["lat"], row["lon"]) for row in rows)
+        radius = min(max_radius_km, max(radius * 2, distances[k - 1] if len(distances) >= k else 0))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Проверка планов выполнения запросов на временной базе данных со всеми миграциями.
+
+Запуск: python -m pytest tests (или python -m unittest discover tests) из каталога приложения.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Вызовы функций database, запросы которых проверяются в том виде, в каком они выполняются
+TRACED_CALLS = [
+    ("get_package_by_tracking", lambda: database.get_package_by_tracking("XX-0000000")),
+    ("get_packages_by_tracking", lambda: database.get_packages_by_tracking(["XX-0000000", "XX-0000001"])),
+    ("get_all_packages", database.get_all_packages),
+    ("get_all_reviews", database.get_all_reviews),
+    ("get_reviews_by_tracking", lambda: database.get_reviews_by_tracking("XX-0000000")),
+    ("get_all_couriers", database.get_all_couriers),
+    ("get_package_events", lambda: database.get_package_events("XX-0000000")),
+    ("get_packages_page", database.get_packages_page),
+    ("get_packages_page after", lambda: database.get_packages_page(("2000-01-01", 0))),
+    ("get_reviews_page", database.get_reviews_page),
+    ("get_reviews_page after", lambda: database.get_reviews_page(("2000-01-01", 0))),
+    ("get_couriers_page", database.get_couriers_page),
+    ("get_couriers_page after", lambda: database.get_couriers_page(("", 0))),
+    ("search_packages", lambda: database.search_packages("иван")),
+    ("get_rating_aggregate", database.get_rating_aggregate),
+    ("export_packages", lambda: list(database.iter_export_rows("packages", ("2000-01-01", 0), status="Отправлена"))),
+    ("assign_pending_packages", lambda: database.assign_pending_packages(lambda parcels, couriers: [])),
+    ("get_courier_packages", lambda: database.get_courier_packages(1)),
+    ("get_package_addresses_page", database.get_package_addresses_page),
+    ("get_geocodes", lambda: database.get_geocodes(["Москва, Тверская ул"])),
+    ("get_packages_in_box", lambda: database.get_packages_in_box(55.7, 55.8, 37.5, 37.7)),
+    ("get_couriers_in_box", lambda: database.get_couriers_in_box(55.7, 55.8, 37.5, 37.7)),
+    ("get_courier_route_stops", lambda: database.get_courier_route_stops(1)),
+    ("export_reviews", lambda: list(database.iter_export_rows("reviews", ("2000-01-01", 0)))),
+]
+
+class QueryPlanTest(unittest.TestCase):
+    """Запросы приложения не просматривают таблицы целиком и не сортируют во временном B-дереве"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_name = database.DB_NAME
+        database.close_connections()
+        database.DB_NAME = os.path.join(self.directory.name, "test.db")
+        database.initialize_db()
+
+    def tearDown(self):
+        database.close_connections()
+        database.DB_NAME = self.db_name
+        self.directory.cleanup()
+
+    def test_migrations_applied(self):
+        conn = database.get_connection()
+        self.assertEqual(database.get_schema_version(conn), database.MIGRATIONS[-1][0])
+
+    def test_audited_queries(self):
+        self.assertEqual(database.audit_query_plans(), {})
+
+    def test_executed_queries(self):
+        conn = database.get_connection()
+        for name, call in TRACED_CALLS:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                call()
+            finally:
+                conn.set_trace_callback(None)
+            # Обращения к каталогу схемы (sqlite_master) и служебным таблицам FTS5,
+            # которые модуль читает сам, не относятся к запросам приложения
+            queries = [sql for sql in statements
+                       if sql.lstrip().upper().startswith(("SELECT", "WITH"))
+                       and "sqlite_master" not in sql and "_fts_" not in sql]
+            self.assertTrue(queries, f"{name}: запросы не выполнялись")
+            for sql in queries:
+                plan = database.explain_query_plan(sql)
+                with self.subTest(query=name, sql=sql):
+                    self.assertFalse(any(database.is_full_scan(detail) for detail in plan), plan)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Модуль генерации номеров отслеживания для приложения "Служба доставки".
+
+Номер строится из значения счетчика, которое пропускается через
+перестановку Фейстеля: номера выглядят случайными, но различны для
+разных значений счетчика. Значения счетчика выдаются блоками, которые
+резервируются в базе данных одним запросом, поэтому уникальность
+гарантируется без обращения к БД на каждый номер.
+
+Формат номера: XX-9999999 (две буквы, шесть цифр и контрольная цифра).
+Старые случайные номера имеют формат XX-999999 и с новыми не пересекаются.
+"""
+
+import string
+import threading
+
+import database
+
+LETTERS = string.ascii_uppercase
+# Количество различных номеров: две буквы и шесть цифр
+DOMAIN_SIZE = len(LETTERS) ** 2 * 10 ** 6
+# Сколько значений счетчика резервировать в БД за один раз
+DEFAULT_BLOCK_SIZE = 1000
+
+# Параметры перестановки: 30 бит (2^30 > DOMAIN_SIZE), две половины по 15 бит
+_HALF_BITS = 15
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+def _round_function(value, round_key):
+    """Раундовая функция сети Фейстеля (перемешивание 15-битного значения)"""
+    value = ((value ^ round_key) * 0x9E3779B1) & 0xFFFFFFFF
+    value ^= value >> 15
+    value = (value * 0x85EBCA6B) & 0xFFFFFFFF
+    return (value ^ (value >> 13)) & _HALF_MASK
+
+def _round_keys(key):
+    """Разбиение ключа перестановки на раундовые ключи"""
+    return [(key >> (15 * i)) & 0xFFFFFFFF for i in range(_ROUNDS)]
+
+def permute(value, key):
+    """
+    Биективное отображение значения счетчика на диапазон [0, DOMAIN_SIZE)
+
+    Сеть Фейстеля переставляет 30-битные значения, а значения за пределами
+    DOMAIN_SIZE повторно пропускаются через сеть (cycle walking), поэтому
+    результат остается перестановкой именно диапазона номеров.
+
+    Args:
+        value (int): Значение счетчика (0 <= value < DOMAIN_SIZE)
+        key (int): Ключ перестановки
+
+    Returns:
+        int: Переставленное значение
+    """
+    keys = _round_keys(key)
+    while True:
+        left = value >> _HALF_BITS
+        right = value & _HALF_MASK
+        for round_key in keys:
+            left, right = right, left ^ _round_function(right, round_key)
+        value = (left << _HALF_BITS) | right
+        if value < DOMAIN_SIZE:
+            return value
+
+def check_digit(payload):
+    """
+    Вычисление контрольной цифры по алгоритму Луна
+
+    Буквы предварительно заменяются двузначными числами (A=10 ... Z=35).
+
+    Args:
+        payload (str): Номер без контрольной цифры, например "AB123456"
+
+    Returns:
+        str: Контрольная цифра
+    """
+    digits = "".join(str(int(char, 36)) for char in payload)
+    total = 0
+    for position, char in enumerate(reversed(digits)):
+        digit = int(char)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str((10 - total % 10) % 10)
+
+def format_tracking_number(value):
+    """
+    Формирование номера отслеживания из значения в диапазоне номеров
+
+    Args:
+        value (int): Значение в диапазоне [0, DOMAIN_SIZE)
+
+    Returns:
+        str: Номер отслеживания в формате XX-9999999
+    """
+    letters_index, number = divmod(value, 10 ** 6)
+    first, second = divmod(letters_index, len(LETTERS))
+    payload = f"{LETTERS[first]}{LETTERS[second]}{number:06d}"
+    return f"{payload[:2]}-{payload[2:]}{check_digit(payload)}"
+
+def is_valid_tracking_number(tracking_number):
+    """
+    Проверка формата и контрольной цифры номера отслеживания
+
+    Args:
+        tracking_number (str): Номер отслеживания
+
+    Returns:
+        bool: True для корректного номера нового формата
+    """
+    if not isinstance(tracking_number, str) or len(tracking_number) != 10:
+        return False
+    letters, dash, digits = tracking_number[:2], tracking_number[2], tracking_number[3:]
+    if dash != "-" or not digits.isdigit() or not all(char in LETTERS for char in letters):
+        return False
+    return check_digit(letters + digits[:6]) == digits[6]
+
+class TrackingNumberGenerator:
+    """Потокобезопасный генератор номеров из зарезервированных блоков счетчика"""
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Args:
+            block_size (int): Сколько значений счетчика резервировать за один раз
+        """
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._key = None
+
+    def _reserve(self, size):
+        """Резервирование нового блока значений счетчика в базе данных"""
+        block = database.reserve_tracking_block(size, DOMAIN_SIZE)
+        if block is None:
+            return False
+        self._next, self._end, self._key = block
+        return True
+
+    def take(self, count):
+        """
+        Выдача нескольких номеров отслеживания
+
+        Args:
+            count (int): Количество номеров
+
+        Returns:
+            list: Номера отслеживания или None если не удалось зарезервировать блок
+        """
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    if not self._reserve(max(self.block_size, count - len(numbers))):
+                        return None
+                stop = min(self._end, self._next + count - len(numbers))
+                numbers.extend(format_tracking_number(permute(value, self._key))
+                               for value in range(self._next, stop))
+                self._next = stop
+        return numbers
+
+    def next(self):
+        """
+        Выдача одного номера отслеживания
+
+        Returns:
+            str: Номер отслеживания или None если не удалось зарезервировать блок
+        """
+        numbers = self.take(1)
+        return numbers[0] if numbers else None
+
+_generators = {}
+_generators_lock = threading.Lock()
+
+def get_generator():
+    """
+    Получение генератора для текущей базы данных database.DB_NAME
+
+    Returns:
+        TrackingNumberGenerator: Общий для процесса генератор
+    """
+    with _generators_lock:
+        generator = _generators.get(database.DB_NAME)
+        if generator is None:
+            generator = _generators[database.DB_NAME] = TrackingNumberGenerator()
+        return generator
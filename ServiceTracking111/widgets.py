@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Дополнительные виджеты графического интерфейса приложения "Служба доставки".
+Содержит виртуализированный список, который создает строки только для видимой
+области и подгружает данные из базы данных окнами (страницами), при наличии
+BackgroundExecutor - в фоновых потоках.
+"""
+
+import bisect
+import threading
+import tkinter as tk
+import tkinter.font as tkfont
+from collections import OrderedDict
+
+class PagedSource:
+    """
+    Источник строк для VirtualList: страницы фиксированного размера с LRU-кэшем
+
+    Страницы могут читаться из фоновых потоков: кэш защищен блокировкой,
+    а запросы к БД выполняются вне ее.
+    """
+
+    def __init__(self, fetch_page, count, key, page_size=100, max_pages=20):
+        """
+        Инициализация источника
+
+        Args:
+            fetch_page (callable): Функция (after, limit, offset) -> список строк
+            count (callable): Функция без аргументов -> общее количество строк
+            key (callable): Ключ keyset-пагинации для строки
+            page_size (int): Количество строк в странице
+            max_pages (int): Сколько страниц держать в кэше
+        """
+        self.fetch_page = fetch_page
+        self.count = count
+        self.key = key
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.total = 0
+        self._pages = OrderedDict()
+        # Ключи последних строк уже прочитанных страниц: по ним следующая
+        # страница читается keyset-запросом вместо OFFSET от начала таблицы
+        self._anchors = {}
+        self._anchor_pages = []
+        self._lock = threading.Lock()
+        # Номер поколения данных: страницы, прочитанные до reset(), в кэш не попадают
+        self._epoch = 0
+
+    def reset(self):
+        """Сброс кэша и пересчет общего количества строк"""
+        total = self.count()
+        with self._lock:
+            self._pages.clear()
+            self._anchors.clear()
+            self._anchor_pages.clear()
+            self._epoch += 1
+            self.total = total
+        return total
+
+    def _load_page(self, index):
+        """Чтение страницы из базы данных от ближайшей известной опорной точки"""
+        with self._lock:
+            epoch = self._epoch
+            position = bisect.bisect_left(self._anchor_pages, index) - 1
+            if position >= 0:
+                anchor_page = self._anchor_pages[position]
+                after = self._anchors[anchor_page]
+                offset = (index - anchor_page - 1) * self.page_size
+            else:
+                after, offset = None, index * self.page_size
+
+        rows = self.fetch_page(after, self.page_size, offset)
+
+        with self._lock:
+            if epoch == self._epoch:
+                if rows and index not in self._anchors:
+                    self._anchors[index] = self.key(rows[-1])
+                    bisect.insort(self._anchor_pages, index)
+                self._pages[index] = rows
+                if len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return rows
+
+    def page(self, index):
+        """
+        Получение страницы строк
+
+        Args:
+            index (int): Номер страницы
+
+        Returns:
+            list: Строки страницы
+        """
+        with self._lock:
+            rows = self._pages.get(index)
+            if rows is not None:
+                self._pages.move_to_end(index)
+                return rows
+        return self._load_page(index)
+
+    def cached_rows(self, start, count):
+        """
+        Получение строк диапазона только из кэша, без обращения к БД
+
+        Returns:
+            list: Строки диапазона или None если часть страниц не загружена
+        """
+        stop = min(start + count, self.total)
+        if stop <= start:
+            return []
+        result = []
+        with self._lock:
+            for page_index in range(start // self.page_size, (stop - 1) // self.page_size + 1):
+                rows = self._pages.get(page_index)
+                if rows is None:
+                    return None
+                page_start = page_index * self.page_size
+                result.extend(rows[max(start - page_start, 0):max(stop - page_start, 0)])
+        return result
+
+    def get(self, position):
+        """Получение строки по абсолютной позиции или None"""
+        if position is None or not 0 <= position < self.total:
+            return None
+        rows = self.page(position // self.page_size)
+        offset = position % self.page_size
+        return rows[offset] if offset < len(rows) else None
+
+    def rows(self, start, count):
+        """
+        Получение строк из диапазона позиций
+
+        Args:
+            start (int): Позиция первой строки
+            count (int): Количество строк
+
+        Returns:
+            list: Строки (может быть меньше count в конце списка)
+        """
+        result = []
+        stop = min(start + count, self.total)
+        position = start
+        while position < stop:
+            page_index, offset = divmod(position, self.page_size)
+            rows = self.page(page_index)[offset:offset + stop - position]
+            if not rows:
+                break
+            result.extend(rows)
+            position += len(rows)
+        return result
+
+class VirtualList(tk.Frame):
+    """
+    Виртуализированный список
+
+    В tk.Listbox находятся только видимые строки. Полоса прокрутки отражает
+    положение окна во всем наборе данных, строки форматируются при показе.
+    Если передан executor, страницы читаются в фоновых потоках, а пока они
+    не загружены, на их месте показывается LOADING_TEXT.
+    """
+
+    LOADING_TEXT = "Загрузка..."
+
+    def __init__(self, master, source, formatter, empty_text="", font=("Arial", 9), height=10, executor=None):
+        """
+        Инициализация списка
+
+        Args:
+            master (tk.Widget): Родительский виджет
+            source (PagedSource): Источник строк
+            formatter (callable): Функция строка_данных -> текст строки списка
+            empty_text (str): Текст, показываемый для пустого списка
+            font (tuple): Шрифт строк
+            height (int): Начальная высота в строках
+            executor (BackgroundExecutor): Пул для фоновой загрузки или None
+        """
+        super().__init__(master)
+        self.source = source
+        self.executor = executor
+        # Ключи фоновых задач списка: новая подгрузка окна отменяет устаревшую,
+        # а повторные обновления сливаются в одно
+        self.load_key = f"list-load-{id(self)}"
+        self.refresh_key = f"list-refresh-{id(self)}"
+        self.formatter = formatter
+        self.empty_text = empty_text
+        self.top = 0
+        self.visible = height
+        self.selected = None
+        self.line_height = tkfont.Font(font=font).metrics("linespace") + 1
+
+        self.listbox = tk.Listbox(self, height=height, font=font, exportselection=False, activestyle=tk.NONE)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind("<Configure>", self.on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.listbox.bind("<MouseWheel>", self.on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll_by(3))
+        self.listbox.bind("<Up>", lambda event: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self.move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self.scroll_by(-self.visible))
+        self.listbox.bind("<Next>", lambda event: self.scroll_by(self.visible))
+
+    def refresh(self):
+        """Перечитывание данных из источника и перерисовка"""
+        if self.executor is None:
+            self.source.reset()
+            self.on_refreshed()
+            return
+        self.executor.cancel(self.load_key)
+        if not self.source.total:
+            self.listbox.delete(0, tk.END)
+            self.listbox.insert(tk.END, self.LOADING_TEXT)
+        self.executor.submit(self.refresh_key, self._reload, self.top, self.visible,
+                             on_success=lambda total: self.on_refreshed(), coalesce=True)
+
+    def _reload(self, top, visible):
+        """Пересчет строк и загрузка текущего окна (выполняется в фоновом потоке)"""
+        total = self.source.reset()
+        top = max(0, min(top, total - visible))
+        self.source.rows(top, visible)
+        return total
+
+    def on_refreshed(self):
+        """Перерисовка после перечитывания данных"""
+        if self.selected is not None and self.selected >= self.source.total:
+            self.selected = None
+        self.top = max(0, min(self.top, self.source.total - self.visible))
+        self.render()
+
+    def render(self):
+        """Отрисовка видимых строк"""
+        self.listbox.delete(0, tk.END)
+        total = self.source.total
+        if total == 0:
+            if self.empty_text:
+                self.listbox.insert(tk.END, self.empty_text)
+            self.scrollbar.set(0, 1)
+            return
+
+        if self.executor is None:
+            rows = self.source.rows(self.top, self.visible)
+        else:
+            rows = self.source.cached_rows(self.top, self.visible)
+            if rows is None:
+                count = min(self.visible, total - self.top)
+                self.listbox.insert(tk.END, *[self.LOADING_TEXT] * count)
+                self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible) / total))
+                self.executor.submit(self.load_key, self.source.rows, self.top, self.visible,
+                                     on_success=lambda rows: self.render())
+                return
+        self.listbox.insert(tk.END, *[self.formatter(row) for row in rows])
+        if self.selected is not None and self.top <= self.selected < self.top + len(rows):
+            self.listbox.selection_set(self.selected - self.top)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible) / total))
+
+    def scroll_to(self, top):
+        """Прокрутка к строке с позицией top"""
+        top = max(0, min(int(top), self.source.total - self.visible))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def scroll_by(self, rows):
+        """Прокрутка на rows строк"""
+        self.scroll_to(self.top + rows)
+        return "break"
+
+    def yview(self, *args):
+        """Обработчик команд полосы прокрутки"""
+        if args[0] == tk.MOVETO:
+            self.scroll_to(float(args[1]) * self.source.total)
+        elif args[0] == tk.SCROLL:
+            step = self.visible if args[2] == tk.PAGES else 1
+            self.scroll_by(int(args[1]) * step)
+
+    def on_mousewheel(self, event):
+        """Прокрутка колесом мыши"""
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        """Пересчет количества видимых строк при изменении размера"""
+        visible = max(1, (event.height - 4) // self.line_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, self.source.total - self.visible))
+            self.render()
+
+    def on_select(self, event):
+        """Запоминание абсолютной позиции выбранной строки"""
+        selection = self.listbox.curselection()
+        if selection and self.source.total:
+            self.selected = self.top + selection[0]
+
+    def move_selection(self, step):
+        """Перемещение выделения клавишами с прокруткой окна"""
+        if not self.source.total:
+            return "break"
+        current = self.selected if self.selected is not None else self.top - step
+        self.selected = max(0, min(current + step, self.source.total - 1))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + self.visible:
+            self.top = self.selected - self.visible + 1
+        self.render()
+        return "break"
+
+    def get_selected(self):
+        """
+        Получение данных выбранной строки
+
+        Returns:
+            dict: Строка данных или None если ничего не выбрано
+        """
+        return self.source.get(self.selected)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Очередь записи с групповой фиксацией транзакций для приложения "Служба доставки".
+
+Потоки, которые пишут в базу данных одновременно (рабочие потоки сервера
+API, несколько мест приема посылок), не открывают каждый свою транзакцию, а
+ставят операцию в очередь и получают Future с ее результатом. Единственный
+поток записи собирает операции, пока их не наберется max_batch или не
+пройдет max_delay_ms с первой из них (ждать имеет смысл, только пока
+операций меньше, чем было в прошлой группе), и выполняет всю группу в одной
+транзакции BEGIN IMMEDIATE: одна блокировка записи и одна фиксация на группу
+вместо одной на операцию. Каждая операция выполняется внутри своей точки
+сохранения (SAVEPOINT), поэтому ошибка одной операции не отменяет остальные.
+Результаты передаются в Future только после фиксации транзакции.
+
+Если база данных заблокирована другим процессом дольше database.BUSY_TIMEOUT,
+группа повторяется с нарастающей паузой (до retries раз).
+"""
+
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import database
+from cache import MISSING
+
+# Наибольшее количество операций в одной транзакции
+DEFAULT_MAX_BATCH = 256
+# Сколько ждать следующих операций после первой в группе (мс)
+DEFAULT_MAX_DELAY_MS = 5
+# Повторы группы при блокировке базы данных другим процессом
+DEFAULT_RETRIES = 5
+# Пауза перед первым повтором (с), удваивается при каждом следующем
+RETRY_DELAY = 0.05
+
+class _Operation:
+    """Операция в очереди записи"""
+
+    __slots__ = ("fn", "args", "future", "fallback", "after_commit")
+
+    def __init__(self, fn, args, fallback, after_commit):
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.fallback = fallback
+        self.after_commit = after_commit
+
+class WriteQueue:
+    """Очередь операций записи, выполняемых одним потоком с групповой фиксацией"""
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, max_delay_ms=DEFAULT_MAX_DELAY_MS, retries=DEFAULT_RETRIES):
+        """
+        Инициализация очереди (поток записи запускается сразу)
+
+        Args:
+            max_batch (int): Наибольшее количество операций в одной транзакции
+            max_delay_ms (float): Сколько ждать следующих операций после первой (мс)
+            retries (int): Повторы группы при блокировке базы данных
+        """
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.retries = retries
+        self.batches = 0
+        self.operations = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def submit(self, fn, *args, fallback=MISSING, after_commit=None):
+        """
+        Постановка операции в очередь
+
+        Args:
+            fn (callable): Функция (conn, *args), выполняемая в транзакции группы
+            *args: Аргументы функции
+            fallback: Результат операции при ее ошибке (ошибка выводится на экран);
+                по умолчанию ошибка передается в Future как исключение
+            after_commit (callable): Функция без аргументов, вызываемая после фиксации
+
+        Returns:
+            Future: Результат fn после фиксации транзакции
+        """
+        if self._closed:
+            raise RuntimeError("Очередь записи закрыта")
+        operation = _Operation(fn, args, fallback, after_commit)
+        self._queue.put(operation)
+        return operation.future
+
+    def create_package(self, tracking_number, description, sender, recipient, sender_address="", recipient_address=""):
+        """Добавление посылки (как database.create_package); Future с True или False"""
+        return self.submit(database.insert_package, tracking_number, description, sender, recipient,
+                           sender_address, recipient_address, fallback=False,
+                           after_commit=lambda: database.invalidate_package_cache(tracking_number))
+
+    def create_review(self, tracking_number, customer_name, rating, comment):
+        """Добавление отзыва (как database.create_review); Future с True или False"""
+        return self.submit(database.insert_review, tracking_number, customer_name, rating, comment, fallback=False)
+
+    def update_package_status(self, tracking_number, new_status):
+        """Обновление статуса посылки (как database.update_package_status); Future с True или False"""
+        return self.submit(database.set_package_status, tracking_number, new_status, fallback=False,
+                           after_commit=lambda: database.invalidate_package_cache(tracking_number))
+
+    def close(self):
+        """Выполнение уже поставленных операций и остановка потока записи"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """Цикл потока записи: сбор группы операций и ее выполнение"""
+        stopping = False
+        # Сколько операций ждать в группе: писатели прошлой группы, получив
+        # результат, скорее всего пришлют следующие операции. Один писатель
+        # не ждет вовсе, иначе каждая его запись задерживалась бы на max_delay_ms.
+        expected = 1
+        while not stopping:
+            operation = self._queue.get()
+            if operation is None:
+                break
+            batch = [operation]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if len(batch) < expected and remaining > 0:
+                        operation = self._queue.get(timeout=remaining)
+                    else:
+                        operation = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if operation is None:
+                    stopping = True
+                    break
+                batch.append(operation)
+            expected = len(batch)
+            # Операции, отмененные до начала выполнения, пропускаются
+            batch = [operation for operation in batch if operation.future.set_running_or_notify_cancel()]
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        """Выполнение группы операций в одной транзакции с повтором при блокировке"""
+        conn = database.get_connection()
+        for attempt in range(self.retries + 1):
+            outcomes = []
+            try:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for operation in batch:
+                        outcomes.append(self._execute(conn, operation))
+                break
+            except Exception as e:
+                if database.is_busy_error(e) and attempt < self.retries:
+                    time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+                    continue
+                print(f"Ошибка при групповой записи в базу данных: {e}")
+                for operation in batch:
+                    self._resolve(operation, False, e, quiet=True)
+                return
+
+        self.batches += 1
+        self.operations += len(batch)
+        for operation, (success, value) in zip(batch, outcomes):
+            if success and operation.after_commit is not None:
+                operation.after_commit()
+            self._resolve(operation, success, value)
+
+    @staticmethod
+    def _execute(conn, operation):
+        """
+        Выполнение одной операции в точке сохранения
+
+        Returns:
+            tuple: (успех, результат или исключение)
+        """
+        conn.execute("SAVEPOINT write_queue_operation")
+        try:
+            result = operation.fn(conn, *operation.args)
+        except Exception as e:
+            if database.is_busy_error(e):
+                # Блокировка - повод повторить всю группу, а не ошибка операции
+                raise
+            conn.execute("ROLLBACK TO write_queue_operation")
+            conn.execute("RELEASE write_queue_operation")
+            return False, e
+        conn.execute("RELEASE write_queue_operation")
+        return True, result
+
+    @staticmethod
+    def _resolve(operation, success, value, quiet=False):
+        """Передача результата операции в ее Future"""
+        if success:
+            operation.future.set_result(value)
+        elif operation.fallback is not MISSING:
+            # Занятый номер (IntegrityError) - ожидаемый исход, как в database.create_package
+            if not quiet and not isinstance(value, sqlite3.IntegrityError):
+                print(f"Ошибка при записи в базу данных: {value}")
+            operation.future.set_result(operation.fallback)
+        else:
+            operation.future.set_exception(value)